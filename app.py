@@ -1,20 +1,33 @@
 from flask import Flask, session, flash
 from database.database import db, User, SensorType  # Import SensorType
+from database.bootstrap import init_database, run_migrations
 from view import views
 from templates.usermanage.usermanage import usermanage
 from templates.feedback.feedback import feedbackbp
-from templates.dashboard.dashboard import dashboardbp, init_mqtt_client
+from templates.dashboard.dashboard import dashboardbp
 from templates.devicemanage.devicemanage import devicemanage_bp
 from templates.automationrule.automation import autobp
 from templates.zone.zone import zone_bp
 from templates.timerscheduler.timer import timerbp
-from templates.backuprestore.backuprestore import backup_restore_bp
+from templates.backuprestore.backuprestore import backup_restore_bp, CHAIN_DIR
+from services.mqttbus import init_mqtt_bus
+from services.ruleengine import init_rule_engine
+from services.timeseries import init_timeseries
+from services.writebehind import init_write_behind
+from services.livepush import init_live_push
+from services.timerservice import init_timer_service
+from services.relaycommands import init_relay_commands
+from services.backupchain import init_backup_chain
+from services.metrics import init_metrics
+from services import sensortypes, usercache
 #from redistest import redispb   
 
 from flask_login import LoginManager, login_user, logout_user, current_user
 from datetime import timedelta
 from flask.sessions import SecureCookieSessionInterface
 import uuid
+import signal
+import sys
 from flask_socketio import SocketIO, emit
 
 
@@ -30,6 +43,7 @@ app.config['BROKER_PORT'] = 1883
 app.config['MQTT_TOPIC'] = "home/#"
 
 socketio = SocketIO(app, cors_allowed_origins="*")  
+init_live_push(socketio)  # Push sensor deltas to subscribed dashboards
 
 #app.register_blueprint(redispb) 
 app.register_blueprint(views) 
@@ -43,6 +57,8 @@ app.register_blueprint(timerbp)
 app.register_blueprint(backup_restore_bp)
 # Initialize the database
 db.init_app(app)
+init_database(app)
+init_metrics(app)  # /metrics, request and SQL timings
 
 # Initialize the Login Manager
 login_manager = LoginManager()
@@ -126,6 +142,7 @@ def create_initial_user(app):
     """Create the initial admin user and populate sensor types."""
     with app.app_context():
         db.create_all()  # Create all tables
+        run_migrations(db.engine, db.metadata)  # Add indexes missing from older databases
 
         # Create admin user if it doesn't exist
         if not User.query.filter_by(username='admin').first():  
@@ -143,15 +160,29 @@ def create_initial_user(app):
 
         # Populate sensor types
         populate_sensor_types()
+        sensortypes.registry()  # Load the registry now the table is seeded
 
 
 
 @login_manager.user_loader
 def load_user(userid):
-    return db.session.get(User, int(userid))
+    return usercache.get_user(int(userid))  # Cached, so polling requests skip the users table
+
+def handle_sigterm(signum, frame):
+    """Exit through atexit so buffered sensor writes are flushed on `docker stop`."""
+    sys.exit(0)
 
 if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, handle_sigterm)
     with app.app_context():
         create_initial_user(app)  
-        init_mqtt_client() 
-    app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
+        init_relay_commands()
+        init_rule_engine(app)
+        init_timer_service(app)
+        init_timeseries(app)
+        init_write_behind(app)
+        init_backup_chain(app, CHAIN_DIR)
+        init_mqtt_bus(app)
+    # No reloader: it would run this block again in a child process and start
+    # every background service (rule engine, timers, writers, backups) twice
+    socketio.run(app, debug=True, use_reloader=False, host='0.0.0.0', allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""Benchmark hot-path query latency before and after the SQLite bootstrap.
+
+Run from the project root:
+
+    python -m benchmarks.bench_db_indexes [--devices 2000] [--repeat 200]
+
+Builds a throwaway database from the models, then times the filters the
+blueprints run on every poll. "Before" is the old setup: default rollback
+journal and no secondary indexes. "After" applies database.bootstrap
+(WAL + pragmas + create_missing_indexes).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+
+from database.bootstrap import configure_engine, run_migrations
+from database.database import db
+
+QUERIES = {
+    "sensor by device/key": (
+        "SELECT id, value FROM sensors WHERE device_id = :device_id AND sensor_key = :sensor_key",
+        lambda rng, n: {"device_id": f"esp-{rng.randrange(n):05d}", "sensor_key": "temperature"},
+    ),
+    "sensors by user": (
+        "SELECT id FROM sensors WHERE userid = :userid",
+        lambda rng, n: {"userid": rng.randrange(1, 21)},
+    ),
+    "rules by sensor": (
+        "SELECT id FROM automation_rules WHERE sensor_id = :sensor_id",
+        lambda rng, n: {"sensor_id": rng.randrange(1, n * 5)},
+    ),
+    "rules by user": (
+        "SELECT id FROM automation_rules WHERE user_id = :user_id",
+        lambda rng, n: {"user_id": rng.randrange(1, 21)},
+    ),
+    "zone of sensor": (
+        "SELECT zone_id FROM zone_sensors WHERE sensor_id = :sensor_id",
+        lambda rng, n: {"sensor_id": rng.randrange(1, n * 5)},
+    ),
+    "timers by user": (
+        "SELECT id FROM timer_schedulers WHERE user_id = :user_id",
+        lambda rng, n: {"user_id": rng.randrange(1, 21)},
+    ),
+}
+
+SENSOR_KEYS = ("temperature", "humidity", "relay", "pir", "reed_switch")
+
+
+def populate(engine, device_count):
+    rng = random.Random(7)
+    now = datetime.now()
+    tables = db.metadata.tables
+    with engine.begin() as conn:
+        conn.execute(tables['users'].insert(), [
+            {"userid": i, "username": f"user{i}", "name": f"User {i}", "role": 0, "password": "x"}
+            for i in range(1, 21)
+        ])
+        conn.execute(tables['sensor_types'].insert(), [
+            {"id": i + 1, "type_key": key, "display_name": key} for i, key in enumerate(SENSOR_KEYS)
+        ])
+        conn.execute(tables['devices'].insert(), [
+            {"device_id": f"esp-{i:05d}", "userid": i % 20 + 1, "status": True}
+            for i in range(device_count)
+        ])
+        conn.execute(tables['sensors'].insert(), [
+            {"device_id": f"esp-{i:05d}", "sensor_key": key, "sensor_type_id": k + 1,
+             "value": "0", "status": "online", "last_seen": now, "userid": i % 20 + 1}
+            for i in range(device_count) for k, key in enumerate(SENSOR_KEYS)
+        ])
+        conn.execute(tables['automation_rules'].insert(), [
+            {"user_id": rng.randrange(1, 21), "sensor_id": rng.randrange(1, device_count * 5),
+             "sensor_type_id": 1, "condition": "GREATER_THAN", "threshold": "30",
+             "relay_device_id": f"esp-{rng.randrange(device_count):05d}", "action": "ON"}
+            for _ in range(device_count * 2)
+        ])
+        conn.execute(tables['zones'].insert(), [
+            {"id": i, "user_id": i % 20 + 1, "name": f"zone{i}"} for i in range(1, device_count // 10 + 2)
+        ])
+        conn.execute(tables['zone_sensors'].insert(), [
+            {"zone_id": rng.randrange(1, device_count // 10 + 2), "sensor_id": sensor_id}
+            for sensor_id in range(1, device_count * 5, 2)
+        ])
+        conn.execute(tables['timer_schedulers'].insert(), [
+            {"user_id": rng.randrange(1, 21), "trigger_time": "08:00", "days": "Mon,Tue",
+             "enabled": True, "action": "ON", "relay_device_id": f"esp-{rng.randrange(device_count):05d}"}
+            for _ in range(device_count * 2)
+        ])
+
+
+def drop_declared_indexes(engine):
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+
+def time_queries(engine, device_count, repeat):
+    results = {}
+    with engine.connect() as conn:
+        for label, (sql, params) in QUERIES.items():
+            rng = random.Random(label)
+            statement = text(sql)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(statement, params(rng, device_count)).fetchall()
+            results[label] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+
+        engine = create_engine(f'sqlite:///{path}')
+        db.metadata.create_all(engine)
+        drop_declared_indexes(engine)
+        populate(engine, args.devices)
+        before = time_queries(engine, args.devices, args.repeat)
+        engine.dispose()
+
+        engine = create_engine(f'sqlite:///{path}')
+        configure_engine(engine)
+        run_migrations(engine, db.metadata)
+        after = time_queries(engine, args.devices, args.repeat)
+        engine.dispose()
+
+    print(f"{args.devices} devices, {args.devices * len(SENSOR_KEYS)} sensors, {args.repeat} runs per query")
+    print(f"{'query':<22}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for label in QUERIES:
+        print(f"{label:<22}{before[label]:>12.3f}{after[label]:>12.3f}{before[label] / after[label]:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
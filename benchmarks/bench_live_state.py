@@ -0,0 +1,171 @@
+"""Benchmark live sensor state: the old per-blueprint dicts vs. services.livestate.
+
+Run from the project root:
+
+    python -m benchmarks.bench_live_state [--sensors 10000] [--keys 4] [--rounds 5]
+
+Feeds ``--rounds`` decoded messages per device (``--keys`` sensor keys
+each, plus ``ip``) into both layouts and reports the memory they retain,
+measured with tracemalloc, and the ingest cost per message, timed
+without tracing.
+
+"Before" is the four stores the blueprints used to keep, updated by their
+original consumers: three ``last_known_state`` dicts (dashboard,
+automation, timer) and devicemanage's ``devices`` dict with an ISO
+``last_seen`` string per sensor. "After" is the one slot/column-backed
+LiveStateStore that replaced them.
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+from services.livestate import LiveStateStore
+
+SENSOR_KEYS = ("temperature", "humidity", "relay", "photoresistor", "pir", "reed_switch", "photo_interrupter")
+
+
+def build_messages(device_count, keys, rounds):
+    rng = random.Random(5)
+    messages = []
+    for round_number in range(rounds):
+        for index in range(device_count):
+            payload = {"deviceId": f"esp-{index:05d}", "ip": f"10.0.{index // 256 % 256}.{index % 256}"}
+            for key in keys:
+                if key in ("temperature", "humidity", "photoresistor"):
+                    payload[key] = round(rng.uniform(10, 90), 1)
+                elif key == "relay":
+                    payload[key] = rng.choice(("ON", "OFF"))
+                elif key == "pir":
+                    payload[key] = rng.choice(("MOTION DETECTED", "NO MOTION"))
+                elif key == "reed_switch":
+                    payload[key] = rng.choice(("OPEN", "CLOSED"))
+                else:
+                    payload[key] = rng.choice(("CLEAR", "BLOCKED"))
+            messages.append(json.dumps(payload))
+    return messages
+
+
+# The original consumers, verbatim apart from their stores
+def legacy_state_consumer(last_known_state):
+    def on_message(_topic, payload, received_at):
+        device_id = payload.get("deviceId", "Unknown")
+        if device_id not in last_known_state:
+            last_known_state[device_id] = {"data": {}, "timestamp": received_at}
+        for key, value in payload.items():
+            if key != "deviceId":
+                last_known_state[device_id]["data"][key] = value
+        last_known_state[device_id]["timestamp"] = received_at
+    return on_message
+
+
+def legacy_device_consumer(devices):
+    def on_message(_topic, payload, received_at):
+        device_id = payload.get("deviceId")
+        ip_address = payload.get("ip")
+        if not device_id or not ip_address:
+            return
+        last_seen = datetime.fromtimestamp(received_at).isoformat()
+        if device_id not in devices:
+            devices[device_id] = {
+                "ip_address": ip_address,
+                "status": "online",
+                "last_seen": last_seen,
+                "changed_at": received_at,
+                "sensors": {}
+            }
+        else:
+            devices[device_id]["last_seen"] = last_seen
+            devices[device_id]["status"] = "online"
+            devices[device_id]["changed_at"] = received_at
+        for key, value in payload.items():
+            if key not in ["deviceId", "ip"]:
+                devices[device_id]["sensors"][key] = {
+                    "value": value,
+                    "status": "online",
+                    "last_seen": last_seen
+                }
+    return on_message
+
+
+def feed(consumers, payloads):
+    """Seconds per message spent in the consumers."""
+    elapsed = 0.0
+    for payload in payloads:
+        received_at = time.time()
+        start = time.perf_counter()
+        for consumer in consumers:
+            consumer("home/x/sensors", payload, received_at)
+        elapsed += time.perf_counter() - start
+    return elapsed / len(payloads)
+
+
+def measure(build, messages):
+    """(bytes retained, seconds per message) for feeding messages to build()'s consumers.
+
+    Memory is traced on one run and time taken on another, untraced one,
+    since tracemalloc slows every allocation.
+    """
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    stores, consumers = build()
+    for raw in messages:
+        payload = json.loads(raw)  # Decoded once by the bus, as in production
+        received_at = time.time()
+        for consumer in consumers:
+            consumer("home/x/sensors", payload, received_at)
+        del payload
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del stores, consumers
+
+    payloads = [json.loads(raw) for raw in messages]
+    _, consumers = build()
+    return retained, feed(consumers, payloads)
+
+
+def build_before():
+    stores = [{}, {}, {}, {}]
+    consumers = [legacy_state_consumer(stores[0]), legacy_state_consumer(stores[1]),
+                 legacy_state_consumer(stores[2]), legacy_device_consumer(stores[3])]
+    return stores, consumers
+
+
+def build_after():
+    store = LiveStateStore()
+
+    def on_message(_topic, payload, received_at):
+        store.update(payload["deviceId"], payload, received_at)
+    return store, [on_message]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensors', type=int, default=10000)
+    parser.add_argument('--keys', type=int, default=4, help=f"sensor keys per device, at most {len(SENSOR_KEYS)}")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    keys = SENSOR_KEYS[:args.keys]
+    device_count = args.sensors // len(keys)
+    sensors = device_count * len(keys)
+    messages = build_messages(device_count, keys, args.rounds)
+
+    before, before_cost = measure(build_before, messages)
+    after, after_cost = measure(build_after, messages)
+
+    print(f"{sensors} sensors on {device_count} devices, {len(messages)} messages")
+    print(f"before (3 state dicts + device dict): {before / 1024:9.0f} KiB  "
+          f"{before / sensors:6.0f} B/sensor  {before_cost * 1e6:6.1f} us/msg")
+    print(f"after  (live-state columns):          {after / 1024:9.0f} KiB  "
+          f"{after / sensors:6.0f} B/sensor  {after_cost * 1e6:6.1f} us/msg")
+    print(f"memory: {before / after:.1f}x less")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Benchmark MQTT ingest: four per-blueprint clients vs. the shared bus.
+
+Run from the project root:
+
+    python -m benchmarks.bench_mqtt_ingest [--devices 200] [--messages 50000]
+
+"Before" replays the four original ``on_message`` callbacks, each decoding
+the payload itself as its own paho client did. "After" feeds the same
+messages through ``services.mqttbus``, which decodes once and fans out to
+the consumers the blueprints register. Broker/socket cost is not simulated,
+so the real saving on a Pi is larger (three fewer connections and threads).
+"""
+import argparse
+import json
+import random
+import logging
+import time
+from datetime import datetime
+
+from services import mqttbus
+# Importing the blueprints registers their consumers on the bus
+from templates.dashboard import dashboard
+from templates.automationrule import automation
+from templates.timerscheduler import timer
+from templates.devicemanage import devicemanage
+
+
+class FakeMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def build_messages(device_count, message_count):
+    rng = random.Random(42)
+    messages = []
+    for i in range(message_count):
+        device_id = f"esp-{i % device_count:04d}"
+        payload = {
+            "deviceId": device_id,
+            "ip": f"192.168.1.{i % device_count % 250 + 2}",
+            "temperature": round(rng.uniform(18, 35), 1),
+            "humidity": round(rng.uniform(30, 90), 1),
+            "relay": rng.choice(["ON", "OFF"]),
+        }
+        messages.append(FakeMessage(f"home/{device_id}/sensors", json.dumps(payload).encode()))
+    return messages
+
+
+logger = logging.getLogger(__name__)
+
+
+# The original per-blueprint callbacks, kept verbatim apart from their stores
+def legacy_state_handler(store, log_payload=True):
+    def on_message(_client, _userdata, msg):
+        payload = json.loads(msg.payload.decode())
+        device_id = payload.get("deviceId", "Unknown")
+        if log_payload:
+            logger.debug(f"Received message from {device_id}: {payload}")
+        if device_id not in store:
+            store[device_id] = {"data": {}, "timestamp": time.time()}
+        for key, value in payload.items():
+            if key != "deviceId":
+                store[device_id]["data"][key] = value
+        store[device_id]["timestamp"] = time.time()
+    return on_message
+
+
+def legacy_device_handler(store):
+    def on_message(_client, _userdata, msg):
+        payload = json.loads(msg.payload.decode())
+        device_id = payload.get("deviceId")
+        ip_address = payload.get("ip")
+        if not device_id or not ip_address:
+            return
+        if device_id not in store:
+            store[device_id] = {
+                "ip_address": ip_address,
+                "status": "online",
+                "last_seen": datetime.now().isoformat(),
+                "sensors": {}
+            }
+        else:
+            store[device_id]["last_seen"] = datetime.now().isoformat()
+            store[device_id]["status"] = "online"
+        for key, value in payload.items():
+            if key not in ["deviceId", "ip"]:
+                store[device_id]["sensors"][key] = {
+                    "value": value,
+                    "status": "online",
+                    "last_seen": datetime.now().isoformat()
+                }
+    return on_message
+
+
+def run_before(messages):
+    handlers = [
+        legacy_state_handler({}, log_payload=False),  # dashboard
+        legacy_state_handler({}),  # automation
+        legacy_state_handler({}),  # timer
+        legacy_device_handler({}),  # devicemanage
+    ]
+    start = time.perf_counter()
+    for msg in messages:
+        for handler in handlers:
+            handler(None, None, msg)
+    return time.perf_counter() - start
+
+
+def run_after(messages):
+    start = time.perf_counter()
+    for msg in messages:
+        mqttbus.on_message(None, None, msg)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=50000)
+    args = parser.parse_args()
+
+    messages = build_messages(args.devices, args.messages)
+    before = run_before(messages)
+    after = run_after(messages)
+
+    print(f"{args.messages} messages from {args.devices} devices")
+    print(f"before (4 clients, 4 decodes): {args.messages / before:10.0f} msg/s")
+    print(f"after  (1 bus, 1 decode):      {args.messages / after:10.0f} msg/s")
+    print(f"speedup: {before / after:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark timer ticks: scanning every timer vs. the heap-based engine.
+
+Run from the project root:
+
+    python -m benchmarks.bench_timer_engine [--timers 1000,5000,10000] [--hours 24]
+
+"Before" is the per-tick loop of the old /timer/trigger_relay: split each
+timer's days string and compare HH:MM for every row, every tick. "After"
+is services.timerengine, ticked once per simulated second; only the
+timers due at that instant are touched. Times are CPU per tick.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from services.timerengine import TimerEngine
+
+DAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+class Row:
+    """Stand-in for a TimerScheduler row."""
+
+    def __init__(self, timer_id, trigger_time, days):
+        self.id = timer_id
+        self.trigger_time = trigger_time
+        self.days = days
+
+
+def build_rows(count):
+    rng = random.Random(12)
+    return [
+        Row(i, f"{rng.randrange(24):02d}:{rng.randrange(60):02d}",
+            ",".join(sorted(rng.sample(DAY_NAMES, rng.randint(1, 7)), key=DAY_NAMES.index)))
+        for i in range(count)
+    ]
+
+
+def legacy_tick(rows, now):
+    """The old trigger_relay matching loop, minus the DB and MQTT calls."""
+    current_time = now.strftime("%H:%M")
+    current_day = now.strftime("%a")
+    due = []
+    for timer in rows:
+        days_map = timer.days.split(",")
+        if current_day not in days_map:
+            continue
+        if current_time == timer.trigger_time:
+            due.append(timer.id)
+    return due
+
+
+def bench_legacy(rows, start, ticks):
+    cpu = time.process_time()
+    for i in range(ticks):
+        legacy_tick(rows, start + timedelta(minutes=i))
+    return (time.process_time() - cpu) / ticks
+
+
+def bench_engine(rows, start, seconds):
+    fired = []
+    engine = TimerEngine(fired.extend)
+    begin = start.timestamp()
+
+    cpu = time.process_time()
+    for row in rows:
+        engine.schedule(row.id, row.trigger_time, row.days, now=begin)
+    load = time.process_time() - cpu
+
+    idle_cpu = busy_cpu = 0.0
+    idle_ticks = busy_ticks = 0
+    for second in range(1, seconds + 1):
+        cpu = time.process_time()
+        count = len(engine.run_due(begin + second))
+        elapsed = time.process_time() - cpu
+        if count:
+            busy_cpu += elapsed
+            busy_ticks += 1
+        else:
+            idle_cpu += elapsed
+            idle_ticks += 1
+    per_tick = (idle_cpu + busy_cpu) / seconds
+    per_fire = busy_cpu / len(fired) if fired else 0.0
+    return load, per_tick, idle_cpu / max(idle_ticks, 1), per_fire, len(fired)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--timers', default="1000,5000,10000")
+    parser.add_argument('--hours', type=int, default=24)
+    parser.add_argument('--legacy-ticks', type=int, default=200)
+    args = parser.parse_args()
+
+    # A Monday midnight, local time
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=today.weekday())
+
+    print(f"Engine ticked every second for {args.hours}h; legacy sampled over {args.legacy_ticks} minute ticks")
+    print(f"{'timers':>8}{'legacy us/tick':>16}{'engine us/tick':>16}{'idle us/tick':>14}{'us/fire':>10}{'fires':>8}{'load ms':>10}")
+    for count in (int(n) for n in args.timers.split(",")):
+        rows = build_rows(count)
+        legacy = bench_legacy(rows, start, args.legacy_ticks)
+        load, per_tick, idle, per_fire, fires = bench_engine(rows, start, args.hours * 3600)
+        print(f"{count:>8}{legacy * 1e6:>16.1f}{per_tick * 1e6:>16.2f}{idle * 1e6:>14.2f}"
+              f"{per_fire * 1e6:>10.1f}{fires:>8}{load * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
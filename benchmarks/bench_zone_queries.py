@@ -0,0 +1,173 @@
+"""Benchmark the zone views: per-sensor lookups vs. one joined query.
+
+Run from the project root:
+
+    python -m benchmarks.bench_zone_queries [--zones 50] [--sensors-per-zone 20] [--repeat 20]
+
+Builds a throwaway database with one user owning the zones, plus as many
+unassigned sensors again, then counts the SQL statements and times
+/api/zone and /api/unassigned-sensors. "Before" is the original code
+(Sensor.query.get / SensorType.query.get per zone sensor); "after" is
+services.zoneindex, shown both uncached and from the per-user cache.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import event
+
+from database.database import db, Zone, ZoneSensor, Sensor, SensorType
+from services import zoneindex
+
+SENSOR_KEYS = ("temperature", "humidity", "relay", "pir", "reed_switch")
+USER_ID = 1
+
+
+# The original zone.py helpers, verbatim
+def legacy_get_user_zones(user_id):
+    zones = Zone.query.filter_by(user_id=user_id).all()
+    zones_data = []
+
+    for zone in zones:
+        sensors = []
+        for zs in zone.sensors:
+            sensor = Sensor.query.get(zs.sensor_id)
+            if sensor:
+                sensor_type = SensorType.query.get(sensor.sensor_type_id)
+                sensors.append({
+                    "sensor_id": sensor.id,
+                    "name": sensor.sensor_key,
+                    "type": sensor_type.type_key if sensor_type else "Unknown",
+                    "display_name": sensor_type.display_name if sensor_type else "Unknown",
+                    "unit": sensor_type.unit if sensor_type else None
+                })
+
+        zones_data.append({
+            "zone_id": zone.id,
+            "name": zone.name,
+            "description": zone.description,
+            "sensors": sensors
+        })
+
+    return zones_data
+
+
+def legacy_get_unassigned_sensors(user_id):
+    assigned_sensors = db.session.query(ZoneSensor.sensor_id).all()
+    assigned_sensor_ids = [s[0] for s in assigned_sensors]
+
+    unassigned = Sensor.query.filter(
+        ~Sensor.id.in_(assigned_sensor_ids),
+        Sensor.userid == user_id
+    ).all()
+
+    sensors_data = []
+    for sensor in unassigned:
+        sensor_type = SensorType.query.get(sensor.sensor_type_id)
+        sensors_data.append({
+            "sensor_id": sensor.id,
+            "name": sensor.sensor_key,
+            "type": sensor_type.type_key if sensor_type else "Unknown",
+            "display_name": sensor_type.display_name if sensor_type else "Unknown",
+            "unit": sensor_type.unit if sensor_type else None
+        })
+
+    return sensors_data
+
+
+def cached_get_user_zones(user_id):
+    return zoneindex.zones_for_user(user_id)
+
+
+def uncached_get_user_zones(user_id):
+    zoneindex.invalidate(user_id)
+    return zoneindex.zones_for_user(user_id)
+
+
+def populate(zone_count, sensors_per_zone):
+    tables = db.metadata.tables
+    now = datetime.now()
+    sensor_count = zone_count * sensors_per_zone * 2
+    db.session.execute(tables['users'].insert(), [
+        {"userid": USER_ID, "username": "bench", "name": "Bench", "role": 0, "password": "x"}
+    ])
+    db.session.execute(tables['sensor_types'].insert(), [
+        {"id": i + 1, "type_key": key, "display_name": key} for i, key in enumerate(SENSOR_KEYS)
+    ])
+    db.session.execute(tables['sensors'].insert(), [
+        {"id": i + 1, "device_id": f"esp-{i // len(SENSOR_KEYS):05d}", "sensor_key": SENSOR_KEYS[i % len(SENSOR_KEYS)],
+         "sensor_type_id": i % len(SENSOR_KEYS) + 1, "value": "0", "status": "online",
+         "last_seen": now, "userid": USER_ID}
+        for i in range(sensor_count)
+    ])
+    db.session.execute(tables['zones'].insert(), [
+        {"id": z + 1, "user_id": USER_ID, "name": f"zone{z}"} for z in range(zone_count)
+    ])
+    # Every other sensor goes into a zone, the rest stay unassigned
+    db.session.execute(tables['zone_sensors'].insert(), [
+        {"zone_id": z + 1, "sensor_id": (z * sensors_per_zone + s) * 2 + 1}
+        for z in range(zone_count) for s in range(sensors_per_zone)
+    ])
+    db.session.commit()
+
+
+def measure(fn, repeat):
+    statements = []
+
+    def count(*_args):
+        statements.append(1)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        db.session.expire_all()
+        fn(USER_ID)
+        per_call = len(statements)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            db.session.expire_all()
+            result = fn(USER_ID)
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return per_call, elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--zones', type=int, default=50)
+    parser.add_argument('--sensors-per-zone', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            populate(args.zones, args.sensors_per_zone)
+
+            cases = [
+                ("zones (before)", legacy_get_user_zones),
+                ("zones (after)", uncached_get_user_zones),
+                ("zones (cached)", cached_get_user_zones),
+                ("unassigned (before)", legacy_get_unassigned_sensors),
+                ("unassigned (after)", zoneindex.unassigned_sensors),
+            ]
+            results = {label: measure(fn, args.repeat) for label, fn in cases}
+            db.engine.dispose()
+
+    assert results["zones (before)"][2] == results["zones (after)"][2]
+    assert results["unassigned (before)"][2] == results["unassigned (after)"][2]
+
+    print(f"{args.zones} zones x {args.sensors_per_zone} sensors, {args.repeat} runs per view")
+    print(f"{'view':<22}{'queries':>10}{'ms':>10}")
+    for label, (queries, ms, _) in results.items():
+        print(f"{label:<22}{queries:>10}{ms:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""Load test: a fleet of virtual ESP nodes against the hub, with no network.
+
+Run from the project root:
+
+    python -m benchmarks.load_fleet [--devices 10,100,1000] [--interval 1] [--duration 10]
+
+Each virtual node publishes ``home/<id>/sensors`` every ``--interval``
+seconds with the JSON shape the firmware sends (``deviceId``, ``ip`` and
+one value per ``--sensors`` key, all sensor types from
+``populate_sensor_types``). It answers ``home/<id>/relay/command`` by
+switching its relay and reporting the new state at once, as the firmware
+does, which is what acknowledges the hub's relay commands.
+
+The hub runs in-process on a throwaway database: the blueprint consumers,
+rule engine, relay dispatcher, write-behind and time-series writers, all
+fed by ``benchmarks.localbroker`` through ``init_mqtt_bus(client=...)``.
+Every device gets a ``temperature > 30 -> relay ON`` rule and sends one
+hot reading during the run. Reported per fleet size:
+
+- ingest: messages the hub consumed per second, and the deepest backlog
+  waiting on its MQTT thread
+- rule latency: hot reading published -> relay command received by the node
+- dashboard freshness: reading published -> value visible to the dashboard
+
+Socket and broker costs are not simulated, so these are upper bounds for
+the hub's own processing.
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from flask import Flask
+
+from database.bootstrap import init_database
+from database.database import db, User, Device, Sensor, SensorType, AutomationRule
+from services import deviceregistry, livestate, mqttbus, relaycommands, ruleengine, ruleindex, timeseries, writebehind
+# Importing the blueprints registers their consumers on the bus
+from templates.dashboard import dashboard
+from templates.automationrule import automation
+from templates.timerscheduler import timer
+from templates.devicemanage import devicemanage
+from benchmarks.localbroker import LocalBroker
+
+SENSOR_KEYS = ("temperature", "humidity", "reed_switch", "photo_interrupter", "relay", "pir", "photoresistor")
+DEFAULT_SENSORS = ("temperature", "humidity", "relay", "photoresistor")
+RULE_THRESHOLD = 30
+PROBE_KEY = "photoresistor"   # Freshness probes carry a unique value in this key
+USER_ID = 1
+
+
+class VirtualEsp:
+    """One simulated node: current sensor values and relay state."""
+
+    def __init__(self, index, sensors, rng):
+        self.device_id = f"esp-{index:04d}"
+        self.ip = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+        self.sensors = sensors
+        self.rng = rng
+        self.relay = "OFF"
+        self.hot_at = None        # when to send the reading that trips the rule
+        self.hot_sent_at = None
+        self.rule_latency = None
+
+    def reading(self, now):
+        payload = {"deviceId": self.device_id, "ip": self.ip}
+        for key in self.sensors:
+            if key == "temperature":
+                hot = self.hot_at is not None and self.hot_sent_at is None and now >= self.hot_at
+                payload[key] = RULE_THRESHOLD + 5 if hot else round(self.rng.uniform(18, RULE_THRESHOLD - 2), 1)
+                if hot:
+                    self.hot_sent_at = now
+            elif key == "humidity":
+                payload[key] = round(self.rng.uniform(30, 90), 1)
+            elif key == "relay":
+                payload[key] = self.relay
+            elif key == "photoresistor":
+                payload[key] = round(self.rng.uniform(0, 1000), 1)
+            elif key == "pir":
+                payload[key] = self.rng.choice(("MOTION DETECTED", "NO MOTION"))
+            elif key == "reed_switch":
+                payload[key] = self.rng.choice(("OPEN", "CLOSED"))
+            elif key == "photo_interrupter":
+                payload[key] = self.rng.choice(("CLEAR", "BLOCKED"))
+        return payload
+
+    def on_command(self, state, now):
+        self.relay = state
+        if state == "ON" and self.hot_sent_at is not None and self.rule_latency is None:
+            self.rule_latency = now - self.hot_sent_at
+
+
+class Fleet:
+    """The virtual nodes, sharing one broker connection and one publisher thread."""
+
+    def __init__(self, broker, esps, interval):
+        self.broker = broker
+        self.esps = {esp.device_id: esp for esp in esps}
+        self.interval = interval
+        self.client = broker.client("fleet")
+        self.client.on_message = self._on_command
+        self.client.subscribe("home/+/relay/command")
+        self.client.loop_start()
+        self._stop = threading.Event()
+        self._thread = None
+        self.published = 0
+        self._lock = threading.Lock()   # Node state is touched by the publisher, command and probe threads
+
+    def publish(self, esp, payload=None):
+        with self._lock:
+            payload = payload or esp.reading(time.time())
+            self.client.publish(f"home/{esp.device_id}/sensors", json.dumps(payload))
+            self.published += 1
+
+    def _on_command(self, _client, _userdata, msg):
+        device_id = msg.topic.split('/')[1]
+        esp = self.esps.get(device_id)
+        if esp is None:
+            return
+        state = msg.payload.decode().strip().upper()
+        with self._lock:
+            esp.on_command(state, time.time())
+        # Report the new state straight away, which acks the command
+        self.publish(esp)
+
+    def _run(self):
+        start = time.time()
+        # Spread the first publishes over one interval
+        schedule = [(start + i * self.interval / len(self.esps), device_id)
+                    for i, device_id in enumerate(self.esps)]
+        heapq.heapify(schedule)
+        while not self._stop.is_set():
+            due, device_id = schedule[0]
+            delay = due - time.time()
+            if delay > 0:
+                if self._stop.wait(delay):
+                    return
+            heapq.heapreplace(schedule, (due + self.interval, device_id))
+            self.publish(self.esps[device_id])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fleet-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+def build_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    init_database(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(userid=USER_ID, username='load', name='Load test', role=1, password='load'))
+        for key in SENSOR_KEYS:
+            db.session.add(SensorType(type_key=key, display_name=key))
+        db.session.commit()
+    return app
+
+
+def register_devices(app, esps, sensors):
+    """Pair the nodes with the user and give each a temperature rule on its own relay."""
+    with app.app_context():
+        type_ids = {t.type_key: t.id for t in SensorType.query.all()}
+        known = {device_id for device_id, in db.session.query(Device.device_id)}
+        new = [esp for esp in esps if esp.device_id not in known]
+        if new:
+            db.session.execute(db.insert(Device), [
+                {"device_id": esp.device_id, "title": esp.device_id, "status": True, "userid": USER_ID} for esp in new
+            ])
+            db.session.execute(db.insert(Sensor), [
+                {"device_id": esp.device_id, "sensor_key": key, "sensor_type_id": type_ids[key], "userid": USER_ID}
+                for esp in new for key in sensors
+            ])
+        if new and "temperature" in sensors and "relay" in sensors:
+            temperature_ids = dict(
+                db.session.query(Sensor.device_id, Sensor.id)
+                .filter(Sensor.sensor_key == "temperature", Sensor.device_id.in_([esp.device_id for esp in new]))
+            )
+            db.session.execute(db.insert(AutomationRule), [
+                {"user_id": USER_ID, "sensor_id": temperature_ids[esp.device_id], "sensor_type_id": type_ids["temperature"],
+                 "condition": "GREATER_THAN", "threshold": str(RULE_THRESHOLD), "relay_device_id": esp.device_id,
+                 "action": "ON", "enabled": True, "auto_title": f"{esp.device_id} hot"}
+                for esp in new
+            ])
+        db.session.commit()
+    ruleindex.invalidate()
+    deviceregistry.invalidate()
+
+
+def dashboard_value(device_id, key):
+    return livestate.store.value(device_id, key)
+
+
+def probe_freshness(fleet, esps, stop, samples, period=0.05, timeout=5.0):
+    """Publish a unique probe value and time how long until the dashboard shows it."""
+    rng = random.Random(7)
+    seq = 0
+    while not stop.wait(period):
+        esp = rng.choice(esps)
+        seq += 1
+        value = 100000 + seq + 0.5
+        payload = esp.reading(time.time())
+        payload[PROBE_KEY] = value
+        published_at = time.time()
+        fleet.publish(esp, payload)
+        deadline = published_at + timeout
+        while dashboard_value(esp.device_id, PROBE_KEY) != value:
+            if time.time() > deadline:
+                break
+            time.sleep(0.0005)
+        else:
+            samples.append(time.time() - published_at)
+
+
+def percentiles(values):
+    if not values:
+        return "      n/a"
+    values = sorted(values)
+    p50 = values[len(values) // 2]
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return f"p50 {p50 * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms  max {values[-1] * 1000:7.1f} ms"
+
+
+def run_phase(app, broker, hub_client, count, args, rng):
+    sensors = tuple(args.sensors)
+    esps = [VirtualEsp(i, sensors, random.Random(rng.random())) for i in range(count)]
+    register_devices(app, esps, sensors)
+    ruleengine.last_rule_execution.clear()  # Each phase measures every rule's first fire
+
+    ingested = [0]
+
+    def count_ingest(_topic, payload, _received_at):
+        ingested[0] += 1
+    mqttbus.register_consumer(count_ingest)
+
+    sent_before, acked_before = relaycommands.stats["sent"], relaycommands.stats["acked"]
+    fleet = Fleet(broker, esps, args.interval)
+    start = time.time()
+    for esp in esps:
+        esp.hot_at = start + rng.uniform(0.2, 0.6) * args.duration
+
+    stop_probe = threading.Event()
+    freshness = []
+    prober = threading.Thread(target=probe_freshness, args=(fleet, esps, stop_probe, freshness), daemon=True)
+    fleet.start()
+    prober.start()
+
+    max_backlog = 0
+    while time.time() - start < args.duration:
+        max_backlog = max(max_backlog, hub_client.backlog)
+        time.sleep(0.05)
+    stop_probe.set()
+    prober.join()
+    publish_end = time.time()
+    # Give in-flight rules and acks a moment, then stop publishing
+    settle_deadline = publish_end + 5
+    while time.time() < settle_deadline and any(esp.hot_sent_at and esp.rule_latency is None for esp in esps):
+        time.sleep(0.05)
+    fleet.stop()
+    while hub_client.backlog and time.time() < settle_deadline + 10:
+        time.sleep(0.01)
+    elapsed = time.time() - start
+    mqttbus.unregister_consumer(count_ingest)
+
+    rule_latencies = [esp.rule_latency for esp in esps if esp.rule_latency is not None]
+    hot = sum(1 for esp in esps if esp.hot_sent_at is not None)
+    target_rate = count / args.interval
+    print(f"\n{count} devices, {args.interval}s interval (target {target_rate:.0f} msg/s), {args.duration}s")
+    print(f"  published {fleet.published} msgs ({fleet.published / (publish_end - start):.0f}/s), "
+          f"ingested {ingested[0]} ({ingested[0] / elapsed:.0f}/s), max hub backlog {max_backlog}")
+    print(f"  rule latency       {percentiles(rule_latencies)}  ({len(rule_latencies)}/{hot} rules fired)")
+    print(f"  dashboard fresh    {percentiles(freshness)}  ({len(freshness)} probes)")
+    print(f"  relay commands     {relaycommands.stats['sent'] - sent_before} sent, "
+          f"{relaycommands.stats['acked'] - acked_before} acked")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', default='10,100,1000', help='comma-separated fleet sizes')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between readings per device')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load per fleet size')
+    parser.add_argument('--sensors', default=','.join(DEFAULT_SENSORS),
+                        type=lambda value: [key.strip() for key in value.split(',') if key.strip()],
+                        help=f"sensor keys per reading, from {', '.join(SENSOR_KEYS)}")
+    args = parser.parse_args()
+    unknown = set(args.sensors) - set(SENSOR_KEYS)
+    if unknown:
+        parser.error(f"unknown sensor keys: {', '.join(sorted(unknown))}")
+
+    # The per-message log lines of the hub would dominate the measurement
+    logging.disable(logging.INFO)
+
+    path = os.path.join(tempfile.mkdtemp(), 'load.db')
+    app = build_app(path)
+    broker = LocalBroker()
+    hub_client = broker.client("hub")
+
+    relaycommands.init_relay_commands()
+    ruleengine.init_rule_engine(app)
+    writebehind.init_write_behind(app)
+    timeseries.init_timeseries(app)
+    mqttbus.init_mqtt_bus(app, client=hub_client)
+
+    rng = random.Random(42)
+    for count in (int(n) for n in args.devices.split(',')):
+        run_phase(app, broker, hub_client, count, args, rng)
+
+
+if __name__ == '__main__':
+    main()
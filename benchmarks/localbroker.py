@@ -0,0 +1,145 @@
+"""In-process stand-in for the MQTT broker, for load tests without a network.
+
+``LocalBroker.client()`` returns an object with the parts of the
+``paho.mqtt.client.Client`` interface the hub uses (``connect``,
+``loop_start``, ``subscribe``, ``publish``, ``on_connect``/``on_message``),
+so it can be handed to ``services.mqttbus.init_mqtt_bus(client=...)``.
+
+Like a broker, it delivers each client's messages on that client's own
+network thread, through an unbounded inbox whose depth shows how far the
+subscriber is behind. Delivery is QoS 0 with no retained messages, and a
+publisher that is subscribed to the topic receives its own message.
+"""
+import queue
+import threading
+import time
+from itertools import count
+
+
+def topic_matches(pattern, topic):
+    """MQTT wildcard match: '+' is one level, a trailing '#' any remaining levels."""
+    pattern_parts = pattern.split('/')
+    topic_parts = topic.split('/')
+    for index, part in enumerate(pattern_parts):
+        if part == '#':
+            return True
+        if index >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[index]:
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class Message:
+    """The fields of paho's MQTTMessage the hub reads."""
+
+    __slots__ = ('topic', 'payload', 'qos', 'retain', 'published_at')
+
+    def __init__(self, topic, payload, published_at):
+        self.topic = topic
+        self.payload = payload
+        self.qos = 0
+        self.retain = False
+        self.published_at = published_at
+
+
+class PublishResult:
+    """Stand-in for paho's MQTTMessageInfo."""
+
+    __slots__ = ('rc', 'mid')
+
+    def __init__(self, mid):
+        self.rc = 0
+        self.mid = mid
+
+
+class LocalBroker:
+    def __init__(self, clock=None):
+        self.clock = clock or time.time
+        self._lock = threading.Lock()
+        self._subscriptions = ()   # ((pattern, client), ...), replaced on change
+        self._mids = count(1)
+        self.published = 0
+
+    def client(self, client_id=''):
+        return LocalClient(self, client_id)
+
+    def subscribe(self, client, pattern):
+        with self._lock:
+            self._subscriptions = self._subscriptions + ((pattern, client),)
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._subscriptions = tuple(s for s in self._subscriptions if s[1] is not client)
+
+    def publish(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        message = Message(topic, payload, self.clock())
+        self.published += 1
+        delivered = set()
+        for pattern, client in self._subscriptions:
+            # One copy per client, however many of its filters match
+            if id(client) not in delivered and topic_matches(pattern, topic):
+                delivered.add(id(client))
+                client._inbox.put(message)
+        return PublishResult(next(self._mids))
+
+
+class LocalClient:
+    """One connection to a LocalBroker."""
+
+    def __init__(self, broker, client_id=''):
+        self.broker = broker
+        self.client_id = client_id
+        self.on_connect = None
+        self.on_message = None
+        self.userdata = None
+        self._inbox = queue.SimpleQueue()
+        self._thread = None
+        self._connected = False
+
+    @property
+    def backlog(self):
+        """Messages delivered to this client that its callback has not consumed yet."""
+        return self._inbox.qsize()
+
+    def connect(self, host=None, port=None, keepalive=60):
+        self._connected = True
+        if self.on_connect:
+            self.on_connect(self, self.userdata, {}, 0)
+        return 0
+
+    def subscribe(self, topic, qos=0):
+        self.broker.subscribe(self, topic)
+        return 0, 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        return self.broker.publish(topic, payload if payload is not None else b'')
+
+    def loop_start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=f"localbroker-{self.client_id or id(self)}", daemon=True)
+            self._thread.start()
+
+    def loop_stop(self):
+        if self._thread is not None:
+            self._inbox.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def disconnect(self):
+        self.broker.unsubscribe(self)
+        self._connected = False
+
+    def _loop(self):
+        while True:
+            message = self._inbox.get()
+            if message is None:
+                return
+            if self.on_message:
+                try:
+                    self.on_message(self, self.userdata, message)
+                except Exception:
+                    # paho logs and carries on; a failing callback must not stop delivery
+                    pass
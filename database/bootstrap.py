@@ -0,0 +1,104 @@
+import logging
+from sqlalchemy import event, inspect, text
+from sqlalchemy.schema import CreateColumn
+from database.database import db
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Applied to every new SQLite connection. WAL lets the request threads read
+# while the MQTT writers commit; NORMAL sync is safe under WAL and avoids an
+# fsync per transaction on the SD card.
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", 5000),         # ms to wait on a locked database instead of failing
+    ("cache_size", -16000),         # 16 MB page cache (negative = KiB)
+    ("mmap_size", 64 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+)
+
+
+def set_sqlite_pragmas(dbapi_connection, _connection_record):
+    """SQLAlchemy 'connect' listener applying SQLITE_PRAGMAS."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def configure_engine(engine):
+    """Install the pragma listener on an engine (SQLite only)."""
+    if engine.dialect.name != 'sqlite':
+        return
+    if not event.contains(engine, 'connect', set_sqlite_pragmas):
+        event.listen(engine, 'connect', set_sqlite_pragmas)
+        # Connections opened before the listener existed would miss the pragmas
+        engine.dispose()
+
+
+def add_missing_columns(connection, metadata):
+    """Add nullable columns declared on the models that existing tables lack.
+
+    SQLite can only ALTER TABLE ... ADD COLUMN, so NOT NULL columns without a
+    default are reported and left for a manual migration.
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable or column.primary_key:
+                logger.warning(f"Cannot add NOT NULL column {table.name}.{column.name} in place")
+                continue
+            definition = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def create_missing_indexes(connection, metadata):
+    """Create every index declared on the models that the database lacks."""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+                created.append(index.name)
+    return created
+
+
+# Idempotent schema steps, run in order on every start. Each takes
+# (connection, metadata) and returns a list of what it changed.
+MIGRATIONS = [
+    add_missing_columns,
+    create_missing_indexes,
+]
+
+
+def run_migrations(engine, metadata):
+    """Bring an existing database up to the models; safe to run repeatedly."""
+    with engine.begin() as connection:
+        for migration in MIGRATIONS:
+            changes = migration(connection, metadata)
+            if changes:
+                logger.info(f"{migration.__name__}: {', '.join(changes)}")
+
+
+def init_database(app):
+    """Tune the SQLite engine. Call right after db.init_app(app)."""
+    with app.app_context():
+        configure_engine(db.engine)
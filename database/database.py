@@ -59,13 +59,13 @@ class Sensor(db.Model):
     __tablename__ = 'sensors'
 
     id = db.Column(db.Integer, primary_key=True)
-    device_id = db.Column(db.String(50), db.ForeignKey('devices.device_id', ondelete='CASCADE'), nullable=False)
-    sensor_key = db.Column(db.String(50), nullable=False)
+    device_id = db.Column(db.String(50), db.ForeignKey('devices.device_id', ondelete='CASCADE'), nullable=False, index=True)
+    sensor_key = db.Column(db.String(50), nullable=False, index=True)
     sensor_type_id = db.Column(db.Integer, db.ForeignKey('sensor_types.id'), nullable=False)  # Foreign key to SensorType
     value = db.Column(db.String(100), nullable=True)
     status = db.Column(db.String(20), default='online')
     last_seen = db.Column(db.DateTime, default=datetime.now)
-    userid = db.Column(db.Integer, db.ForeignKey('users.userid', ondelete='CASCADE'), nullable=False)
+    userid = db.Column(db.Integer, db.ForeignKey('users.userid', ondelete='CASCADE'), nullable=False, index=True)
     
 
     # Relationships
@@ -152,7 +152,7 @@ class ZoneSensor(db.Model):
     __tablename__ = 'zone_sensors'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     zone_id = db.Column(db.Integer, db.ForeignKey('zones.id', ondelete='CASCADE'), nullable=False)
-    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), nullable=False)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), nullable=False, index=True)
 
     def __repr__(self):
         return f"<ZoneSensor {self.id}>"
@@ -162,8 +162,8 @@ class AutomationRule(db.Model):
     __tablename__ = 'automation_rules'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.userid'), nullable=False)
-    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.userid'), nullable=False, index=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id'), nullable=False, index=True)
     sensor_type_id = db.Column(db.Integer, db.ForeignKey('sensor_types.id'), nullable=False)
     condition = db.Column(db.String(50), nullable=False)  # GREATER_THAN, LESS_THAN, EQUALS
     threshold = db.Column(db.String(100), nullable=False)  # Threshold value or state
@@ -195,7 +195,7 @@ class TimerScheduler(db.Model):
     __tablename__ = 'timer_schedulers' 
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.userid'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.userid'), nullable=False, index=True)
     trigger_time = db.Column(db.String(50), nullable=False)  # Time of day (e.g., "08:00")
     days = db.Column(db.String(50), nullable=False)  # Days of the week (e.g., "Monday,Wednesday")
     enabled = db.Column(db.Boolean, default=True, nullable=False)  # Rule active status
@@ -203,6 +203,7 @@ class TimerScheduler(db.Model):
     title = db.Column(db.String(100), nullable=True)  # Optional title
     action = db.Column(db.Enum('ON', 'OFF'), nullable=False)  # Action to perform (ON or OFF)
     relay_device_id = db.Column(db.String(100), nullable=False)  # Target device ID
+    last_fired_at = db.Column(db.DateTime, nullable=True)  # Scheduled instant of the last handled fire
 
     def __repr__(self):
         return (f"<TimerScheduler(id={self.id}, user_id={self.user_id}, relay_device_id={self.relay_device_id}, "
@@ -219,7 +220,8 @@ class TimerScheduler(db.Model):
             'description': self.description,
             'title': self.title,
             'action': self.action,
-            'relay_device_id': self.relay_device_id
+            'relay_device_id': self.relay_device_id,
+            'last_fired_at': self.last_fired_at.isoformat() if self.last_fired_at else None
         }
 
 class DashboardSensor(db.Model):
@@ -240,4 +242,61 @@ class DashboardSensor(db.Model):
             'id': self.id,
             'sensor_id': self.sensor_id,
             'added_at': self.added_at.strftime('%Y-%m-%d %H:%M:%S')
-        }
\ No newline at end of file
+        }
+
+# Append-only log of every sensor reading received over MQTT
+class SensorReading(db.Model):
+    __tablename__ = 'sensor_readings'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    device_id = db.Column(db.String(50), nullable=False)
+    sensor_key = db.Column(db.String(50), nullable=False)
+    value = db.Column(db.Float, nullable=True)  # Numeric readings
+    state = db.Column(db.String(100), nullable=True)  # Status readings, e.g. 'OPEN'
+    recorded_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_sensor_readings_sensor_time', 'device_id', 'sensor_key', 'recorded_at'),
+        db.Index('ix_sensor_readings_recorded_at', 'recorded_at'),  # Retention purge
+    )
+
+    def __repr__(self):
+        return f"<SensorReading {self.device_id}/{self.sensor_key} at {self.recorded_at}>"
+
+    def to_dict(self):
+        return {
+            "time": self.recorded_at.strftime('%Y-%m-%d %H:%M:%S'),
+            "value": self.value if self.value is not None else self.state
+        }
+
+
+# Min/max/avg/count of numeric readings per fixed time bucket
+class SensorRollup(db.Model):
+    __tablename__ = 'sensor_rollups'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    device_id = db.Column(db.String(50), nullable=False)
+    sensor_key = db.Column(db.String(50), nullable=False)
+    resolution = db.Column(db.Integer, nullable=False)  # Bucket length in seconds (60 or 3600)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    min_value = db.Column(db.Float, nullable=False)
+    max_value = db.Column(db.Float, nullable=False)
+    sum_value = db.Column(db.Float, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('device_id', 'sensor_key', 'resolution', 'bucket_start', name='uq_sensor_rollups_bucket'),
+        db.Index('ix_sensor_rollups_resolution_bucket', 'resolution', 'bucket_start'),  # Retention purge
+    )
+
+    def __repr__(self):
+        return f"<SensorRollup {self.device_id}/{self.sensor_key} {self.resolution}s at {self.bucket_start}>"
+
+    def to_dict(self):
+        return {
+            "time": self.bucket_start.strftime('%Y-%m-%d %H:%M:%S'),
+            "min": self.min_value,
+            "max": self.max_value,
+            "avg": self.sum_value / self.count if self.count else None,
+            "count": self.count
+        }
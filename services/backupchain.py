@@ -0,0 +1,268 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from services import backups
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Backup chain configuration
+BACKUP_INTERVAL = 60 * 60        # Seconds between scheduled backups
+FULL_INTERVAL = 24 * 60 * 60     # Age after which the next backup is a new full snapshot
+KEEP_HOURLY = 24                 # Newest backup of each of the last N hours
+KEEP_DAILY = 7                   # Newest backup of each of the last N days
+
+MANIFEST = 'manifest.json'
+DIFF_MAGIC = b'FYPDIFF1'
+PAGE_HEADER = struct.Struct('>I')      # page number
+DIFF_HEADER = struct.Struct('>I')      # page size
+HASH_SIZE = 16
+
+_lock = Lock()  # Serialises chain changes (manifest, files) between routes and the job
+_app = None
+_chain_dir = None
+_worker = None
+_stop = Event()
+
+
+def read_page_size(path):
+    """Page size from the SQLite file header (bytes 16-17; 1 means 65536)."""
+    with open(path, 'rb') as f:
+        header = f.read(100)
+    if len(header) < 100 or not header.startswith(b'SQLite format 3\x00'):
+        raise ValueError(f"{path} is not an SQLite database")
+    page_size = struct.unpack('>H', header[16:18])[0]
+    return 65536 if page_size == 1 else page_size
+
+
+def iter_pages(path, page_size):
+    with open(path, 'rb') as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                return
+            yield page
+
+
+def page_digest(page):
+    return hashlib.blake2b(page, digest_size=HASH_SIZE).digest()
+
+
+def load_manifest(chain_dir):
+    path = os.path.join(chain_dir, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)["backups"]
+
+
+def save_manifest(chain_dir, entries):
+    """Write the manifest atomically."""
+    path = os.path.join(chain_dir, MANIFEST)
+    partial_path = f"{path}.partial"
+    with open(partial_path, 'w') as f:
+        json.dump({"backups": entries}, f, indent=2)
+    os.replace(partial_path, path)
+
+
+def _new_name(entries, now):
+    name = now.strftime('%Y%m%d_%H%M%S')
+    taken = {entry["name"] for entry in entries}
+    suffix = 1
+    unique = name
+    while unique in taken:
+        unique = f"{name}_{suffix}"
+        suffix += 1
+    return unique
+
+
+def _latest_full(entries):
+    fulls = [entry for entry in entries if entry["kind"] == "full"]
+    return fulls[-1] if fulls else None
+
+
+def create_backup(chain_dir, full=False, now=None):
+    """Add a point to the chain: a full snapshot, or the pages changed since the last one.
+
+    A full snapshot is taken when asked, when there is none, when the last
+    one is older than FULL_INTERVAL, or when the page size changed.
+    Requires an app context. Returns the manifest entry.
+    """
+    now = now or datetime.now()
+    os.makedirs(chain_dir, exist_ok=True)
+    with _lock:
+        entries = load_manifest(chain_dir)
+        fd, snapshot_path = tempfile.mkstemp(prefix='.snapshot_', suffix='.tmp', dir=chain_dir)
+        os.close(fd)
+        try:
+            backups.snapshot(snapshot_path)
+            page_size = read_page_size(snapshot_path)
+            base = _latest_full(entries)
+            if (full or base is None or base["page_size"] != page_size
+                    or now - datetime.fromisoformat(base["created_at"]) >= timedelta(seconds=FULL_INTERVAL)):
+                entry = _write_full(chain_dir, _new_name(entries, now), snapshot_path, page_size)
+            else:
+                entry = _write_diff(chain_dir, _new_name(entries, now), snapshot_path, page_size, base)
+        finally:
+            os.remove(snapshot_path)
+        entry["created_at"] = now.isoformat()
+        entries.append(entry)
+        save_manifest(chain_dir, entries)
+    logger.info(f"Backup {entry['name']} ({entry['kind']}, {entry['size']} bytes) added to the chain")
+    return entry
+
+
+def _write_full(chain_dir, name, snapshot_path, page_size):
+    archive = f"full_{name}.db.gz"
+    hashes = f"full_{name}.hashes"
+    page_count = 0
+    with open(os.path.join(chain_dir, hashes), 'wb') as f:
+        for page in iter_pages(snapshot_path, page_size):
+            f.write(page_digest(page))
+            page_count += 1
+    backups.write_archive(snapshot_path, os.path.join(chain_dir, archive))
+    return {
+        "name": name,
+        "kind": "full",
+        "file": archive,
+        "hashes": hashes,
+        "page_size": page_size,
+        "page_count": page_count,
+        "size": os.path.getsize(os.path.join(chain_dir, archive)),
+    }
+
+
+def _write_diff(chain_dir, name, snapshot_path, page_size, base):
+    with open(os.path.join(chain_dir, base["hashes"]), 'rb') as f:
+        base_hashes = f.read()
+
+    archive = f"diff_{name}.pages.gz"
+    archive_path = os.path.join(chain_dir, archive)
+    page_count = changed = 0
+    with gzip.open(f"{archive_path}.partial", 'wb', compresslevel=backups.COMPRESS_LEVEL) as out:
+        out.write(DIFF_MAGIC + DIFF_HEADER.pack(page_size))
+        for page_number, page in enumerate(iter_pages(snapshot_path, page_size)):
+            offset = page_number * HASH_SIZE
+            if base_hashes[offset:offset + HASH_SIZE] != page_digest(page):
+                out.write(PAGE_HEADER.pack(page_number))
+                out.write(page)
+                changed += 1
+            page_count += 1
+    os.replace(f"{archive_path}.partial", archive_path)
+    return {
+        "name": name,
+        "kind": "diff",
+        "base": base["name"],
+        "file": archive,
+        "page_size": page_size,
+        "page_count": page_count,
+        "changed_pages": changed,
+        "size": os.path.getsize(archive_path),
+    }
+
+
+def materialize(chain_dir, name, dest_path):
+    """Rebuild the database as of backup `name` into dest_path."""
+    with _lock:
+        entries = {entry["name"]: entry for entry in load_manifest(chain_dir)}
+        entry = entries.get(name)
+        if entry is None:
+            raise KeyError(name)
+        base = entries[entry["base"]] if entry["kind"] == "diff" else entry
+
+        with gzip.open(os.path.join(chain_dir, base["file"]), 'rb') as source, open(dest_path, 'wb') as dest:
+            while True:
+                chunk = source.read(backups.CHUNK_SIZE)
+                if not chunk:
+                    break
+                dest.write(chunk)
+
+        if entry["kind"] == "diff":
+            page_size = entry["page_size"]
+            with gzip.open(os.path.join(chain_dir, entry["file"]), 'rb') as diff, open(dest_path, 'r+b') as dest:
+                header = diff.read(len(DIFF_MAGIC) + DIFF_HEADER.size)
+                if not header.startswith(DIFF_MAGIC):
+                    raise ValueError(f"{entry['file']} is not a page diff")
+                while True:
+                    record = diff.read(PAGE_HEADER.size)
+                    if not record:
+                        break
+                    page_number, = PAGE_HEADER.unpack(record)
+                    dest.seek(page_number * page_size)
+                    dest.write(diff.read(page_size))
+                dest.truncate(entry["page_count"] * page_size)
+    return dest_path
+
+
+def select_retained(entries, keep_hourly=KEEP_HOURLY, keep_daily=KEEP_DAILY):
+    """Names to keep: newest per hour for the last keep_hourly hours with a
+    backup, newest per day for the last keep_daily days, the bases those
+    need, and the current full snapshot."""
+    keep = set()
+    hours = set()
+    days = set()
+    for entry in sorted(entries, key=lambda e: e["created_at"], reverse=True):
+        created = datetime.fromisoformat(entry["created_at"])
+        hour = created.strftime('%Y%m%d%H')
+        day = created.strftime('%Y%m%d')
+        if hour not in hours and len(hours) < keep_hourly:
+            hours.add(hour)
+            keep.add(entry["name"])
+        if day not in days and len(days) < keep_daily:
+            days.add(day)
+            keep.add(entry["name"])
+    keep |= {entry["base"] for entry in entries if entry["kind"] == "diff" and entry["name"] in keep}
+    latest = _latest_full(entries)
+    if latest:
+        keep.add(latest["name"])
+    return keep
+
+
+def apply_retention(chain_dir, keep_hourly=KEEP_HOURLY, keep_daily=KEEP_DAILY):
+    """Delete the backups the policy no longer keeps. Returns their names."""
+    with _lock:
+        entries = load_manifest(chain_dir)
+        keep = select_retained(entries, keep_hourly, keep_daily)
+        removed = [entry for entry in entries if entry["name"] not in keep]
+        if not removed:
+            return []
+        save_manifest(chain_dir, [entry for entry in entries if entry["name"] in keep])
+        for entry in removed:
+            for key in ("file", "hashes"):
+                if key in entry:
+                    path = os.path.join(chain_dir, entry[key])
+                    if os.path.exists(path):
+                        os.remove(path)
+    names = [entry["name"] for entry in removed]
+    logger.info(f"Retention removed {len(names)} backups: {', '.join(names)}")
+    return names
+
+
+def run_worker():
+    """Take a scheduled backup every BACKUP_INTERVAL and apply the retention policy."""
+    while not _stop.wait(BACKUP_INTERVAL):
+        try:
+            with _app.app_context():
+                create_backup(_chain_dir)
+            apply_retention(_chain_dir)
+        except Exception as e:
+            logger.error(f"Scheduled backup failed: {e}")
+
+
+def init_backup_chain(app, chain_dir):
+    """Start the scheduled backup/retention job writing to chain_dir."""
+    global _app, _chain_dir, _worker
+    if _worker is not None:
+        return
+    _app = app
+    _chain_dir = chain_dir
+    _worker = Thread(target=run_worker, name="backup-chain", daemon=True)
+    _worker.start()
+    logger.info(f"Scheduled backups every {BACKUP_INTERVAL}s into {chain_dir}")
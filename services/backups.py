@@ -0,0 +1,211 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import zlib
+from sqlalchemy import text
+from database.database import db
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Online backup configuration
+BACKUP_STEP_PAGES = 256     # Pages copied per backup step (1 MB at 4 KB pages)
+BACKUP_STEP_SLEEP = 0.005   # Seconds between steps, letting writers in
+MAX_RESTARTS = 3            # Step-wise restarts tolerated before one-shot copying
+CHUNK_SIZE = 64 * 1024      # Bytes per compressed/streamed chunk
+COMPRESS_LEVEL = 6
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class BackupRestarted(Exception):
+    """Raised from the progress callback to abandon a step-wise backup."""
+
+
+class InvalidBackup(Exception):
+    """A file offered for restore is not a usable database for these models."""
+
+
+def database_path():
+    """Filesystem path of the live SQLite database. Requires an app context."""
+    return db.engine.url.database
+
+
+def snapshot(dest_path):
+    """Copy the live database to dest_path with SQLite's online backup API.
+
+    Pages are copied BACKUP_STEP_PAGES at a time so writers can commit
+    between steps. A commit from another connection restarts the backup
+    from the first page; if that keeps happening it falls back to a single
+    step, which under WAL holds only a read snapshot and still doesn't
+    block writers. Requires an app context.
+    """
+    raw = db.engine.raw_connection()
+    try:
+        source = raw.driver_connection
+        for step_pages in (BACKUP_STEP_PAGES, -1):
+            dest = sqlite3.connect(dest_path)
+            restarts = 0
+            last_remaining = None
+
+            def progress(_status, remaining, _total):
+                nonlocal restarts, last_remaining
+                if last_remaining is not None and remaining > last_remaining:
+                    restarts += 1
+                    if restarts > MAX_RESTARTS:
+                        raise BackupRestarted()
+                last_remaining = remaining
+
+            try:
+                source.backup(dest, pages=step_pages, progress=progress, sleep=BACKUP_STEP_SLEEP)
+                return dest_path
+            except BackupRestarted:
+                logger.info(f"Backup restarted {restarts} times by concurrent writes, copying in one step")
+            finally:
+                dest.close()
+    finally:
+        raw.close()
+
+
+def iter_compressed(source_path, archive_path=None):
+    """Yield source_path gzip-compressed in chunks, optionally teeing to archive_path.
+
+    The archive is written under a temporary name and only renamed into
+    place once complete, so an aborted download never leaves a partial
+    archive behind.
+    """
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    partial_path = f"{archive_path}.partial" if archive_path else None
+    archive = open(partial_path, 'wb') if partial_path else None
+    completed = False
+    try:
+        with open(source_path, 'rb') as source:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                data = compressor.compress(chunk) if chunk else compressor.flush()
+                if data:
+                    if archive:
+                        archive.write(data)
+                    yield data
+                if not chunk:
+                    break
+        completed = True
+    finally:
+        if archive:
+            archive.close()
+            if completed:
+                os.replace(partial_path, archive_path)
+            else:
+                os.remove(partial_path)
+
+
+def write_archive(source_path, archive_path):
+    """Compress source_path into archive_path without streaming it anywhere."""
+    for _ in iter_compressed(source_path, archive_path):
+        pass
+    return archive_path
+
+
+def staging_path():
+    """New empty file next to the live database, so it can be swapped in with os.replace.
+
+    Requires an app context.
+    """
+    fd, path = tempfile.mkstemp(prefix='.restore_', suffix='.tmp', dir=os.path.dirname(database_path()))
+    os.close(fd)
+    return path
+
+
+def receive_upload(stream, dest_path):
+    """Copy an uploaded .db or .db.gz stream to dest_path CHUNK_SIZE bytes at a time.
+
+    Gzip input is recognised by its magic bytes and inflated on the way;
+    a corrupt or truncated gzip stream raises InvalidBackup.
+    """
+    try:
+        return _copy_upload(stream, dest_path)
+    except (zlib.error, EOFError) as e:
+        raise InvalidBackup(f"Corrupt gzip upload: {e}")
+
+
+def _copy_upload(stream, dest_path):
+    decompressor = None
+    with open(dest_path, 'wb') as dest:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if decompressor is None:
+                if chunk.startswith(GZIP_MAGIC):
+                    decompressor = zlib.decompressobj(31)
+                else:
+                    decompressor = False
+            if not chunk:
+                break
+            if decompressor:
+                data = decompressor.decompress(chunk, CHUNK_SIZE)
+                while data:
+                    dest.write(data)
+                    data = decompressor.decompress(decompressor.unconsumed_tail, CHUNK_SIZE)
+            else:
+                dest.write(chunk)
+        if decompressor:
+            dest.write(decompressor.flush())
+            if not decompressor.eof:
+                raise InvalidBackup("Truncated gzip upload")
+    return dest_path
+
+
+def validate_database(path, metadata):
+    """Raise InvalidBackup unless path passes integrity_check and matches the models.
+
+    Every model table must exist. Missing nullable columns are accepted,
+    since the bootstrap migrations add them after the restore.
+    """
+    try:
+        connection = sqlite3.connect(path)
+    except sqlite3.Error as e:
+        raise InvalidBackup(f"Cannot open backup: {e}")
+    try:
+        try:
+            result = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+        except sqlite3.DatabaseError as e:
+            raise InvalidBackup(f"Not an SQLite database: {e}")
+        if result != ['ok']:
+            raise InvalidBackup(f"Integrity check failed: {'; '.join(result[:5])}")
+
+        problems = []
+        tables = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in metadata.sorted_tables:
+            if table.name not in tables:
+                problems.append(f"missing table {table.name}")
+                continue
+            columns = {row[1] for row in connection.execute(f'PRAGMA table_info("{table.name}")')}
+            for column in table.columns:
+                if column.name not in columns and (not column.nullable or column.primary_key):
+                    problems.append(f"missing column {table.name}.{column.name}")
+        if problems:
+            raise InvalidBackup(f"Schema does not match the models: {', '.join(problems)}")
+    finally:
+        connection.close()
+
+
+def swap_database(source_path):
+    """Atomically replace the live database file with source_path.
+
+    source_path must be validated and on the same filesystem (see
+    staging_path). The WAL is checkpointed and the pool disposed first, so
+    no pooled connection or leftover -wal/-shm file refers to the old
+    database. Requires an app context.
+    """
+    live_path = database_path()
+    with db.engine.connect() as connection:
+        connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    db.session.remove()
+    db.engine.dispose()
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(live_path + suffix):
+            os.remove(live_path + suffix)
+    os.replace(source_path, live_path)
+    logger.info(f"Database replaced from {os.path.basename(source_path)}")
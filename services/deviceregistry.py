@@ -0,0 +1,31 @@
+import logging
+from database.database import db, Sensor
+from services.lazycache import LazyValue
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def load_devices():
+    """Device ids with at least one registered sensor. Requires an app context."""
+    return frozenset(device_id for device_id, in db.session.query(Sensor.device_id).distinct())
+
+
+# Consulted before rules, timers and scenes send a relay command; pairing,
+# device deletion and restore invalidate it
+_devices = LazyValue(load_devices)
+
+
+def registered_devices():
+    """Device ids known to the database, loaded once. Requires an app context on a miss."""
+    return _devices.get()
+
+
+def is_registered(device_id):
+    return device_id in registered_devices()
+
+
+def invalidate():
+    """Drop the cached set after devices are added or removed."""
+    _devices.invalidate()
@@ -0,0 +1,64 @@
+import logging
+from threading import Lock
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Caches of database state that are built on first use and dropped whenever a
+# route changes the underlying rows. Reads of a loaded value take no lock.
+# Loading holds the lock, so an invalidate() issued mid-load waits for the
+# load to finish and then drops its possibly stale result; the next read
+# loads again. Loaders usually run SQL, so callers need an app context on a
+# miss.
+
+_MISSING = object()
+
+
+class LazyValue:
+    """One value built by load() on first use."""
+
+    def __init__(self, load):
+        self._load = load
+        self._lock = Lock()
+        self._value = _MISSING
+
+    def get(self):
+        value = self._value
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            if self._value is _MISSING:
+                self._value = self._load()
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = _MISSING
+
+
+class LazyMap:
+    """Values built per key by load(key) on first use."""
+
+    def __init__(self, load):
+        self._load = load
+        self._lock = Lock()
+        self._values = {}
+
+    def get(self, key):
+        value = self._values.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            value = self._values.get(key, _MISSING)
+            if value is _MISSING:
+                value = self._values[key] = self._load(key)
+            return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or every key when key is None."""
+        with self._lock:
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
@@ -0,0 +1,109 @@
+import heapq
+import logging
+import time
+from threading import Condition, Lock, Thread
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class LivenessTracker:
+    """Online/offline tracking driven by a deadline heap.
+
+    Each online device has exactly one heap entry. seen() on an online
+    device only stamps its time; when the entry comes due the device is
+    either rescheduled to its real deadline (it was seen since) or marked
+    offline. A device that keeps reporting therefore costs one heap pop and
+    push per timeout period, so the watcher's work still grows with the
+    number of online devices, but it is O(log n) per device per period
+    instead of a full scan on every tick. Timestamps are monotonic.
+
+    Transitions are delivered under a lock of their own, and a transition
+    whose state was already reversed by the time it is delivered is
+    dropped, so listeners see the events in order and the last event is
+    always the current state.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._last_seen = {}  # device_id -> monotonic time
+        self._online = set()
+        self._heap = []       # (deadline, device_id), one entry per online device
+        self._cond = Condition()
+        self._listeners = []
+        self._notify_lock = Lock()  # Serialises deliveries to the listeners
+        self._thread = None
+
+    def add_listener(self, listener):
+        """Call listener(device_id, online) on every online/offline transition."""
+        self._listeners.append(listener)
+        return listener
+
+    def seen(self, device_id, now=None):
+        """Record a message from a device. Cheap unless the device was offline."""
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            self._last_seen[device_id] = now
+            if device_id in self._online:
+                return
+            self._online.add(device_id)
+            was_idle = not self._heap
+            heapq.heappush(self._heap, (now + self.timeout, device_id))
+            if was_idle:
+                self._cond.notify()
+        self._notify(device_id, True)
+
+    def is_online(self, device_id):
+        return device_id in self._online
+
+    def last_seen(self, device_id):
+        return self._last_seen.get(device_id)
+
+    def expire(self, now=None):
+        """Mark every device whose deadline has passed offline; return them."""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                _, device_id = heapq.heappop(self._heap)
+                deadline = self._last_seen[device_id] + self.timeout
+                if deadline > now:
+                    # Seen since this entry was scheduled
+                    heapq.heappush(self._heap, (deadline, device_id))
+                else:
+                    self._online.discard(device_id)
+                    expired.append(device_id)
+        for device_id in expired:
+            self._notify(device_id, False)
+        return expired
+
+    def _notify(self, device_id, online):
+        with self._notify_lock:
+            # seen() and expire() deliver outside _cond; if the device flipped
+            # again since, its own later delivery carries the current state
+            if (device_id in self._online) != online:
+                return
+            self._deliver(device_id, online)
+
+    def _deliver(self, device_id, online):
+        for listener in self._listeners:
+            try:
+                listener(device_id, online)
+            except Exception as e:
+                logger.error(f"Liveness listener failed for {device_id}: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._heap:
+                    self._cond.wait(max(0.0, self._heap[0][0] - time.monotonic()))
+                else:
+                    self._cond.wait()
+            self.expire()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name="device-liveness", daemon=True)
+            self._thread.start()
+        return self
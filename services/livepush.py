@@ -0,0 +1,106 @@
+import logging
+from threading import Lock
+from flask import request
+from flask_login import current_user
+from flask_socketio import join_room, leave_room
+# livestate registers its consumer on import, so the store is updated before on_message runs
+from services import livestate, mqttbus
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+IGNORED_KEYS = ("ip",)
+
+_socketio = None
+_lock = Lock()
+_subscriptions = {}   # sid -> set of device ids
+_room_members = {}    # device_id -> number of subscribed sids
+_pushed_version = {}  # device_id -> store version its room has been sent, for subscribed devices
+
+
+def room_for(device_id):
+    return f"device:{device_id}"
+
+
+def on_message(_topic, payload, received_at):
+    """MQTT consumer: push only the values that changed, and only to subscribed rooms."""
+    device_id = payload.get("deviceId")
+    if not device_id or not _room_members.get(device_id):
+        return
+
+    # The store only moves a key's version when its value changes
+    with _lock:
+        version, changes = livestate.store.changes_since(_pushed_version.get(device_id, 0), (device_id,))
+        _pushed_version[device_id] = version
+
+    deltas = [list(change) for change in changes if change[1] not in IGNORED_KEYS]
+    if deltas:
+        _socketio.emit('sensor_delta', {"deltas": deltas}, to=room_for(device_id))
+
+
+def handle_connect(auth=None):
+    """Only logged-in users may open a live connection."""
+    if not current_user.is_authenticated:
+        return False
+
+
+def handle_subscribe(data):
+    """Join the rooms of the requested devices and send their current values."""
+    device_ids = {str(d) for d in (data or {}).get('device_ids', []) if d}
+    sid = request.sid
+    with _lock:
+        current = _subscriptions.setdefault(sid, set())
+        for device_id in device_ids - current:
+            join_room(room_for(device_id))
+            _room_members[device_id] = _room_members.get(device_id, 0) + 1
+        current |= device_ids
+
+        # Initial snapshot so the page doesn't wait for the next change
+        version, changes = livestate.store.changes_since(0, device_ids)
+        for device_id in device_ids:
+            _pushed_version.setdefault(device_id, version)
+
+    snapshot = [list(change) for change in changes if change[1] not in IGNORED_KEYS]
+    if snapshot:
+        _socketio.emit('sensor_delta', {"deltas": snapshot}, to=sid)
+
+
+def handle_unsubscribe(data):
+    device_ids = {str(d) for d in (data or {}).get('device_ids', []) if d}
+    _leave(request.sid, device_ids, leave_rooms=True)
+
+
+def handle_disconnect(*args):
+    # Socket.IO drops the rooms itself on disconnect
+    _leave(request.sid, None, leave_rooms=False)
+
+
+def _leave(sid, device_ids, leave_rooms):
+    with _lock:
+        current = _subscriptions.get(sid, set())
+        leaving = current if device_ids is None else current & device_ids
+        for device_id in leaving:
+            if leave_rooms:
+                leave_room(room_for(device_id))
+            remaining = _room_members.get(device_id, 1) - 1
+            if remaining > 0:
+                _room_members[device_id] = remaining
+            else:
+                _room_members.pop(device_id, None)
+                _pushed_version.pop(device_id, None)
+        current -= leaving
+        if not current:
+            _subscriptions.pop(sid, None)
+
+
+def init_live_push(socketio):
+    """Register the Socket.IO handlers and subscribe to the MQTT ingest bus."""
+    global _socketio
+    _socketio = socketio
+    socketio.on_event('connect', handle_connect)
+    socketio.on_event('subscribe', handle_subscribe)
+    socketio.on_event('unsubscribe', handle_unsubscribe)
+    socketio.on_event('disconnect', handle_disconnect)
+    mqttbus.register_consumer(on_message)
+    logger.info("Live sensor push enabled")
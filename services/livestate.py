@@ -0,0 +1,362 @@
+import logging
+import sys
+import time
+from array import array
+from collections import namedtuple
+from threading import Lock
+from services import mqttbus
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# How a slot's value is held. FLOAT/INT are unboxed in the numbers column;
+# SHARED and IPV4 keep a string there as a string-table index or a packed
+# address; OBJECT values sit in a sparse slot -> object map.
+FLOAT, INT, SHARED, IPV4, OBJECT = 0, 1, 2, 3, 4
+UNKNOWN = -1              # Device online flag before liveness reports
+MAX_SHARED_STRINGS = 4096  # Distinct short string values shared between slots
+MAX_SHARED_LENGTH = 32
+
+# One device as of a snapshot. values/stamps map sensor key (including "ip")
+# to the last value and the time it was received.
+DeviceState = namedtuple('DeviceState', 'device_id values stamps last_seen changed_at online')
+
+
+def _pack_ipv4(value):
+    """The address as an int if value is a canonical dotted quad, else None."""
+    parts = value.split('.')
+    if len(parts) != 4 or not value.isascii():
+        return None
+    packed = 0
+    for part in parts:
+        if not part.isdigit() or (part[0] == '0' and part != '0') or len(part) > 3:
+            return None
+        octet = int(part)
+        if octet > 255:
+            return None
+        packed = packed << 8 | octet
+    return packed
+
+
+def _unpack_ipv4(packed):
+    return f"{packed >> 24}.{packed >> 16 & 255}.{packed >> 8 & 255}.{packed & 255}"
+
+
+class Snapshot:
+    """Immutable view of the store at one version; safe to keep and iterate."""
+
+    def __init__(self, version, devices):
+        self.version = version
+        self._devices = devices
+
+    @property
+    def devices(self):
+        """{device_id: DeviceState}. Callers must not mutate it."""
+        return self._devices
+
+    def device(self, device_id):
+        return self._devices.get(device_id)
+
+    def __len__(self):
+        return len(self._devices)
+
+
+class LiveStateStore:
+    """Latest value of every (device, sensor key) seen on the bus.
+
+    Each (device_id, key) is interned to an integer slot on first sight.
+    Devices reporting the same set of keys share one "shape", a key ->
+    offset map, and own a contiguous run of slots starting at their base;
+    a new key moves the device to a wider shape and a fresh run. A slot is
+    a kind tag, a double, a receive time and a version, all in arrays:
+    numbers are stored unboxed, short repeated strings ("ON", "OPEN") as an
+    index into a shared string table and IP addresses packed, so only the
+    rare other value is a Python object. See benchmarks/bench_live_state.py
+    for the memory per sensor.
+
+    Every write takes the next store version, and a key's version only
+    moves when its value changes, so changes_since() yields real deltas.
+
+    Writers serialise on a lock. value() and changes_since() never take it:
+    they read the arrays and retry if a write ran meanwhile, seqlock style,
+    so they never block ingest and never see a half-applied message.
+    snapshot() takes it only to rebuild the devices written since the
+    previous snapshot; the rest are carried over, and the result is shared
+    by every reader of that version.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._seq = 0             # Odd while a write is in progress
+        self.version = 0
+        self._devices = {}        # device_id -> device index
+        self._dirty = []          # Device indexes written since the last snapshot
+        # Shared strings: append-only, so an index stays valid for readers
+        self._string_ids = {}     # string -> index
+        self._strings = []        # index -> string
+        # Shapes: never modified once created
+        self._shapes = [{}]       # shape id -> {key: offset}
+        self._shape_ids = {(): 0}  # sorted keys -> shape id
+        # Device columns
+        self._device_ids = []
+        self._seen = array('d')       # Receive time of the last message
+        self._changed = array('d')    # Last message, status change or touch()
+        self._online = array('b')     # 1, 0 or UNKNOWN
+        self._is_dirty = bytearray()  # 1 while the device is listed in _dirty
+        self._device_shape = array('I')
+        self._device_base = array('I')
+        # Slot columns
+        self._kinds = array('b')
+        self._numbers = array('d')
+        self._stamps = array('d')
+        self._versions = array('Q')
+        self._objects = {}            # slot -> value, for OBJECT slots only
+        self._snapshot = Snapshot(0, {})
+        self._snapshot_lock = Lock()  # One reader rebuilds, the others wait and share it
+
+    def __len__(self):
+        return len(self._device_ids)
+
+    def _mark_dirty(self, device):
+        if not self._is_dirty[device]:
+            self._is_dirty[device] = 1
+            self._dirty.append(device)
+
+    def _begin(self):
+        self._seq += 1
+        self.version += 1
+        return self.version
+
+    def _end(self):
+        self._seq += 1
+
+    def _device_index(self, device_id, now):
+        index = self._devices.get(device_id)
+        if index is None:
+            index = len(self._device_ids)
+            self._device_ids.append(device_id)
+            self._seen.append(now)
+            self._changed.append(now)
+            self._online.append(UNKNOWN)
+            self._device_shape.append(0)
+            self._device_base.append(0)
+            self._is_dirty.append(0)
+            self._devices[device_id] = index
+        return index
+
+    def _widen(self, device, shape, new_keys, version, now):
+        """Move a device to the shape with new_keys added; returns that shape."""
+        keys = tuple(sorted(set(shape) | set(new_keys)))
+        shape_id = self._shape_ids.get(keys)
+        if shape_id is None:
+            shape_id = len(self._shapes)
+            self._shapes.append({sys.intern(key): offset for offset, key in enumerate(keys)})
+            self._shape_ids[keys] = shape_id
+        wider = self._shapes[shape_id]
+
+        old_base = self._device_base[device]
+        base = len(self._kinds)
+        for key in keys:
+            offset = shape.get(key)
+            if offset is None:
+                self._kinds.append(OBJECT)
+                self._numbers.append(0.0)
+                self._stamps.append(now)
+                self._versions.append(version)
+            else:
+                slot = old_base + offset
+                self._kinds.append(self._kinds[slot])
+                self._numbers.append(self._numbers[slot])
+                self._stamps.append(self._stamps[slot])
+                self._versions.append(self._versions[slot])
+                if slot in self._objects:
+                    self._objects[base + wider[key]] = self._objects[slot]
+        # The old run is left unused; a device only widens when its firmware adds a sensor
+        for offset in shape.values():
+            self._objects.pop(old_base + offset, None)
+        self._device_shape[device] = shape_id
+        self._device_base[device] = base
+        return wider
+
+    def _encode(self, value):
+        """(kind, number, object) for a value."""
+        value_type = type(value)
+        if value_type is float:
+            return FLOAT, value, None
+        if value_type is int and -2 ** 53 <= value <= 2 ** 53:
+            return INT, float(value), None
+        if value_type is str and len(value) <= MAX_SHARED_LENGTH:
+            index = self._string_ids.get(value)
+            if index is not None:
+                return SHARED, float(index), None
+            packed = _pack_ipv4(value) if value.count('.') == 3 else None
+            if packed is not None:
+                return IPV4, float(packed), None
+            if len(self._strings) < MAX_SHARED_STRINGS:
+                index = self._string_ids[value] = len(self._strings)
+                self._strings.append(value)
+            if index is not None:
+                return SHARED, float(index), None
+        return OBJECT, 0.0, value
+
+    def _value(self, slot):
+        kind = self._kinds[slot]
+        if kind == FLOAT:
+            return self._numbers[slot]
+        if kind == INT:
+            return int(self._numbers[slot])
+        if kind == SHARED:
+            return self._strings[int(self._numbers[slot])]
+        if kind == IPV4:
+            return _unpack_ipv4(int(self._numbers[slot]))
+        return self._objects.get(slot)
+
+    def update(self, device_id, payload, received_at):
+        """Apply one decoded message."""
+        with self._lock:
+            version = self._begin()
+            try:
+                device = self._device_index(device_id, received_at)
+                shape = self._shapes[self._device_shape[device]]
+                new_keys = [key for key in payload if key not in shape and key != "deviceId"]
+                if new_keys:
+                    shape = self._widen(device, shape, new_keys, version, received_at)
+                base = self._device_base[device]
+                for key, value in payload.items():
+                    if key == "deviceId":
+                        continue
+                    kind, number, obj = self._encode(value)
+                    slot = base + shape[key]
+                    if (kind != self._kinds[slot] or number != self._numbers[slot]
+                            or (kind == OBJECT and obj != self._objects.get(slot))):
+                        if kind == OBJECT:
+                            self._objects[slot] = obj
+                        elif self._kinds[slot] == OBJECT:
+                            self._objects.pop(slot, None)
+                        self._kinds[slot] = kind
+                        self._numbers[slot] = number
+                        self._versions[slot] = version
+                    self._stamps[slot] = received_at
+                self._seen[device] = received_at
+                self._changed[device] = received_at
+                self._mark_dirty(device)
+            finally:
+                self._end()
+
+    def set_online(self, device_id, online, at=None):
+        at = time.time() if at is None else at
+        with self._lock:
+            self._begin()
+            try:
+                device = self._device_index(device_id, at)
+                self._online[device] = 1 if online else 0
+                self._changed[device] = at
+                self._mark_dirty(device)
+            finally:
+                self._end()
+
+    def touch(self, device_id, at=None):
+        """Mark a known device changed without new data, e.g. after (un)pairing."""
+        at = time.time() if at is None else at
+        with self._lock:
+            device = self._devices.get(device_id)
+            if device is None:
+                return
+            self._begin()
+            try:
+                self._changed[device] = at
+                self._mark_dirty(device)
+            finally:
+                self._end()
+
+    def value(self, device_id, key, default=None):
+        """Last value of one key, without a snapshot."""
+        device = self._devices.get(device_id)
+        if device is None:
+            return default
+        while True:
+            seq = self._seq
+            if seq & 1:
+                time.sleep(0)  # Let the writer finish
+                continue
+            offset = self._shapes[self._device_shape[device]].get(key)
+            value = default if offset is None else self._value(self._device_base[device] + offset)
+            if self._seq == seq:
+                return value
+
+    def _device_state(self, device):
+        """DeviceState of one device index, read from the columns."""
+        values = {}
+        stamps = {}
+        base = self._device_base[device]
+        for key, offset in self._shapes[self._device_shape[device]].items():
+            values[key] = self._value(base + offset)
+            stamps[key] = self._stamps[base + offset]
+        online = self._online[device]
+        return DeviceState(self._device_ids[device], values, stamps, self._seen[device],
+                           self._changed[device], None if online == UNKNOWN else bool(online))
+
+    def snapshot(self):
+        """Immutable Snapshot of the current version."""
+        snapshot = self._snapshot
+        if snapshot.version == self.version:
+            return snapshot
+        with self._snapshot_lock:
+            snapshot = self._snapshot
+            if snapshot.version == self.version:
+                return snapshot
+            # Only devices written since the last snapshot are rebuilt
+            with self._lock:
+                version = self.version
+                dirty, self._dirty = self._dirty, []
+                states = []
+                for device in dirty:
+                    self._is_dirty[device] = 0
+                    states.append(self._device_state(device))
+            devices = dict(snapshot.devices)
+            for state in states:
+                devices[state.device_id] = state
+            snapshot = self._snapshot = Snapshot(version, devices)
+            return snapshot
+
+    def changes_since(self, version, device_ids=None):
+        """(current version, [(device_id, key, value, received_at), ...]) for values changed after `version`.
+
+        Reads the columns directly, so with device_ids (only those devices)
+        a per-message caller stays cheap.
+        """
+        if device_ids is None:
+            device_ids = list(self._devices)
+        indexes = [(device_id, self._devices.get(device_id)) for device_id in device_ids]
+        while True:
+            seq = self._seq
+            if seq & 1:
+                time.sleep(0)  # Let the writer finish
+                continue
+            current = self.version
+            changes = []
+            for device_id, device in indexes:
+                if device is None:
+                    continue
+                base = self._device_base[device]
+                for key, offset in self._shapes[self._device_shape[device]].items():
+                    slot = base + offset
+                    if self._versions[slot] > version:
+                        changes.append((device_id, key, self._value(slot), self._stamps[slot]))
+            if self._seq == seq:
+                return current, changes
+
+
+# The one store, fed by the shared ingest bus as soon as anything imports it
+store = LiveStateStore()
+
+
+def on_message(_topic, payload, received_at):
+    """MQTT consumer: record every telemetry value."""
+    device_id = payload.get("deviceId")
+    if device_id:
+        store.update(device_id, payload, received_at)
+
+
+mqttbus.register_consumer(on_message)
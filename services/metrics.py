@@ -0,0 +1,276 @@
+import logging
+import math
+import itertools
+import threading
+import time
+import weakref
+from flask import Response, g, has_request_context, jsonify, request
+from flask_login import current_user, login_required
+from sqlalchemy import event
+from database.database import db
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LAG_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, 900)
+
+# Metric updates go to a dict owned by the updating thread, so the hot paths
+# (MQTT network thread, rule worker, request threads) never take a lock or
+# contend on a shared counter. A scrape merges the shards. When a thread exits
+# (one per request under the threaded dev server) its thread-local owner is
+# released and a finalizer folds its shard into _retired, so memory stays
+# bounded by the live threads even if nothing ever scrapes, without scanning
+# the registry. The lock is taken once when a thread first records a metric,
+# once when it exits, and on scrape.
+_local = threading.local()
+_shards = {}             # registration number -> shard, for every live thread that recorded something
+_shard_numbers = itertools.count()
+_shards_lock = threading.RLock()  # Guards _shards and _retired; reentrant in case a finalizer runs during a scrape
+_retired = {}
+_metrics = {}            # name -> Counter / Histogram, in registration order
+_collectors = []         # callables yielding (name, kind, help, [(sample_name, [(label, value)], value), ...])
+
+
+class _ShardOwner:
+    """Held only by the thread-local, so it is released when its thread exits."""
+
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self, shard):
+        self.shard = shard
+
+
+def _shard():
+    owner = getattr(_local, 'owner', None)
+    if owner is not None:
+        return owner.shard
+    shard = {}
+    number = next(_shard_numbers)
+    with _shards_lock:
+        _shards[number] = shard
+    _local.owner = owner = _ShardOwner(shard)
+    weakref.finalize(owner, _retire_shard, number)
+    return shard
+
+
+def _retire_shard(number):
+    """Fold an exited thread's shard into _retired."""
+    with _shards_lock:
+        shard = _shards.pop(number, None)
+        if shard is not None:
+            _fold(_retired, shard)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def inc(self, *labels, amount=1):
+        shard = _shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def observe(self, value, *labels):
+        shard = _shard()
+        key = (self.name, labels)
+        counts = shard.get(key)
+        if counts is None:
+            # One slot per bucket plus +Inf, then sum
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        counts[index] += 1
+        counts[-1] += value
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+
+def register_collector(collector):
+    """Add a callable reporting values kept elsewhere, read at scrape time."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+    return collector
+
+
+def histogram_samples(name, labels, buckets, counts, total):
+    """Collector samples for a histogram kept as per-bucket (non-cumulative) counts,
+    the last count being everything above the final bucket."""
+    samples = []
+    cumulative = 0
+    for bound, count in zip(tuple(buckets) + (math.inf,), counts):
+        cumulative += count
+        samples.append((f"{name}_bucket", list(labels) + [('le', _format_value(float(bound)))], cumulative))
+    samples.append((f"{name}_sum", list(labels), total))
+    samples.append((f"{name}_count", list(labels), cumulative))
+    return samples
+
+
+def snapshot():
+    """Merge every thread's shard into {(name, labels): value}."""
+    merged = {}
+    with _shards_lock:
+        _fold(merged, _retired)
+        for shard in list(_shards.values()):
+            _fold(merged, shard)
+    return merged
+
+
+def _fold(into, shard):
+    # dict.copy() is atomic under the GIL; the owning thread may keep writing
+    for key, value in shard.copy().items():
+        into[key] = _metrics[key[0]].merge(into.get(key), value)
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    values = snapshot()
+    by_metric = {}
+    for (name, labels), value in values.items():
+        by_metric.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, metric in _metrics.items():
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for labels, value in sorted(by_metric.get(name, ()), key=lambda item: tuple(map(str, item[0]))):
+            if metric.kind == 'counter':
+                lines.append(f"{name}{_format_labels(list(zip(metric.labelnames, labels)))} {_format_value(value)}")
+                continue
+            pairs = list(zip(metric.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (math.inf,), value[:-1]):
+                cumulative += count
+                le = ('le', _format_value(float(bound)))
+                lines.append(f"{name}_bucket{_format_labels(pairs + [le])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(pairs)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(pairs)} {cumulative}")
+
+    for collector in tuple(_collectors):
+        try:
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for sample_name, labels, value in samples:
+                    lines.append(f"{sample_name}{_format_labels(list(labels))} {_format_value(value)}")
+        except Exception as e:
+            logger.error(f"Metrics collector {getattr(collector, '__qualname__', collector)} failed: {e}")
+    return '\n'.join(lines) + '\n'
+
+
+# Hub metrics
+mqtt_messages = Counter('hub_mqtt_messages_total', 'MQTT messages received, by topic with the device id masked', ['topic'])
+mqtt_decode_failures = Counter('hub_mqtt_decode_failures_total', 'MQTT messages that were not a JSON object', ['topic'])
+mqtt_decode_seconds = Histogram('hub_mqtt_decode_seconds', 'Time to decode one MQTT payload', FAST_BUCKETS)
+rule_evaluations = Counter('hub_rule_evaluations_total', 'Automation rule predicate evaluations', ['rule_id'])
+rule_fires = Counter('hub_rule_fires_total', 'Automation rules that matched and sent their relay command', ['rule_id'])
+timer_fire_lag = Histogram('hub_timer_fire_lag_seconds', 'Delay between a timer instant and its relay command', LAG_BUCKETS)
+sql_queries = Histogram('hub_sql_query_seconds', 'SQL statement latency by Flask endpoint (background for workers)',
+                        FAST_BUCKETS, ['endpoint'])
+http_requests = Histogram('hub_http_request_seconds', 'Flask request latency by endpoint and status',
+                          REQUEST_BUCKETS, ['endpoint', 'method', 'status'])
+
+
+def topic_label(topic):
+    """home/<deviceId>/sensors -> home/+/sensors, keeping label cardinality bounded."""
+    parts = topic.split('/')
+    if len(parts) > 2:
+        parts[1] = '+'
+    return '/'.join(parts)
+
+
+def _before_cursor_execute(_conn, _cursor, _statement, _parameters, context, _executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(_conn, _cursor, _statement, _parameters, context, _executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None:
+        return
+    endpoint = (request.endpoint or 'unmatched') if has_request_context() else 'background'
+    sql_queries.observe(time.perf_counter() - started, endpoint)
+
+
+def instrument_engine(engine):
+    """Time every statement the engine runs."""
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _start_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is not None:
+        http_requests.observe(time.perf_counter() - started, request.endpoint or 'unmatched',
+                              request.method, response.status_code)
+    return response
+
+
+@login_required
+def metrics_view():
+    """Prometheus scrape target. Endpoint names, rule ids and SQL timings are
+    not public, so this needs an admin session like the other admin routes."""
+    if current_user.role != 1:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    """Time requests and SQL statements, and serve /metrics to admins. Call after db.init_app(app)."""
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    with app.app_context():
+        instrument_engine(db.engine)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    logger.info("Metrics exposed on /metrics")
@@ -0,0 +1,116 @@
+import json
+import logging
+import time
+import paho.mqtt.client as mqtt
+from services import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# MQTT Configuration (overridden from app.config by init_mqtt_bus)
+BROKER_ADDRESS = "atechpromqtt"
+BROKER_PORT = 1883
+MQTT_TOPIC = "home/#"
+
+# Relay commands published by the hub itself (home/<id>/relay/command) come
+# back through the home/# subscription; they are plain strings, not telemetry
+COMMAND_TOPIC_SUFFIX = "/command"
+
+# The one MQTT connection shared by every blueprint
+mqtt_client = mqtt.Client()
+
+# In-process consumers, called with (topic, payload, received_at)
+_consumers = []
+
+
+def register_consumer(consumer):
+    """Register a callable that receives every decoded MQTT message.
+
+    Consumers run on the MQTT network thread, so they must be quick and must
+    not raise; anything slow belongs on a worker thread of its own.
+    """
+    if consumer not in _consumers:
+        _consumers.append(consumer)
+    return consumer
+
+
+def unregister_consumer(consumer):
+    """Remove a previously registered consumer."""
+    if consumer in _consumers:
+        _consumers.remove(consumer)
+
+
+def decode_payload(raw):
+    """Decode a raw MQTT payload into a dict, or return None if it is not a JSON object."""
+    try:
+        payload = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def dispatch(topic, payload, received_at=None):
+    """Fan an already decoded payload out to every registered consumer."""
+    if received_at is None:
+        received_at = time.time()
+    for consumer in tuple(_consumers):
+        try:
+            consumer(topic, payload, received_at)
+        except Exception as e:
+            logger.error(f"MQTT consumer {getattr(consumer, '__qualname__', consumer)} failed: {e}")
+
+
+# MQTT on_connect callback
+def on_connect(client, userdata, flags, rc):
+    """Callback when the MQTT client connects to the broker."""
+    if rc == 0:
+        logger.info("Successfully connected to MQTT broker")
+        client.subscribe(MQTT_TOPIC)
+    else:
+        logger.error(f"Failed to connect with return code {rc}")
+
+
+# MQTT on_message callback
+def on_message(_client, _userdata, msg):
+    """Decode each message exactly once and hand it to the consumers."""
+    topic = metrics.topic_label(msg.topic)
+    metrics.mqtt_messages.inc(topic)
+    if msg.topic.endswith(COMMAND_TOPIC_SUFFIX):
+        return
+    started = time.perf_counter()
+    payload = decode_payload(msg.payload)
+    metrics.mqtt_decode_seconds.observe(time.perf_counter() - started)
+    if payload is None:
+        metrics.mqtt_decode_failures.inc(topic)
+        logger.debug(f"Ignoring non-JSON message on {msg.topic}")
+        return
+    dispatch(msg.topic, payload)
+
+
+def publish(topic, payload):
+    """Publish on the shared MQTT connection."""
+    return mqtt_client.publish(topic, payload)
+
+
+def init_mqtt_bus(app=None, client=None):
+    """Connect the shared MQTT client and start its network thread.
+
+    ``client`` lets tools swap in a stand-in broker client with the same
+    interface as ``paho.mqtt.client.Client``.
+    """
+    global mqtt_client, BROKER_ADDRESS, BROKER_PORT, MQTT_TOPIC
+    if app is not None:
+        BROKER_ADDRESS = app.config.get('BROKER_ADDRESS', BROKER_ADDRESS)
+        BROKER_PORT = app.config.get('BROKER_PORT', BROKER_PORT)
+        MQTT_TOPIC = app.config.get('MQTT_TOPIC', MQTT_TOPIC)
+    if client is not None:
+        mqtt_client = client
+    try:
+        mqtt_client.on_connect = on_connect
+        mqtt_client.on_message = on_message
+        mqtt_client.connect(BROKER_ADDRESS, BROKER_PORT)
+        mqtt_client.loop_start()
+        logger.info(f"Connected to MQTT broker at {BROKER_ADDRESS}:{BROKER_PORT}")
+    except Exception as e:
+        logger.error(f"Error connecting to MQTT broker: {e}")
@@ -0,0 +1,244 @@
+import heapq
+import logging
+import time
+from collections import OrderedDict
+from itertools import count
+from threading import Condition, Thread
+from services import metrics, mqttbus
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Command pipeline configuration
+ACK_TIMEOUT = 5        # Seconds to wait for the relay value to match before retrying
+MAX_RETRIES = 2        # Re-publishes after the first attempt before giving up
+HISTORY_SIZE = 1000    # Finished commands kept for status lookups
+
+# Upper bounds (seconds) of the command -> state latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+VALID_STATES = ('ON', 'OFF')
+
+_cond = Condition()  # Reentrant, so send_many can hold it across send()
+_ids = count(1)
+_pending = {}            # device_id -> RelayCommand awaiting its ack
+_deadlines = []          # (deadline, command_id, device_id), stale entries skipped
+_commands = OrderedDict()  # command_id -> RelayCommand, pending and recent
+_latency = {}            # device_id -> {"buckets": [...], "sum": float, "count": int}
+_worker = None
+
+stats = {
+    "sent": 0,
+    "acked": 0,
+    "retries": 0,
+    "timeouts": 0,
+    "superseded": 0,       # Replaced by a newer command to the same relay before acking
+    "publish_failures": 0,
+}
+
+
+class RelayCommand:
+    """One ON/OFF command and its delivery state."""
+
+    __slots__ = ('command_id', 'device_id', 'state', 'source', 'status',
+                 'attempts', 'sent_at', 'acked_at')
+
+    def __init__(self, command_id, device_id, state, source):
+        self.command_id = command_id
+        self.device_id = device_id
+        self.state = state
+        self.source = source
+        self.status = 'pending'   # pending, acked, timeout, superseded
+        self.attempts = 0
+        self.sent_at = None
+        self.acked_at = None
+
+    @property
+    def latency(self):
+        if self.acked_at is None:
+            return None
+        return self.acked_at - self.sent_at
+
+    def to_dict(self):
+        return {
+            "command_id": self.command_id,
+            "device_id": self.device_id,
+            "state": self.state,
+            "source": self.source,
+            "status": self.status,
+            "attempts": self.attempts,
+            "sent_at": self.sent_at,
+            "acked_at": self.acked_at,
+            "latency": self.latency,
+        }
+
+
+def _publish(command):
+    """Publish one attempt. Requires _cond."""
+    command.attempts += 1
+    result = mqttbus.publish(f"home/{command.device_id}/relay/command", command.state)
+    if getattr(result, 'rc', 0) != 0:
+        stats["publish_failures"] += 1
+        logger.warning(f"Publishing command {command.command_id} to {command.device_id} failed (rc={result.rc})")
+    heapq.heappush(_deadlines, (time.time() + ACK_TIMEOUT, command.command_id, command.device_id))
+
+
+def _remember(command):
+    """Keep a command for status lookups, evicting the oldest finished ones. Requires _cond."""
+    _commands[command.command_id] = command
+    while len(_commands) > HISTORY_SIZE:
+        oldest_id = next(iter(_commands))
+        if _commands[oldest_id].status == 'pending':
+            break
+        _commands.popitem(last=False)
+
+
+def send(device_id, state, source=None):
+    """Publish a relay command and track it until the device reports the new state.
+
+    Callers validate that the device is registered. Returns the RelayCommand.
+    """
+    state = str(state).upper()
+    if state not in VALID_STATES:
+        raise ValueError(f"Invalid command {state!r}. Use 'ON' or 'OFF'.")
+
+    with _cond:
+        command = RelayCommand(next(_ids), device_id, state, source)
+        previous = _pending.get(device_id)
+        if previous is not None:
+            previous.status = 'superseded'
+            stats["superseded"] += 1
+        _pending[device_id] = command
+        command.sent_at = time.time()
+        stats["sent"] += 1
+        _publish(command)
+        _remember(command)
+        # Wakes the retry worker and anyone waiting on a superseded command
+        _cond.notify_all()
+    return command
+
+
+def send_many(commands, source=None):
+    """Publish [(device_id, state), ...] in one burst. Returns the RelayCommands in order."""
+    with _cond:
+        return [send(device_id, state, source) for device_id, state in commands]
+
+
+def wait_for(commands, timeout):
+    """Block up to `timeout` seconds until none of the commands is pending."""
+    deadline = time.time() + timeout
+    with _cond:
+        while any(command.status == 'pending' for command in commands):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            _cond.wait(remaining)
+    return commands
+
+
+def get_command(command_id):
+    with _cond:
+        return _commands.get(command_id)
+
+
+def on_message(_topic, payload, received_at):
+    """MQTT consumer: a matching `relay` value in telemetry acknowledges the pending command."""
+    device_id = payload.get("deviceId")
+    command = _pending.get(device_id)
+    if command is None or "relay" not in payload:
+        return
+    if str(payload["relay"]).upper() != command.state:
+        return
+
+    with _cond:
+        if _pending.get(device_id) is not command:
+            return
+        del _pending[device_id]
+        command.status = 'acked'
+        command.acked_at = max(received_at, command.sent_at)
+        stats["acked"] += 1
+        _observe_latency(device_id, command.latency)
+        _cond.notify_all()
+
+
+def _observe_latency(device_id, seconds):
+    """Add one sample to the device's histogram. Requires _cond."""
+    histogram = _latency.get(device_id)
+    if histogram is None:
+        histogram = _latency[device_id] = {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+    for index, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+            break
+    else:
+        index = len(LATENCY_BUCKETS)
+    histogram["buckets"][index] += 1
+    histogram["sum"] += seconds
+    histogram["count"] += 1
+
+
+def latency_histograms():
+    """Copy of the per-device latency histograms; bucket i counts samples <= LATENCY_BUCKETS[i], the last one the rest."""
+    with _cond:
+        return {
+            device_id: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+            for device_id, h in _latency.items()
+        }
+
+
+def collect_metrics():
+    """metrics collector: dispatcher counters and the per-relay ack latency histograms."""
+    yield ('hub_relay_commands_total', 'counter', 'Relay command dispatcher events',
+           [('hub_relay_commands_total', [('event', event)], value) for event, value in stats.items()])
+    samples = []
+    for device_id, histogram in sorted(latency_histograms().items()):
+        samples += metrics.histogram_samples('hub_relay_ack_seconds', [('device', device_id)], LATENCY_BUCKETS,
+                                             histogram["buckets"], histogram["sum"])
+    yield ('hub_relay_ack_seconds', 'histogram', 'Relay command to confirmed state latency', samples)
+
+
+def expire(now=None):
+    """Retry or time out every pending command whose ack deadline passed."""
+    now = time.time() if now is None else now
+    with _cond:
+        while _deadlines and _deadlines[0][0] <= now:
+            _, command_id, device_id = heapq.heappop(_deadlines)
+            command = _pending.get(device_id)
+            if command is None or command.command_id != command_id:
+                continue  # acked or superseded since
+            if command.attempts <= MAX_RETRIES:
+                stats["retries"] += 1
+                logger.info(f"No ack for relay command {command_id} to {device_id}, retrying")
+                _publish(command)
+            else:
+                del _pending[device_id]
+                command.status = 'timeout'
+                stats["timeouts"] += 1
+                _cond.notify_all()
+                logger.warning(f"Relay {device_id} did not confirm {command.state} after {command.attempts} attempts")
+
+
+def run_worker():
+    """Sleep until the nearest ack deadline, then retry or expire."""
+    while True:
+        with _cond:
+            if _deadlines:
+                _cond.wait(max(0.0, _deadlines[0][0] - time.time()))
+            else:
+                _cond.wait()
+        try:
+            expire()
+        except Exception as e:
+            logger.error(f"Relay command worker error: {e}")
+
+
+def init_relay_commands():
+    """Start the retry worker and subscribe the ack watcher to the MQTT ingest bus."""
+    global _worker
+    if _worker is not None:
+        return
+    _worker = Thread(target=run_worker, name="relay-commands", daemon=True)
+    _worker.start()
+    mqttbus.register_consumer(on_message)
+    metrics.register_collector(collect_metrics)
+    logger.info("Relay command dispatcher started")
@@ -0,0 +1,99 @@
+import logging
+import queue
+import time
+from threading import Thread
+from services import deviceregistry, metrics, mqttbus, relaycommands, ruleindex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Rule engine configuration
+DEBOUNCE_SECONDS = 60  # Minimum time between two executions of the same rule
+QUEUE_SIZE = 1000      # Readings waiting for evaluation before new ones are dropped
+
+_readings = queue.Queue(maxsize=QUEUE_SIZE)
+_app = None
+_worker = None
+
+last_rule_execution = {}  # rule_id -> monotonic time of the last execution
+dropped_readings = 0
+
+
+def should_execute_rule(rule_id, debounce_seconds=DEBOUNCE_SECONDS):
+    """Check if enough time has passed since the last rule execution."""
+    now = time.monotonic()
+    last_execution = last_rule_execution.get(rule_id)
+    if last_execution is None or (now - last_execution) > debounce_seconds:
+        last_rule_execution[rule_id] = now
+        return True
+    return False
+
+
+def on_message(_topic, payload, received_at):
+    """MQTT consumer: queue the reading for the worker, never block the network thread."""
+    global dropped_readings
+    if not payload.get("deviceId"):
+        return
+    try:
+        _readings.put_nowait((payload, received_at))
+    except queue.Full:
+        dropped_readings += 1
+        logger.warning(f"Rule engine queue full, dropped reading from {payload.get('deviceId')}")
+
+
+def execute_rule(rule):
+    """Publish the relay command of a matched rule."""
+    action = rule.action.upper()
+    if action not in ['ON', 'OFF']:
+        logger.error(f"Invalid action '{rule.action}' on automation rule {rule.rule_id}")
+        return False
+
+    if not deviceregistry.is_registered(rule.relay_device_id):
+        logger.error(f"Failed to execute automation rule: Device {rule.relay_device_id} is not registered")
+        return False
+
+    relaycommands.send(rule.relay_device_id, action, source=f"rule:{rule.rule_id}")
+    logger.info(f"Successfully executed automation rule: {rule.auto_title} (relay {rule.relay_device_id} set to {action})")
+    return True
+
+
+def evaluate_reading(payload):
+    """Evaluate only the rules attached to the sensors present in this reading."""
+    device_id = payload["deviceId"]
+    for sensor_key, value in payload.items():
+        for rule in ruleindex.rules_for_sensor(device_id, sensor_key):
+            if not rule.enabled:
+                continue
+            metrics.rule_evaluations.inc(rule.rule_id)
+            if not rule.predicate(value):
+                continue
+            if should_execute_rule(rule.rule_id):
+                if execute_rule(rule):
+                    metrics.rule_fires.inc(rule.rule_id)
+            else:
+                logger.debug(f"Skipping rule execution due to debounce: {rule.auto_title}")
+
+
+def run_worker():
+    """Background loop evaluating queued readings as they arrive."""
+    while True:
+        payload, received_at = _readings.get()
+        try:
+            with _app.app_context():
+                evaluate_reading(payload)
+            logger.debug(f"Evaluated reading from {payload['deviceId']} in {(time.time() - received_at) * 1000:.1f} ms")
+        except Exception as e:
+            logger.error(f"Error evaluating automation rules: {e}")
+
+
+def init_rule_engine(app):
+    """Start the rule engine worker and subscribe it to the MQTT ingest bus."""
+    global _app, _worker
+    if _worker is not None:
+        return
+    _app = app
+    _worker = Thread(target=run_worker, name="rule-engine", daemon=True)
+    _worker.start()
+    mqttbus.register_consumer(on_message)
+    logger.info("Automation rule engine started")
@@ -0,0 +1,134 @@
+import logging
+from collections import namedtuple
+from database.database import db, Sensor, SensorType, AutomationRule
+from services.lazycache import LazyValue
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CompiledRule = namedtuple('CompiledRule', [
+    'rule_id', 'user_id', 'sensor_id', 'sensor_type_id', 'device_id', 'sensor_key',
+    'type_key', 'display_name', 'unit', 'states',
+    'condition', 'threshold', 'relay_device_id', 'action', 'enabled',
+    'auto_title', 'auto_description', 'predicate',
+])
+
+
+def looks_numeric(threshold):
+    """The check_rule_match test for a numeric threshold: digits and dots only."""
+    return str(threshold).replace('.', '').isdigit()
+
+
+def parse_numeric_threshold(threshold):
+    """The threshold as a float, or None when it is compared as a string.
+
+    A malformed number such as "1.2.3" falls back to string comparison
+    rather than failing the whole index load.
+    """
+    if not looks_numeric(threshold):
+        return None
+    try:
+        return float(threshold)
+    except ValueError:
+        logger.warning(f"Malformed numeric threshold '{threshold}', comparing it as a string")
+        return None
+
+
+def compile_predicate(condition, threshold):
+    """Turn a rule's condition/threshold pair into a callable taking the live value.
+
+    The threshold is parsed once here instead of on every reading; the
+    semantics match the original check_rule_match.
+    """
+    threshold = str(threshold)
+    numeric_threshold = parse_numeric_threshold(threshold)
+    str_threshold = threshold.lower()
+
+    def predicate(value):
+        if value is None:
+            return False
+        if numeric_threshold is not None and isinstance(value, (int, float)):
+            if condition == 'GREATER_THAN':
+                return value > numeric_threshold
+            elif condition == 'LESS_THAN':
+                return value < numeric_threshold
+            elif condition == 'EQUALS':
+                return value == numeric_threshold
+            return False
+        return condition == 'EQUALS' and str(value).lower() == str_threshold
+
+    return predicate
+
+
+def load_rules():
+    """Build the index from one joined query. Requires an app context."""
+    rows = (
+        db.session.query(
+            Sensor.device_id,
+            Sensor.sensor_key,
+            SensorType.type_key,
+            SensorType.display_name,
+            SensorType.unit,
+            SensorType.states,
+            AutomationRule,
+        )
+        .join(SensorType, Sensor.sensor_type_id == SensorType.id)
+        .join(AutomationRule, Sensor.id == AutomationRule.sensor_id)
+        .order_by(AutomationRule.id)
+        .all()
+    )
+
+    by_sensor = {}
+    by_user = {}
+    for device_id, sensor_key, type_key, display_name, unit, states, rule in rows:
+        compiled = CompiledRule(
+            rule_id=rule.id,
+            user_id=rule.user_id,
+            sensor_id=rule.sensor_id,
+            sensor_type_id=rule.sensor_type_id,
+            device_id=device_id,
+            sensor_key=sensor_key,
+            type_key=type_key,
+            display_name=display_name,
+            unit=unit,
+            states=states,
+            condition=rule.condition,
+            threshold=rule.threshold,
+            relay_device_id=rule.relay_device_id,
+            action=rule.action,
+            enabled=rule.enabled,
+            auto_title=rule.auto_title,
+            auto_description=rule.auto_description,
+            predicate=compile_predicate(rule.condition, rule.threshold),
+        )
+        by_sensor.setdefault((device_id, sensor_key), []).append(compiled)
+        by_user.setdefault(rule.user_id, []).append(compiled)
+
+    logger.info(f"Loaded {len(rows)} automation rules into the index")
+    return (
+        {key: tuple(rules) for key, rules in by_sensor.items()},
+        {key: tuple(rules) for key, rules in by_user.items()},
+    )
+
+
+# (by_sensor, by_user): (device_id, sensor_key) -> rules and user_id -> rules,
+# built as one tuple so readers never see half an index. Rule, user, device
+# and restore routes invalidate it; an evaluation already under way keeps the
+# rule tuple it fetched
+_index = LazyValue(load_rules)
+
+
+def rules_for_sensor(device_id, sensor_key):
+    """Compiled rules attached to one (deviceId, sensor key) pair."""
+    return _index.get()[0].get((device_id, sensor_key), ())
+
+
+def rules_for_user(user_id):
+    """Compiled rules owned by one user, in rule id order."""
+    return _index.get()[1].get(user_id, ())
+
+
+def invalidate():
+    """Drop the index; it is rebuilt on the next lookup."""
+    _index.invalidate()
@@ -0,0 +1,106 @@
+import logging
+from collections import OrderedDict
+from threading import Lock
+from database.database import db, Sensor
+from services import metrics, sensortypes
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = 1024  # Sensor keys remembered; least recently used are evicted first
+
+_lock = Lock()
+_cache = OrderedDict()  # sensor_key -> descriptor dict, or None for an unknown key
+_generation = 0         # Bumped by invalidate(), so a load racing it is not stored
+
+stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "invalidations": 0,
+}
+
+
+def load_descriptor(sensor_key):
+    """Data type of the first sensor registered under sensor_key, or None. Requires an app context."""
+    sensor_type_id = (
+        db.session.query(Sensor.sensor_type_id)
+        .filter(Sensor.sensor_key == sensor_key)
+        .order_by(Sensor.id)
+        .limit(1)
+        .scalar()
+    )
+    if sensor_type_id is None:
+        return None
+    sensor_type = sensortypes.by_id(sensor_type_id)
+    if sensor_type is None:
+        return None
+
+    descriptor = {
+        "sensor_key": sensor_key,
+        "sensor_type": sensor_type.type_key,
+        "display_name": sensor_type.display_name,
+    }
+    # Add unit or states based on the sensor type
+    if sensor_type.unit:
+        descriptor["unit"] = sensor_type.unit
+    elif sensor_type.states:
+        descriptor["states"] = list(sensor_type.states)
+    return descriptor
+
+
+def describe(sensor_key):
+    """Cached data type descriptor of a sensor key, or None if no sensor has it.
+
+    Callers must not mutate the result.
+    """
+    with _lock:
+        if sensor_key in _cache:
+            stats["hits"] += 1
+            _cache.move_to_end(sensor_key)
+            return _cache[sensor_key]
+        stats["misses"] += 1
+        generation = _generation
+
+    descriptor = load_descriptor(sensor_key)
+
+    with _lock:
+        if generation == _generation:
+            _cache[sensor_key] = descriptor
+            _cache.move_to_end(sensor_key)
+            while len(_cache) > MAX_ENTRIES:
+                _cache.popitem(last=False)
+                stats["evictions"] += 1
+    return descriptor
+
+
+def invalidate():
+    """Forget every descriptor after sensors are added or removed."""
+    global _generation
+    with _lock:
+        _cache.clear()
+        _generation += 1
+        stats["invalidations"] += 1
+
+
+def cache_info():
+    """Hit/miss counters plus the current size, for logs and debugging."""
+    with _lock:
+        info = dict(stats)
+        info["size"] = len(_cache)
+    lookups = info["hits"] + info["misses"]
+    info["hit_ratio"] = info["hits"] / lookups if lookups else 0.0
+    return info
+
+
+def collect_metrics():
+    """metrics collector: cache events and size."""
+    info = cache_info()
+    yield ('hub_sensor_datatype_cache_total', 'counter', 'Sensor datatype cache events',
+           [('hub_sensor_datatype_cache_total', [('event', event)], info[event]) for event in stats])
+    yield ('hub_sensor_datatype_cache_entries', 'gauge', 'Sensor keys in the datatype cache',
+           [('hub_sensor_datatype_cache_entries', [], info["size"])])
+
+
+metrics.register_collector(collect_metrics)
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import logging
+from collections import namedtuple
+from database.database import db, SensorType
+from services.lazycache import LazyValue
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Immutable copy of one sensor_types row; states is a tuple or None
+SensorTypeInfo = namedtuple('SensorTypeInfo', 'id type_key display_name unit states')
+
+# by_id and by_key map to SensorTypeInfo; types is ordered by id; etag
+# changes whenever the table contents do
+Registry = namedtuple('Registry', 'by_id by_key types etag')
+
+
+def as_dict(sensor_type):
+    return {
+        "id": sensor_type.id,
+        "type_key": sensor_type.type_key,
+        "display_name": sensor_type.display_name,
+        "unit": sensor_type.unit,
+        "states": list(sensor_type.states) if sensor_type.states is not None else None,
+    }
+
+
+def _build():
+    types = tuple(
+        SensorTypeInfo(row.id, row.type_key, row.display_name, row.unit,
+                       tuple(row.states) if row.states is not None else None)
+        for row in db.session.query(SensorType).order_by(SensorType.id)
+    )
+    logger.info(f"Loaded {len(types)} sensor types")
+    body = json.dumps([as_dict(t) for t in types], sort_keys=True).encode()
+    return Registry(
+        by_id={t.id: t for t in types},
+        by_key={t.type_key: t for t in types},
+        types=types,
+        etag=hashlib.blake2b(body, digest_size=8).hexdigest(),
+    )
+
+
+# Sensor types change only when pairing meets an unknown type or a backup is
+# restored, so the registry and its etag are built once and shared
+_registry = LazyValue(_build)
+
+
+def registry():
+    """The sensor type registry, loaded once. Requires an app context on a miss."""
+    return _registry.get()
+
+
+def by_id(sensor_type_id):
+    return registry().by_id.get(sensor_type_id)
+
+
+def by_key(type_key):
+    return registry().by_key.get(type_key)
+
+
+def invalidate():
+    """Drop the registry after a sensor type is added or the database is replaced."""
+    _registry.invalidate()
@@ -0,0 +1,157 @@
+import heapq
+import logging
+import time
+from datetime import datetime, time as dtime, timedelta
+from itertools import count
+from threading import Condition, Thread
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DAYS_MAP = {"Mon": 0, "Tue": 1, "Wed": 2, "Thu": 3, "Fri": 4, "Sat": 5, "Sun": 6}
+
+# Longest the engine thread sleeps before re-reading the wall clock, so an
+# NTP step after boot (the Pi has no RTC) is picked up promptly
+MAX_SLEEP = 30
+
+
+def parse_schedule(trigger_time, days):
+    """Split "HH:MM" and "Mon,Tue" into (hour, minute, weekdays). Raises ValueError."""
+    hour, minute = (int(part) for part in str(trigger_time).split(":")[:2])
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid trigger time: {trigger_time}")
+    weekdays = set()
+    for day in str(days).split(","):
+        day = day.strip()[:3].capitalize()
+        if day not in DAYS_MAP:
+            raise ValueError(f"Invalid day: {day!r}")
+        weekdays.add(DAYS_MAP[day])
+    return hour, minute, frozenset(weekdays)
+
+
+def next_fire_after(schedule, after):
+    """First local wall-clock instant of the schedule strictly after `after` (epoch)."""
+    hour, minute, weekdays = schedule
+    start = datetime.fromtimestamp(after).date()
+    for offset in range(8):
+        day = start + timedelta(days=offset)
+        if day.weekday() in weekdays:
+            due = datetime.combine(day, dtime(hour, minute)).timestamp()
+            if due > after:
+                return due
+    return None
+
+
+class TimerEngine:
+    """Weekly HH:MM timers kept in a min-heap of precomputed fire instants.
+
+    A tick only pops the entries that are due, so its cost depends on how
+    many timers fire now, not on how many exist. Rescheduled or cancelled
+    timers leave stale heap entries that are skipped when they surface.
+
+    Fires up to `grace` seconds late still happen (after a stall, or on
+    start for timers scheduled with `since`), once per timer however many
+    instants were missed, for the latest of them. Older ones are dropped.
+    """
+
+    def __init__(self, fire, grace=60, clock=time.time):
+        self.fire = fire          # fire([(timer_id, due), ...]) per tick, due as epoch seconds
+        self.grace = grace        # seconds a fire may be late and still happen
+        self.clock = clock
+        self._heap = []           # (due, seq, timer_id)
+        self._entries = {}        # timer_id -> (due, seq, schedule)
+        self._seq = count()
+        self._cond = Condition()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def schedule(self, timer_id, trigger_time, days, now=None, since=None):
+        """Add or replace a timer. Raises ValueError for an unusable schedule.
+
+        `since` is the last instant already handled (epoch); instants after it
+        that are still within the grace window come due immediately.
+        """
+        schedule = parse_schedule(trigger_time, days)
+        now = self.clock() if now is None else now
+        after = now if since is None else max(since, now - self.grace)
+        with self._cond:
+            self._push(timer_id, schedule, next_fire_after(schedule, after))
+            self._cond.notify()
+
+    def cancel(self, timer_id):
+        with self._cond:
+            self._entries.pop(timer_id, None)
+
+    def clear(self):
+        with self._cond:
+            self._entries.clear()
+            self._heap = []
+
+    def next_fire(self, timer_id):
+        entry = self._entries.get(timer_id)
+        return datetime.fromtimestamp(entry[0]) if entry and entry[0] is not None else None
+
+    def run_due(self, now=None):
+        """Fire every timer due at `now` as one batch and schedule its next instant."""
+        now = self.clock() if now is None else now
+        due_timers = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, timer_id = heapq.heappop(self._heap)
+                entry = self._entries.get(timer_id)
+                if entry is None or entry[1] != seq:
+                    continue  # cancelled or rescheduled since
+                schedule = entry[2]
+                # Missed instants collapse into one fire for the latest of them
+                following = next_fire_after(schedule, due)
+                while following is not None and following <= now:
+                    due, following = following, next_fire_after(schedule, following)
+                self._push(timer_id, schedule, following)
+                due_timers.append((due, timer_id))
+
+        batch = []
+        for due, timer_id in sorted(due_timers):
+            if now - due > self.grace:
+                logger.warning(f"Timer {timer_id} missed its {datetime.fromtimestamp(due)} fire by {now - due:.0f}s")
+                continue
+            batch.append((timer_id, due))
+        if batch:
+            try:
+                self.fire(batch)
+            except Exception as e:
+                logger.error(f"Firing timers {[timer_id for timer_id, _ in batch]} failed: {e}")
+        return batch
+
+    def _push(self, timer_id, schedule, due):
+        seq = next(self._seq)
+        self._entries[timer_id] = (due, seq, schedule)
+        if due is not None:
+            heapq.heappush(self._heap, (due, seq, timer_id))
+        # Drop stale entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [
+                (due, seq, timer_id) for timer_id, (due, seq, _) in self._entries.items() if due is not None
+            ]
+            heapq.heapify(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                delay = MAX_SLEEP
+                if self._heap:
+                    delay = min(max(0.0, self._heap[0][0] - self.clock()), MAX_SLEEP)
+                self._cond.wait(delay)
+            self.run_due()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name="timer-engine", daemon=True)
+            self._thread.start()
+        return self
@@ -0,0 +1,146 @@
+import logging
+import time
+from datetime import datetime
+from database.database import db, TimerScheduler
+from services import deviceregistry, metrics, relaycommands
+from services.timerengine import TimerEngine
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Seconds a fire may run late and still happen: covers a stalled engine
+# thread and, on start, fires missed while the hub was down. Override with
+# app.config['TIMER_CATCH_UP_WINDOW'].
+CATCH_UP_WINDOW = 15 * 60
+
+last_fired = {}  # timer_id -> datetime of the last publish
+_app = None
+
+
+def fire_timers(batch):
+    """Engine callback: publish the due timers' relay commands.
+
+    `batch` is [(timer_id, due), ...] in due order. Timers hitting the same
+    relay are coalesced into the last one's command, so a catch-up after a
+    restart sends the final state instead of an ON/OFF/ON burst.
+    """
+    with _app.app_context():
+        timer_ids = [timer_id for timer_id, _ in batch]
+        timers = {timer.id: timer for timer in TimerScheduler.query.filter(TimerScheduler.id.in_(timer_ids))}
+
+        handled = []
+        final = {}  # relay_device_id -> (timer, due), latest wins
+        for timer_id, due in batch:
+            timer = timers.get(timer_id)
+            if timer is None or not timer.enabled:
+                # Removed or disabled without going through the routes
+                remove_timer(timer_id)
+                continue
+            handled.append({"b_id": timer_id, "b_last_fired_at": datetime.fromtimestamp(due)})
+            final[timer.relay_device_id] = (timer, due)
+
+        registered = deviceregistry.registered_devices()
+
+        now = time.time()
+        for relay_device_id, (timer, due) in final.items():
+            command = timer.action.upper()
+            if command not in ['ON', 'OFF']:
+                logger.error(f"Timer {timer.id} has invalid action {timer.action}")
+                continue
+            if relay_device_id not in registered:
+                logger.warning(f"Timer {timer.id}: device {relay_device_id} is not registered")
+                continue
+
+            relaycommands.send(relay_device_id, command, source=f"timer:{timer.id}")
+            metrics.timer_fire_lag.observe(max(0.0, now - due))
+            last_fired[timer.id] = datetime.now()
+            late = f" ({now - due:.0f}s late)" if now - due >= 60 else ""
+            logger.info(f"Timer {timer.id}: relay {relay_device_id} set to {command}{late}")
+
+        if len(handled) > len(final):
+            logger.info(f"Coalesced {len(handled)} timer fires into {len(final)} relay commands")
+
+        # Persist what was handled, coalesced-away fires included, so a
+        # restart does not replay them
+        if handled:
+            timers_table = TimerScheduler.__table__
+            try:
+                db.session.execute(
+                    timers_table.update()
+                    .where(timers_table.c.id == db.bindparam('b_id'))
+                    .values(last_fired_at=db.bindparam('b_last_fired_at')),
+                    handled
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to record last fire of timers {timer_ids}: {e}")
+
+
+# The TimerScheduler rows are the persistent store; the engine's heap is
+# rebuilt from them on start
+engine = TimerEngine(fire_timers, grace=CATCH_UP_WINDOW)
+
+
+def sync_timer(timer, catch_up=False):
+    """Add, replace or drop one timer in the engine after its row changed.
+
+    With catch_up, instants since the timer's last_fired_at that fall in the
+    catch-up window come due at once (used when loading on start).
+    """
+    if not timer.enabled:
+        remove_timer(timer.id)
+        return False
+    since = timer.last_fired_at.timestamp() if catch_up and timer.last_fired_at else None
+    try:
+        engine.schedule(timer.id, timer.trigger_time, timer.days, since=since)
+    except ValueError as e:
+        logger.error(f"Timer {timer.id} not scheduled: {e}")
+        remove_timer(timer.id)
+        return False
+    return True
+
+
+def remove_timer(timer_id):
+    engine.cancel(timer_id)
+    last_fired.pop(timer_id, None)
+
+
+def next_run_time(timer_id):
+    return engine.next_fire(timer_id)
+
+
+def load_timers():
+    """Schedule every enabled timer, catching up on missed fires. Requires an app context.
+
+    Timers that never fired have no last_fired_at and are not caught up.
+    """
+    scheduled = 0
+    for timer in TimerScheduler.query.filter_by(enabled=True).all():
+        scheduled += sync_timer(timer, catch_up=True)
+    return scheduled
+
+
+def reload_timers():
+    """Drop every scheduled timer and schedule the enabled ones again, without
+    catching up. Used after the database is replaced. Requires an app context."""
+    engine.clear()
+    last_fired.clear()
+    scheduled = 0
+    for timer in TimerScheduler.query.filter_by(enabled=True).all():
+        scheduled += sync_timer(timer)
+    return scheduled
+
+
+def init_timer_service(app):
+    """Load the timers and start the engine thread."""
+    global _app
+    if engine.running:
+        return
+    _app = app
+    engine.grace = app.config.get('TIMER_CATCH_UP_WINDOW', CATCH_UP_WINDOW)
+    with app.app_context():
+        scheduled = load_timers()
+    engine.start()
+    logger.info(f"Timer engine started with {scheduled} timers")
@@ -0,0 +1,267 @@
+import atexit
+import logging
+import time
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database.database import db, SensorReading, SensorRollup
+from services import mqttbus
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Time-series configuration
+BATCH_SIZE = 500            # Flush as soon as this many readings are pending
+FLUSH_INTERVAL = 5          # ...or at least this often, in seconds
+MAX_PENDING = 20000         # Readings held in memory before new ones are dropped
+ROLLUP_RESOLUTIONS = (60, 3600)  # 1-minute and 1-hour buckets
+RAW_RETENTION = timedelta(days=7)
+MINUTE_ROLLUP_RETENTION = timedelta(days=30)
+MAX_HISTORY = timedelta(days=365)  # Longest window served; hour rollups are kept indefinitely
+PURGE_INTERVAL = 3600       # Seconds between retention sweeps
+MAX_FLUSH_ATTEMPTS = 3      # Consecutive failed writes of a batch before it is dropped
+
+IGNORED_KEYS = ("deviceId", "ip")
+
+_pending = []
+_pending_lock = Lock()
+_flush_lock = Lock()
+_wakeup = Event()
+_app = None
+_worker = None
+_last_purge = 0.0
+
+dropped_readings = 0
+_failed_flushes = 0  # Consecutive failed flushes of the batch at the head of _pending
+
+
+def on_message(_topic, payload, received_at):
+    """MQTT consumer: buffer every sensor value of the reading for the next batch."""
+    global dropped_readings
+    device_id = payload.get("deviceId")
+    if not device_id:
+        return
+
+    rows = [
+        (device_id, key, value, received_at)
+        for key, value in payload.items()
+        if key not in IGNORED_KEYS and value is not None
+    ]
+    with _pending_lock:
+        if len(_pending) + len(rows) > MAX_PENDING:
+            dropped_readings += len(rows)
+            return
+        _pending.extend(rows)
+        pending = len(_pending)
+    if pending >= BATCH_SIZE:
+        _wakeup.set()
+
+
+def _as_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+def _build_rollups(batch):
+    """Aggregate a batch into per-bucket min/max/sum/count for every resolution."""
+    buckets = {}
+    for device_id, sensor_key, value, ts in batch:
+        number = _as_number(value)
+        if number is None:
+            continue
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (device_id, sensor_key, resolution, int(ts // resolution) * resolution)
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [number, number, number, 1]
+            else:
+                bucket[0] = min(bucket[0], number)
+                bucket[1] = max(bucket[1], number)
+                bucket[2] += number
+                bucket[3] += 1
+
+    return [
+        {
+            "device_id": device_id,
+            "sensor_key": sensor_key,
+            "resolution": resolution,
+            "bucket_start": datetime.fromtimestamp(bucket_start),
+            "min_value": low,
+            "max_value": high,
+            "sum_value": total,
+            "count": count,
+        }
+        for (device_id, sensor_key, resolution, bucket_start), (low, high, total, count) in buckets.items()
+    ]
+
+
+def _upsert_rollups(rollups):
+    """Merge batch aggregates into the stored buckets in one statement."""
+    table = SensorRollup.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['device_id', 'sensor_key', 'resolution', 'bucket_start'],
+        set_={
+            "min_value": db.func.min(table.c.min_value, stmt.excluded.min_value),
+            "max_value": db.func.max(table.c.max_value, stmt.excluded.max_value),
+            "sum_value": table.c.sum_value + stmt.excluded.sum_value,
+            "count": table.c.count + stmt.excluded.count,
+        }
+    )
+    db.session.execute(stmt, rollups)
+
+
+def _requeue(batch):
+    """Put a batch that failed to write back ahead of newer readings, or drop it."""
+    global _pending, dropped_readings, _failed_flushes
+    _failed_flushes += 1
+    with _pending_lock:
+        if _failed_flushes >= MAX_FLUSH_ATTEMPTS:
+            lost = len(batch)
+            _failed_flushes = 0
+        else:
+            # Newer readings that arrived meanwhile are kept; the oldest failed ones give way
+            keep = max(0, MAX_PENDING - len(_pending))
+            lost = max(0, len(batch) - keep)
+            _pending = batch[lost:] + _pending
+        dropped_readings += lost
+    if lost:
+        logger.error(f"Dropped {lost} sensor readings that could not be stored")
+
+
+def flush():
+    """Write all pending readings and their rollups in a single transaction.
+
+    A failed write is retried with the next flush, up to MAX_FLUSH_ATTEMPTS
+    times. Requires an app context.
+    """
+    global _pending, _failed_flushes
+    with _flush_lock:
+        with _pending_lock:
+            batch, _pending = _pending, []
+        if not batch:
+            return 0
+
+        readings = []
+        for device_id, sensor_key, value, ts in batch:
+            number = _as_number(value)
+            readings.append({
+                "device_id": device_id,
+                "sensor_key": sensor_key,
+                "value": number,
+                "state": None if number is not None else str(value)[:100],
+                "recorded_at": datetime.fromtimestamp(ts),
+            })
+        rollups = _build_rollups(batch)
+
+        try:
+            db.session.execute(db.insert(SensorReading), readings)
+            if rollups:
+                _upsert_rollups(rollups)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to store {len(batch)} sensor readings: {e}")
+            _requeue(batch)
+            return 0
+
+        _failed_flushes = 0
+        logger.debug(f"Stored {len(readings)} readings and {len(rollups)} rollup buckets")
+        return len(readings)
+
+
+def purge_expired(now=None):
+    """Apply the retention policy to raw readings and minute rollups."""
+    now = now or datetime.now()
+    try:
+        SensorReading.query.filter(SensorReading.recorded_at < now - RAW_RETENTION).delete(synchronize_session=False)
+        SensorRollup.query.filter(
+            SensorRollup.resolution == 60,
+            SensorRollup.bucket_start < now - MINUTE_ROLLUP_RETENTION
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Failed to purge expired sensor history: {e}")
+
+
+def run_worker():
+    """Background loop flushing batches on size or time, and purging old history."""
+    global _last_purge
+    while True:
+        _wakeup.wait(FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            with _app.app_context():
+                flush()
+                if time.monotonic() - _last_purge > PURGE_INTERVAL:
+                    purge_expired()
+                    _last_purge = time.monotonic()
+        except Exception as e:
+            logger.error(f"Time-series worker error: {e}")
+
+
+def flush_on_exit():
+    if _app is None:
+        return
+    with _app.app_context():
+        flush()
+
+
+def history(device_id, sensor_key, start, end, resolution=None):
+    """Return readings between start and end as a list of dicts.
+
+    ``resolution`` is None for raw readings, or 60/3600 for rollups.
+    """
+    if resolution is None:
+        rows = (
+            SensorReading.query
+            .filter(
+                SensorReading.device_id == device_id,
+                SensorReading.sensor_key == sensor_key,
+                SensorReading.recorded_at >= start,
+                SensorReading.recorded_at <= end
+            )
+            .order_by(SensorReading.recorded_at)
+            .all()
+        )
+    else:
+        rows = (
+            SensorRollup.query
+            .filter(
+                SensorRollup.device_id == device_id,
+                SensorRollup.sensor_key == sensor_key,
+                SensorRollup.resolution == resolution,
+                SensorRollup.bucket_start >= start,
+                SensorRollup.bucket_start <= end
+            )
+            .order_by(SensorRollup.bucket_start)
+            .all()
+        )
+    return [row.to_dict() for row in rows]
+
+
+def pick_resolution(span):
+    """Cheapest resolution that still gives a useful chart for a time span."""
+    if span <= timedelta(hours=1):
+        return None
+    if span <= timedelta(days=2):
+        return 60
+    return 3600
+
+
+def init_timeseries(app):
+    """Start the batch writer and subscribe it to the MQTT ingest bus."""
+    global _app, _worker
+    if _worker is not None:
+        return
+    _app = app
+    _worker = Thread(target=run_worker, name="timeseries-writer", daemon=True)
+    _worker.start()
+    mqttbus.register_consumer(on_message)
+    atexit.register(flush_on_exit)
+    logger.info("Sensor time-series store started")
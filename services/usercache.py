@@ -0,0 +1,99 @@
+import logging
+import time
+from threading import Lock
+from sqlalchemy.orm import make_transient_to_detached
+from database.database import db, User
+from services import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TTL_SECONDS = 30    # Bounds how stale a user changed by another process can be
+MAX_ENTRIES = 256
+
+_lock = Lock()
+_users = {}         # userid -> (monotonic expiry, detached User holding only its columns)
+_generation = 0     # Bumped by invalidate(), so a load racing it is not stored
+
+stats = {
+    "hits": 0,
+    "misses": 0,
+    "expired": 0,
+    "invalidations": 0,
+}
+
+
+def _detached_copy(user):
+    """A clean, detached User carrying the column values of `user`."""
+    copy = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+    make_transient_to_detached(copy)
+    return copy
+
+
+def _store(userid, copy, generation, now):
+    with _lock:
+        if generation != _generation:
+            return
+        if len(_users) >= MAX_ENTRIES:
+            for key in [key for key, (expires_at, _) in _users.items() if expires_at <= now]:
+                del _users[key]
+            while len(_users) >= MAX_ENTRIES:
+                del _users[next(iter(_users))]  # Oldest insert first
+        _users[userid] = (now + TTL_SECONDS, copy)
+
+
+def get_user(userid):
+    """The user with `userid` bound to the current session, or None.
+
+    Within TTL_SECONDS of the last load this runs no SQL: the cached
+    copy is merged into the session with load=False. Requires an app
+    context.
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _users.get(userid)
+        if entry is not None and entry[0] > now:
+            stats["hits"] += 1
+            cached = entry[1]
+        else:
+            if entry is not None:
+                stats["expired"] += 1
+                del _users[userid]
+            stats["misses"] += 1
+            cached = None
+            generation = _generation
+
+    if cached is not None:
+        return db.session.merge(cached, load=False)
+
+    user = db.session.get(User, userid)
+    if user is not None:
+        _store(userid, _detached_copy(user), generation, now)
+    return user
+
+
+def invalidate(userid=None):
+    """Drop one user's cached record, or every user's when userid is None."""
+    global _generation
+    with _lock:
+        if userid is None:
+            _users.clear()
+        else:
+            _users.pop(userid, None)
+        _generation += 1
+        stats["invalidations"] += 1
+
+
+def collect_metrics():
+    """metrics collector: cache events and size."""
+    with _lock:
+        events = dict(stats)
+        size = len(_users)
+    yield ('hub_user_cache_total', 'counter', 'Authenticated user cache events',
+           [('hub_user_cache_total', [('event', event)], value) for event, value in events.items()])
+    yield ('hub_user_cache_entries', 'gauge', 'Users in the authenticated user cache',
+           [('hub_user_cache_entries', [], size)])
+
+
+metrics.register_collector(collect_metrics)
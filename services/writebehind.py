@@ -0,0 +1,154 @@
+import atexit
+import logging
+from datetime import datetime
+from threading import Event, Lock, Thread
+from database.database import db, Sensor, Device
+from services import mqttbus
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Write-behind configuration
+FLUSH_INTERVAL = 10   # Seconds between flushes
+FLUSH_THRESHOLD = 500  # Distinct sensors pending before an early flush
+MAX_PENDING = 5000     # Distinct sensors held before new ones are dropped
+
+IGNORED_KEYS = ("deviceId", "ip")
+
+_sensor_updates = {}  # (device_id, sensor_key) -> (value, received_at), latest wins
+_device_updates = {}  # device_id -> received_at
+_lock = Lock()
+_flush_lock = Lock()
+_wakeup = Event()
+_app = None
+_worker = None
+
+stats = {
+    "updates": 0,          # Sensor values received
+    "coalesced": 0,        # Updates that replaced a still pending value
+    "dropped": 0,          # Updates lost because the buffer was full
+    "overflow_flushes": 0,  # Flushes forced by FLUSH_THRESHOLD before the timer
+    "flushes": 0,
+    "rows_written": 0,
+}
+
+
+def on_message(_topic, payload, received_at):
+    """MQTT consumer: coalesce the reading into the pending per-sensor state."""
+    device_id = payload.get("deviceId")
+    if not device_id:
+        return
+
+    early_flush = False
+    with _lock:
+        _device_updates[device_id] = received_at
+        for key, value in payload.items():
+            if key in IGNORED_KEYS:
+                continue
+            stats["updates"] += 1
+            slot = (device_id, key)
+            if slot in _sensor_updates:
+                stats["coalesced"] += 1
+            elif len(_sensor_updates) >= MAX_PENDING:
+                stats["dropped"] += 1
+                continue
+            _sensor_updates[slot] = (value, received_at)
+        if len(_sensor_updates) >= FLUSH_THRESHOLD and not _wakeup.is_set():
+            stats["overflow_flushes"] += 1
+            early_flush = True
+    if early_flush:
+        _wakeup.set()
+
+
+def flush():
+    """Write every pending sensor and device update in one transaction.
+
+    Requires an app context.
+    """
+    global _sensor_updates, _device_updates
+    with _flush_lock:
+        with _lock:
+            sensor_updates, _sensor_updates = _sensor_updates, {}
+            device_updates, _device_updates = _device_updates, {}
+        if not sensor_updates and not device_updates:
+            return 0
+
+        sensors = Sensor.__table__
+        devices = Device.__table__
+        sensor_rows = [
+            {
+                "b_device_id": device_id,
+                "b_sensor_key": sensor_key,
+                "b_value": str(value)[:100],
+                "b_last_seen": datetime.fromtimestamp(ts),
+            }
+            for (device_id, sensor_key), (value, ts) in sensor_updates.items()
+        ]
+        device_rows = [
+            {"b_device_id": device_id, "b_last_seen": datetime.fromtimestamp(ts)}
+            for device_id, ts in device_updates.items()
+        ]
+
+        try:
+            # Core executemany UPDATEs; readings from unpaired devices match no rows
+            if sensor_rows:
+                db.session.execute(
+                    sensors.update()
+                    .where(sensors.c.device_id == db.bindparam('b_device_id'))
+                    .where(sensors.c.sensor_key == db.bindparam('b_sensor_key'))
+                    .values(value=db.bindparam('b_value'), last_seen=db.bindparam('b_last_seen'), status='online'),
+                    sensor_rows
+                )
+            if device_rows:
+                db.session.execute(
+                    devices.update()
+                    .where(devices.c.device_id == db.bindparam('b_device_id'))
+                    .values(last_seen=db.bindparam('b_last_seen')),
+                    device_rows
+                )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            with _lock:
+                stats["dropped"] += len(sensor_rows)
+            logger.error(f"Failed to persist {len(sensor_rows)} sensor updates: {e}")
+            return 0
+
+        stats["flushes"] += 1
+        stats["rows_written"] += len(sensor_rows) + len(device_rows)
+        return len(sensor_rows)
+
+
+def run_worker():
+    """Background loop flushing on the time or size threshold."""
+    while True:
+        _wakeup.wait(FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            with _app.app_context():
+                flush()
+        except Exception as e:
+            logger.error(f"Write-behind worker error: {e}")
+
+
+def flush_on_exit():
+    if _app is None:
+        return
+    with _app.app_context():
+        written = flush()
+    if written:
+        logger.info(f"Flushed {written} pending sensor updates on shutdown")
+
+
+def init_write_behind(app):
+    """Start the write-behind flusher and subscribe it to the MQTT ingest bus."""
+    global _app, _worker
+    if _worker is not None:
+        return
+    _app = app
+    _worker = Thread(target=run_worker, name="sensor-write-behind", daemon=True)
+    _worker.start()
+    mqttbus.register_consumer(on_message)
+    atexit.register(flush_on_exit)
+    logger.info("Sensor state write-behind started")
@@ -0,0 +1,98 @@
+import logging
+from sqlalchemy import exists
+from database.database import db, Zone, ZoneSensor, Sensor, SensorType
+from services import sensortypes
+from services.lazycache import LazyMap
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def sensor_dict(sensor_id, sensor_key, type_key, display_name, unit):
+    return {
+        "sensor_id": sensor_id,
+        "name": sensor_key,
+        "type": type_key if type_key is not None else "Unknown",
+        "display_name": display_name if display_name is not None else "Unknown",
+        "unit": unit
+    }
+
+
+def load_zones(user_id=None):
+    """Zones with their sensors from one joined query; all users if user_id is None.
+
+    Requires an app context.
+    """
+    query = (
+        db.session.query(
+            Zone.id, Zone.name, Zone.description, Zone.user_id,
+            Sensor.id, Sensor.sensor_key,
+            SensorType.type_key, SensorType.display_name, SensorType.unit,
+        )
+        .outerjoin(ZoneSensor, ZoneSensor.zone_id == Zone.id)
+        .outerjoin(Sensor, Sensor.id == ZoneSensor.sensor_id)
+        .outerjoin(SensorType, SensorType.id == Sensor.sensor_type_id)
+        .order_by(Zone.id, ZoneSensor.id)
+    )
+    if user_id is not None:
+        query = query.filter(Zone.user_id == user_id)
+
+    zones = {}
+    for zone_id, name, description, owner_id, sensor_id, sensor_key, type_key, display_name, unit in query:
+        zone = zones.get(zone_id)
+        if zone is None:
+            zone = zones[zone_id] = {
+                "zone_id": zone_id,
+                "name": name,
+                "description": description,
+                "user_id": owner_id,
+                "sensors": []
+            }
+        # Zones without sensors, and assignments whose sensor is gone, join to NULL
+        if sensor_id is not None:
+            zone["sensors"].append(sensor_dict(sensor_id, sensor_key, type_key, display_name, unit))
+    return list(zones.values())
+
+
+def _load_user_zones(user_id):
+    return [
+        {key: value for key, value in zone.items() if key != "user_id"}
+        for zone in load_zones(user_id)
+    ]
+
+
+# user_id -> list of zone dicts as served by /api/zone. Zone routes and user
+# deletion drop the owner's entry; deleting a device or restoring a backup drops every user,
+# since zone assignments of the deleted sensors go with them
+_zones_by_user = LazyMap(_load_user_zones)
+
+
+def zones_for_user(user_id):
+    """Cached zone list for one user. Callers must not mutate the result."""
+    return _zones_by_user.get(user_id)
+
+
+def unassigned_sensors(user_id):
+    """The user's sensors that are in no zone, from one query. Not cached."""
+    rows = (
+        db.session.query(Sensor.id, Sensor.sensor_key, Sensor.sensor_type_id)
+        .filter(Sensor.userid == user_id)
+        .filter(~exists().where(ZoneSensor.sensor_id == Sensor.id))
+        .order_by(Sensor.id)
+    )
+    types = sensortypes.registry().by_id
+    sensors = []
+    for sensor_id, sensor_key, sensor_type_id in rows:
+        sensor_type = types.get(sensor_type_id)
+        if sensor_type is None:
+            sensors.append(sensor_dict(sensor_id, sensor_key, None, None, None))
+        else:
+            sensors.append(sensor_dict(sensor_id, sensor_key, sensor_type.type_key,
+                                       sensor_type.display_name, sensor_type.unit))
+    return sensors
+
+
+def invalidate(user_id=None):
+    """Drop one user's cached zones, or every user's when user_id is None."""
+    _zones_by_user.invalidate(user_id)
@@ -498,7 +498,21 @@ class DataManager {
             });
         });
     }
-        
+
+    // Apply [device_id, sensor_key, value, ts] tuples pushed over Socket.IO
+    applyDeltas(deltas) {
+        const tiles = Object.values(this.tileRenderer.tiles);
+        deltas.forEach(([deviceId, sensorKey, value]) => {
+            const config = this.configManager.getSensorConfig(sensorKey);
+            if (!config) return;
+
+            tiles
+                .filter(tile => tile.dataset.deviceId === String(deviceId) && tile.dataset.sensorType === sensorKey)
+                .forEach(tile => {
+                    this.tileRenderer.updateSensorDisplay(sensorKey, value, config, tile.dataset.deviceId, tile.dataset.sensorId);
+                });
+        });
+    }
 
     async handleRelayControl(event) {
         const { sensorType, deviceId, sensorId, state } = event.detail;
@@ -525,9 +539,14 @@ class DashboardManager {
     constructor(config = {}) {
         this.config = {
             pollingInterval: 5000,
+            livePollingInterval: 30000,  // Fallback polling while live updates are connected
             ...config
         };
 
+        this.socket = null;
+        this.liveConnected = false;
+        this.subscribedDevices = new Set();
+
         this.configManager = new SensorConfigManager();
         this.container = this.initializeDashboardContainer();
         this.tileRenderer = new TileRenderer(this.configManager, this.container);
@@ -539,9 +558,11 @@ class DashboardManager {
     async initializeDashboard() {
         this.startMessagePolling();
         this.setupDynamicTileAddition();
+        this.startLiveUpdates();
 
         // Fetch and display categorized sensors
         await this.dataManager.fetchCategorizedSensors();
+        this.subscribeLiveDevices();
     }
 
     initializeDashboardContainer() {
@@ -560,10 +581,46 @@ class DashboardManager {
         // Initial fetch
         this.dataManager.fetchCategorizedSensors();
 
-        // Start periodic polling
-        setInterval(() => {
-            this.dataManager.fetchCategorizedSensors();
-        }, this.config.pollingInterval);
+        // Keep polling as a fallback; slow down while live updates are flowing
+        const poll = async () => {
+            await this.dataManager.fetchCategorizedSensors();
+            this.subscribeLiveDevices();
+            setTimeout(poll, this.liveConnected ? this.config.livePollingInterval : this.config.pollingInterval);
+        };
+        setTimeout(poll, this.config.pollingInterval);
+    }
+
+    startLiveUpdates() {
+        if (typeof io === 'undefined') {
+            console.warn('Socket.IO not available, using polling only');
+            return;
+        }
+
+        this.socket = io();
+        this.socket.on('connect', () => {
+            this.liveConnected = true;
+            // Rooms are per connection, so subscribe again after a reconnect
+            this.subscribedDevices.clear();
+            this.subscribeLiveDevices();
+        });
+        this.socket.on('disconnect', () => {
+            this.liveConnected = false;
+        });
+        this.socket.on('sensor_delta', (message) => {
+            this.dataManager.applyDeltas(message.deltas);
+        });
+    }
+
+    subscribeLiveDevices() {
+        if (!this.socket || !this.liveConnected) return;
+
+        const newDevices = [...new Set(Object.values(this.tileRenderer.tiles).map(tile => tile.dataset.deviceId))]
+            .filter(deviceId => deviceId && !this.subscribedDevices.has(deviceId));
+
+        if (newDevices.length) {
+            this.socket.emit('subscribe', { device_ids: newDevices });
+            newDevices.forEach(deviceId => this.subscribedDevices.add(deviceId));
+        }
     }
 
     setupDynamicTileAddition() {
@@ -1,103 +1,134 @@
-// Function to update the list of devices (called periodically)
+// Tiles by device id, and the server_time of the last poll (null = full fetch)
+const deviceTiles = {};
+let lastDeviceSync = null;
+
+// Function to update the list of devices (called periodically).
+// After the first load only devices that changed since the last poll are fetched.
 function updateDevices() {
-    fetch('/device')
+    const params = new URLSearchParams({ per_page: 500 });
+    if (lastDeviceSync !== null) {
+        params.set('since', lastDeviceSync);
+    }
+    fetchDevicePages(params, 1)
+        .catch(error => {
+            console.error('Error fetching devices:', error);
+            alert('Failed to fetch device list. Try again.');
+        });
+}
+
+function fetchDevicePages(params, page, syncTime = null) {
+    params.set('page', page);
+    return fetch(`/device?${params}`)
         .then(response => response.json())
         .then(data => {
             const container = document.getElementById('deviceTilesContainer');
-            container.innerHTML = '';  // Clear existing tiles
-
-            data.forEach(device => {
-                const tile = document.createElement('div');
-                tile.classList.add('device-tile');
-
-                // Only show Device Title and Description if paired
-                if (device.paired) {
-                    // Device Title
-                    const titleElement = document.createElement('div');
-                    titleElement.classList.add('device-title');
-                    titleElement.textContent = device.title || 'No Title';
-                    tile.appendChild(titleElement);
-
-                    // Device Description
-                    const descriptionElement = document.createElement('div');
-                    descriptionElement.classList.add('device-description');
-                    descriptionElement.textContent = device.description || 'No Description';
-                    tile.appendChild(descriptionElement);
-                }
-
-                // Device ID
-                const deviceIdElement = document.createElement('div');
-                deviceIdElement.classList.add('device-id');
-                deviceIdElement.textContent = device.device_id;
-                tile.appendChild(deviceIdElement);
-
-                // Status
-                const statusElement = document.createElement('div');
-                statusElement.classList.add('status');
-                if (device.status !== 'online') {
-                    statusElement.classList.add('offline');  // Add 'offline' class
-                }
-                statusElement.textContent = device.status === 'online' ? 'Online' : 'Offline';
-                tile.appendChild(statusElement);
-
-                // Last Seen
-                const lastSeenElement = document.createElement('div');
-                lastSeenElement.textContent = device.last_seen ? new Date(device.last_seen).toLocaleString() : 'N/A';
-                tile.appendChild(lastSeenElement);
-
-                // Paired Status
-                const pairedElement = document.createElement('div');
-                pairedElement.textContent = device.paired ? 'Paired' : 'Not Paired';
-                tile.appendChild(pairedElement);
-
-                // Sensors
-                const sensorElement = document.createElement('div');
-                if (device.sensors && Object.keys(device.sensors).length > 0) {
-                    const sensorList = document.createElement('ul');
-                    sensorList.classList.add('sensor-list');
-                    Object.keys(device.sensors).forEach(sensorKey => {
-                        const sensorItem = document.createElement('li');
-                        sensorItem.textContent = sensorKey;
-                        sensorList.appendChild(sensorItem);
-                    });
-                    sensorElement.appendChild(sensorList);
+            data.devices.forEach(device => {
+                const tile = renderDeviceTile(device);
+                const existing = deviceTiles[device.device_id];
+                if (existing) {
+                    container.replaceChild(tile, existing);
                 } else {
-                    sensorElement.textContent = 'No Sensors';
+                    container.appendChild(tile);
                 }
-                tile.appendChild(sensorElement);
-
-                // Actions
-                const actionsContainer = document.createElement('div');
-
-                if (device.paired) {
-                    // Edit Button
-                    const editButton = document.createElement('button');
-                    editButton.textContent = 'Edit';
-                    editButton.onclick = () => editDeviceFromTile(device.device_id);
-                    actionsContainer.appendChild(editButton);
-
-                    // Delete Button
-                    const deleteButton = document.createElement('button');
-                    deleteButton.textContent = 'Delete';
-                    deleteButton.style.marginLeft = '10px';
-                    deleteButton.onclick = () => removeDevice(device.device_id);
-                    actionsContainer.appendChild(deleteButton);
-                } else {
-                    // Pair Button
-                    const pairButton = document.createElement('button');
-                    pairButton.textContent = 'Pair';
-                    pairButton.onclick = () => pairDeviceFromTile(device.device_id);
-                    actionsContainer.appendChild(pairButton);
-                }
-
-                tile.appendChild(actionsContainer);
-                container.appendChild(tile);
+                deviceTiles[device.device_id] = tile;
             });
-        })
-        .catch(error => {
-            console.error('Error fetching devices:', error);
-            alert('Failed to fetch device list. Try again.');
+
+            // Resume from the first page's time so changes made while paging are refetched
+            syncTime = syncTime === null ? data.server_time : syncTime;
+            if (page * data.per_page < data.total) {
+                return fetchDevicePages(params, page + 1, syncTime);
+            }
+            lastDeviceSync = syncTime;
+        });
+}
+
+// Build the tile for one device
+function renderDeviceTile(device) {
+    const tile = document.createElement('div');
+    tile.classList.add('device-tile');
+
+    // Only show Device Title and Description if paired
+    if (device.paired) {
+        // Device Title
+        const titleElement = document.createElement('div');
+        titleElement.classList.add('device-title');
+        titleElement.textContent = device.title || 'No Title';
+        tile.appendChild(titleElement);
+
+        // Device Description
+        const descriptionElement = document.createElement('div');
+        descriptionElement.classList.add('device-description');
+        descriptionElement.textContent = device.description || 'No Description';
+        tile.appendChild(descriptionElement);
+    }
+
+    // Device ID
+    const deviceIdElement = document.createElement('div');
+    deviceIdElement.classList.add('device-id');
+    deviceIdElement.textContent = device.device_id;
+    tile.appendChild(deviceIdElement);
+
+    // Status
+    const statusElement = document.createElement('div');
+    statusElement.classList.add('status');
+    if (device.status !== 'online') {
+        statusElement.classList.add('offline');  // Add 'offline' class
+    }
+    statusElement.textContent = device.status === 'online' ? 'Online' : 'Offline';
+    tile.appendChild(statusElement);
+
+    // Last Seen
+    const lastSeenElement = document.createElement('div');
+    lastSeenElement.textContent = device.last_seen ? new Date(device.last_seen).toLocaleString() : 'N/A';
+    tile.appendChild(lastSeenElement);
+
+    // Paired Status
+    const pairedElement = document.createElement('div');
+    pairedElement.textContent = device.paired ? 'Paired' : 'Not Paired';
+    tile.appendChild(pairedElement);
+
+    // Sensors
+    const sensorElement = document.createElement('div');
+    if (device.sensors && Object.keys(device.sensors).length > 0) {
+        const sensorList = document.createElement('ul');
+        sensorList.classList.add('sensor-list');
+        Object.keys(device.sensors).forEach(sensorKey => {
+            const sensorItem = document.createElement('li');
+            sensorItem.textContent = sensorKey;
+            sensorList.appendChild(sensorItem);
         });
+        sensorElement.appendChild(sensorList);
+    } else {
+        sensorElement.textContent = 'No Sensors';
+    }
+    tile.appendChild(sensorElement);
+
+    // Actions
+    const actionsContainer = document.createElement('div');
+
+    if (device.paired) {
+        // Edit Button
+        const editButton = document.createElement('button');
+        editButton.textContent = 'Edit';
+        editButton.onclick = () => editDeviceFromTile(device.device_id);
+        actionsContainer.appendChild(editButton);
+
+        // Delete Button
+        const deleteButton = document.createElement('button');
+        deleteButton.textContent = 'Delete';
+        deleteButton.style.marginLeft = '10px';
+        deleteButton.onclick = () => removeDevice(device.device_id);
+        actionsContainer.appendChild(deleteButton);
+    } else {
+        // Pair Button
+        const pairButton = document.createElement('button');
+        pairButton.textContent = 'Pair';
+        pairButton.onclick = () => pairDeviceFromTile(device.device_id);
+        actionsContainer.appendChild(pairButton);
+    }
+
+    tile.appendChild(actionsContainer);
+    return tile;
 }
 
 
@@ -1,10 +1,9 @@
 import logging
-import json
 import time
 from flask import Blueprint, jsonify, request, current_app, render_template
 from flask_login import login_required, current_user
-import paho.mqtt.client as mqtt
-from database.database import db, User, Sensor, SensorType, AutomationRule
+from database.database import db, User, Sensor, AutomationRule
+from services import livestate, relaycommands, ruleindex, sensordatatypes, sensortypes
 from datetime import datetime, timedelta
 from flask_socketio import SocketIO, emit
 
@@ -16,64 +15,7 @@ logger = logging.getLogger(__name__)
 # Create a Blueprint for automation
 autobp = Blueprint('autobp', __name__)
 
-# MQTT Configuration
-BROKER_ADDRESS = "atechpromqtt"  # Replace with your MQTT broker address
-BROKER_PORT = 1883               # Default MQTT port
-MQTT_TOPIC = "home/#"            # Topic to subscribe to
 socketio = SocketIO()
-# MQTT Client
-mqtt_client = mqtt.Client()
-
-# Store the latest sensor data
-last_known_state = {}
-
-
-# Initialize MQTT Client
-def init_mqtt_client():
-    """Initialize and connect the MQTT client to the broker."""
-    try:
-        mqtt_client.on_connect = on_connect
-        mqtt_client.on_message = on_message
-        mqtt_client.connect(BROKER_ADDRESS, BROKER_PORT)
-        mqtt_client.loop_start()
-        logger.info(f"Connected to MQTT broker at {BROKER_ADDRESS}:{BROKER_PORT}")
-    except Exception as e:
-        logger.error(f"Error connecting to MQTT broker: {e}")
-
-# MQTT on_connect callback
-def on_connect(client, userdata, flags, rc):
-    """Callback when the MQTT client connects to the broker."""
-    if rc == 0:
-        logger.info("Successfully connected to MQTT broker")
-        client.subscribe(MQTT_TOPIC)  # Subscribe to the topic
-    else:
-        logger.error(f"Failed to connect with return code {rc}")
-
-# MQTT on_message callback
-def on_message(_client, _userdata, msg):
-    """Callback when an MQTT message is received."""
-    try:
-        payload = json.loads(msg.payload.decode())  # Decode the JSON payload
-        device_id = payload.get("deviceId", "Unknown")  # Extract device ID
-
-        # Log the received message
-        logger.debug(f"Received message from {device_id}: {payload}")
-
-        # Update the last known state of the device
-        if device_id not in last_known_state:
-            last_known_state[device_id] = {"data": {}, "timestamp": time.time()}
-
-        # Update the data and timestamp of the device
-        for key, value in payload.items():
-            if key != "deviceId":
-                last_known_state[device_id]["data"][key] = value
-        last_known_state[device_id]["timestamp"] = time.time()
-
-    except Exception as e:
-        logger.error(f"Error processing MQTT message: {e}")
-
-# Initialize MQTT client when the module is loaded
-init_mqtt_client()
 
 
 
@@ -82,35 +24,30 @@ def fetch_sensor_datatype(sensor_key): # later will need to show as the sensor t
     Fetch the data type (unit or states) of a sensor based on its sensor_key.
     """
     try:
-        # Query the Sensor table to find the sensor by its sensor_key
-        sensor = Sensor.query.filter_by(sensor_key=sensor_key).first()
+        # Served from the shared datatype cache
+        response_data = sensordatatypes.describe(sensor_key)
 
         # Check if the sensor exists
-        if not sensor:
+        if response_data is None:
             return jsonify({"error": f"Sensor with key '{sensor_key}' not found"}), 404
 
-        # Get the associated SensorType
-        sensor_type = sensor.sensor_type
-
-        # Prepare the response data
-        response_data = {
-            "sensor_key": sensor_key,
-            "sensor_type": sensor_type.type_key,
-            "display_name": sensor_type.display_name,
-        }
-
-        # Add unit or states based on the sensor type
-        if sensor_type.unit:
-            response_data["unit"] = sensor_type.unit
-        elif sensor_type.states:
-            response_data["states"] = sensor_type.states
-
         return jsonify(response_data), 200
 
     except Exception as e:
         logger.error(f"Error fetching sensor data type for {sensor_key}: {e}")
         return jsonify({"error": "Failed to fetch sensor data type", "message": str(e)}), 500
 
+def validate_threshold(threshold):
+    """Error message for a threshold that cannot be stored, or None."""
+    if threshold is None or str(threshold).strip() == '':
+        return "Threshold must not be empty"
+    if ruleindex.looks_numeric(threshold):
+        try:
+            float(threshold)
+        except ValueError:
+            return f"Invalid numeric threshold: {threshold}"
+    return None
+
 def control_relay(device_id, request_type, **kwargs):
     try:
         # Check if the device is registered in the database
@@ -134,9 +71,8 @@ def control_relay(device_id, request_type, **kwargs):
         if command not in ['ON', 'OFF']:
             return {"error": "Invalid command. Use 'ON' or 'OFF'."}, 400
 
-        # Publish command to MQTT topic
-        mqtt_topic = f"home/{device_id}/relay/command"
-        mqtt_client.publish(mqtt_topic, command)
+        # Publish through the dispatcher, which tracks the ack
+        relay_command = relaycommands.send(device_id, command, source="automation")
         
         # Log the action
         logger.info(f"Relay {device_id} set to {command}")
@@ -144,7 +80,8 @@ def control_relay(device_id, request_type, **kwargs):
         # Return success response
         return {
             "message": f"Relay {device_id} set to {command}",
-            "command": command
+            "command": command,
+            "command_id": relay_command.command_id
         }, 200
 
     except Exception as e:
@@ -158,37 +95,27 @@ def fetch_and_categorize_sensor_data():
     global global_sensor_data
 
     try:
-        # Fetch all registered sensors and their types from the database
-        sensors = (
-            db.session.query(
-                Sensor.id,
-                Sensor.device_id,
-                Sensor.sensor_key,
-                Sensor.sensor_type_id,
-                SensorType.type_key,
-                SensorType.display_name,
-                SensorType.unit,
-                SensorType.states,
-            )
-            .join(SensorType, Sensor.sensor_type_id == SensorType.id)
-            .all()
-        )
+        # Fetch all registered sensors; their types come from the registry
+        sensors = db.session.query(Sensor.id, Sensor.device_id, Sensor.sensor_key, Sensor.sensor_type_id).all()
+        types = sensortypes.registry().by_id
 
         # Categorize sensors by their type
         categorized_data = {}
         for sensor in sensors:
-            sensor_type = sensor.type_key
-            if sensor_type not in categorized_data:
-                categorized_data[sensor_type] = {
-                    "type_display_name": sensor.display_name,
-                    "unit": sensor.unit,
-                    "states": sensor.states,
+            sensor_type = types.get(sensor.sensor_type_id)
+            if sensor_type is None:
+                continue
+            if sensor_type.type_key not in categorized_data:
+                categorized_data[sensor_type.type_key] = {
+                    "type_display_name": sensor_type.display_name,
+                    "unit": sensor_type.unit,
+                    "states": list(sensor_type.states) if sensor_type.states is not None else None,
                     "sensors": [],
                 }
-            categorized_data[sensor_type]["sensors"].append({
+            categorized_data[sensor_type.type_key]["sensors"].append({
                 "device_id": sensor.device_id,
                 "sensor_key": sensor.sensor_key,
-                "last_value": last_known_state.get(sensor.device_id, {}).get("data", {}).get(sensor.sensor_key),
+                "last_value": livestate.store.value(sensor.device_id, sensor.sensor_key),
                 "sensor_id": sensor.id,
                 "sensor_type_id": sensor.sensor_type_id,
             })
@@ -207,7 +134,7 @@ def fetch_and_categorize_sensor_data():
 def fetch_sensor_data():
     try:
         # Check if any sensor data is available
-        if not last_known_state:
+        if not livestate.store:
             return jsonify({"message": "No sensor data available"}), 200
 
         # Fetch and categorize sensor data
@@ -218,197 +145,71 @@ def fetch_sensor_data():
         logger.error(f"Error fetching sensor data: {e}")
         return jsonify({"error": "Failed to fetch sensor data", "message": str(e)}), 500
 
-last_rule_execution = {}
-last_refresh_time = datetime.now()
-REFRESH_INTERVAL = 30  # Refresh interval in seconds
-
 @autobp.route('/automation/sensors/rule_applied', methods=['GET'])
 @login_required
 def fetch_sensor_rules_applied():
-    global last_rule_execution, last_refresh_time
-
-    def should_execute_rule(rule_id, debounce_seconds=60):
-        """Check if enough time has passed since the last rule execution"""
-        current_time = datetime.now()
-        last_execution = last_rule_execution.get(rule_id)
-        
-        if last_execution is None or (current_time - last_execution) > timedelta(seconds=debounce_seconds):
-            last_rule_execution[rule_id] = current_time
-            return True
-        return False
-
-    def refresh_last_rule_execution():
-        """Refresh the last_rule_execution dictionary if the refresh interval has passed"""
-        global last_refresh_time
-        current_time = datetime.now()
-        if (current_time - last_refresh_time) > timedelta(seconds=REFRESH_INTERVAL):
-            last_rule_execution.clear()
-            last_refresh_time = current_time
-            logger.debug("Refreshed last_rule_execution dictionary")
-
-    def execute_automation_rule(rule_info, is_matched):
-        """Execute automation rule based on the matching condition with debouncing"""
-        if not rule_info['enabled']:
-            return
-        
-        try:
-            rule_id = rule_info['rule_id']
-            
-            if not should_execute_rule(rule_id):
-                logger.debug(f"Skipping rule execution due to debounce: {rule_info['auto_title']}")
-                return
-                
-            relay_device_id = rule_info['relay_device_id']
-            action = rule_info['action'].upper()
-            
-            if is_matched and action in ['ON', 'OFF']:
-                response, status_code = control_relay(
-                    device_id=relay_device_id,
-                    request_type='POST',
-                    json_data={'state': action}
-                )
-                
-                if status_code != 200:
-                    logger.error(f"Failed to execute automation rule: {response.get('error', 'Unknown error')}")
-                else:
-                    logger.info(f"Successfully executed automation rule: {rule_info['auto_title']}")
-                    
-        except Exception as e:
-            logger.error(f"Error executing automation rule: {str(e)}")
-
-    def check_rule_match(value, condition, threshold):
-        """Helper function to check if a value matches a rule's condition"""
-        try:
-            if value is None:
-                return False
-                
-            # Handle numeric comparisons
-            if isinstance(value, (int, float)) and threshold.replace('.', '').isdigit():
-                numeric_value = float(value)
-                numeric_threshold = float(threshold)
-                
-                if condition == 'GREATER_THAN':
-                    return numeric_value > numeric_threshold
-                elif condition == 'LESS_THAN':
-                    return numeric_value < numeric_threshold
-                elif condition == 'EQUALS':
-                    return numeric_value == numeric_threshold
-                    
-            # Handle string/state comparisons
-            else:
-                str_value = str(value).lower()
-                str_threshold = str(threshold).lower()
-                
-                if condition == 'EQUALS':
-                    return str_value == str_threshold
-                    
-            return False
-            
-        except (ValueError, TypeError):
-            return False
+    """Report which of the current user's rules match the live sensor values.
 
+    Rules are executed by the background rule engine as readings arrive;
+    this endpoint only reports their status.
+    """
     try:
-        if not last_known_state:
+        if not livestate.store:
             return jsonify({"message": "No sensor data available"}), 200
 
-        current_user_id = current_user.userid
-
         sensor_rules_data = {}
-        
-        # Modified query to only fetch sensors with active rules
-        sensor_rules = (
-            db.session.query(
-                Sensor.id,
-                Sensor.device_id,
-                Sensor.sensor_key,
-                Sensor.sensor_type_id,
-                SensorType.type_key,
-                SensorType.display_name,
-                SensorType.unit,
-                SensorType.states,
-                AutomationRule.id.label('rule_id'),
-                AutomationRule.condition,
-                AutomationRule.threshold,
-                AutomationRule.relay_device_id,
-                AutomationRule.action,
-                AutomationRule.enabled,
-                AutomationRule.auto_title,
-                AutomationRule.auto_description
-            )
-            .join(SensorType, Sensor.sensor_type_id == SensorType.id)
-            .join(
-                AutomationRule,
-                db.and_(
-                    Sensor.id == AutomationRule.sensor_id,
-                    AutomationRule.user_id == current_user_id
-                )
-            )
-            .all()
-        )
-
-        # Refresh the last_rule_execution dictionary if needed
-        refresh_last_rule_execution()
+        sensors_by_id = {}
 
-        # Process only sensors with rules
-        for sensor in sensor_rules:
-            sensor_type = sensor.type_key
+        # Compiled rules come from the in-memory index, no database access
+        for rule in ruleindex.rules_for_user(current_user.userid):
+            sensor_type = rule.type_key
             if sensor_type not in sensor_rules_data:
                 sensor_rules_data[sensor_type] = {
-                    "type_display_name": sensor.display_name,
-                    "unit": sensor.unit,
-                    "states": sensor.states,
+                    "type_display_name": rule.display_name,
+                    "unit": rule.unit,
+                    "states": rule.states,
                     "sensors": [],
                 }
 
-            current_value = last_known_state.get(sensor.device_id, {}).get("data", {}).get(sensor.sensor_key)
+            current_value = livestate.store.value(rule.device_id, rule.sensor_key)
 
             # Check if the rule conditions are currently matched
-            is_matched = check_rule_match(current_value, sensor.condition, sensor.threshold)
-            
+            is_matched = rule.predicate(current_value)
+
             # Create a human-readable status message
             status_message = (
                 f"Current value ({current_value}) "
                 f"{'matches' if is_matched else 'does not match'} "
-                f"condition: {sensor.condition} {sensor.threshold}"
+                f"condition: {rule.condition} {rule.threshold}"
             )
 
             rule_info = {
-                "rule_id": sensor.rule_id,
-                "condition": sensor.condition,
-                "threshold": sensor.threshold,
-                "relay_device_id": sensor.relay_device_id,
-                "action": sensor.action,
-                "enabled": sensor.enabled,
-                "auto_title": sensor.auto_title,
-                "auto_description": sensor.auto_description,
+                "rule_id": rule.rule_id,
+                "condition": rule.condition,
+                "threshold": rule.threshold,
+                "relay_device_id": rule.relay_device_id,
+                "action": rule.action,
+                "enabled": rule.enabled,
+                "auto_title": rule.auto_title,
+                "auto_description": rule.auto_description,
                 "is_matched": is_matched,
                 "status_message": status_message
             }
-            
-            # Execute the automation rule if conditions are met
-            execute_automation_rule(rule_info, is_matched)
-
-            # Check if sensor already exists in the list
-            sensor_exists = False
-            for existing_sensor in sensor_rules_data[sensor_type]["sensors"]:
-                if existing_sensor["sensor_id"] == sensor.id:
-                    if "rules" not in existing_sensor:
-                        existing_sensor["rules"] = []
-                    existing_sensor["rules"].append(rule_info)
-                    sensor_exists = True
-                    break
-
-            # If sensor doesn't exist, add it
-            if not sensor_exists:
+
+            # Group rules per sensor
+            sensor_data = sensors_by_id.get(rule.sensor_id)
+            if sensor_data is None:
                 sensor_data = {
-                    "device_id": sensor.device_id,
-                    "sensor_key": sensor.sensor_key,
+                    "device_id": rule.device_id,
+                    "sensor_key": rule.sensor_key,
                     "last_value": current_value,
-                    "sensor_id": sensor.id,
-                    "sensor_type_id": sensor.sensor_type_id,
-                    "rules": [rule_info]
+                    "sensor_id": rule.sensor_id,
+                    "sensor_type_id": rule.sensor_type_id,
+                    "rules": []
                 }
+                sensors_by_id[rule.sensor_id] = sensor_data
                 sensor_rules_data[sensor_type]["sensors"].append(sensor_data)
+            sensor_data["rules"].append(rule_info)
 
         return jsonify(sensor_rules_data), 200
 
@@ -440,6 +241,10 @@ def add_automation_rule():
                         "error": f"Missing required field: {field}"  
                     }), 400  
 
+            threshold_error = validate_threshold(data['threshold'])
+            if threshold_error:
+                return jsonify({"error": threshold_error}), 400
+
             new_rule = AutomationRule(  
                 user_id=current_user.userid,  
                 sensor_id=data['sensor_id'],  
@@ -455,6 +260,7 @@ def add_automation_rule():
 
             db.session.add(new_rule)  
             db.session.commit()  
+            ruleindex.invalidate()
 
             return jsonify({  
                 "message": "Automation rule added successfully!",  
@@ -503,6 +309,11 @@ def edit_automation_rule(rule_id):
     rule = AutomationRule.query.get_or_404(rule_id)
     data = request.get_json()
 
+    if 'threshold' in data:
+        threshold_error = validate_threshold(data['threshold'])
+        if threshold_error:
+            return jsonify({"error": threshold_error}), 400
+
     # Update the rule attributes
     rule.user_id = data.get('user_id', rule.user_id)
     rule.sensor_id = data.get('sensor_id', rule.sensor_id)
@@ -516,6 +327,7 @@ def edit_automation_rule(rule_id):
     rule.auto_description = data.get('auto_description', rule.auto_description)
 
     db.session.commit()
+    ruleindex.invalidate()
     return jsonify(rule.as_dict()), 200
 
 # Delete Route
@@ -524,6 +336,7 @@ def delete_automation_rule(rule_id):
     rule = AutomationRule.query.get_or_404(rule_id)
     db.session.delete(rule)
     db.session.commit()
+    ruleindex.invalidate()
     return jsonify({"message": "Rule deleted successfully"}), 200
 
 
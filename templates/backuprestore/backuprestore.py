@@ -1,25 +1,33 @@
 import os
-import shutil
+import tempfile
 from datetime import datetime
-from flask import Blueprint, jsonify, request, send_file, render_template, url_for, redirect
-from flask_login import current_user
+from flask import Blueprint, Response, jsonify, request, send_file, render_template, url_for, redirect
+from flask_login import current_user, login_required
+from database.database import db
+from database.bootstrap import run_migrations
+from services import backupchain, backups, deviceregistry, ruleindex, sensordatatypes, sensortypes, timerservice, timeseries, usercache, writebehind, zoneindex
 
 # Define the blueprint
 backup_restore_bp = Blueprint('backup_restore', __name__, template_folder='templates/backuprestore')
 
 # Resolve the absolute path of the database based on the current working directory
 project_root = os.getcwd()  # Get the current working directory (where the app is run from)
-DB_PATH = os.path.join(project_root, 'database', 'database.db')  # Absolute path to the database file
 BACKUP_DIR = os.path.join(project_root, 'backups')  # Backup directory relative to the project root
+CHAIN_DIR = os.path.join(BACKUP_DIR, 'chain')  # Scheduled full + differential backups
+BACKUP_EXTENSIONS = ('.db', '.db.gz')
 
 # Helper function to get the timestamped backup filename
 def get_backup_filename():
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    return os.path.join(BACKUP_DIR, f'backup_{timestamp}.db')
+    return os.path.join(BACKUP_DIR, f'backup_{timestamp}.db.gz')
 
-# Route to backup the database (copy the .db file)
+# Route to backup the database (online snapshot, streamed as gzip)
 @backup_restore_bp.route('/backup', methods=['GET'])
+@login_required
 def backup_database():
+    if current_user.role != 1:
+        return jsonify({'error': 'Unauthorized'}), 403
+    snapshot_path = None
     try:
         # Create backup directory if it doesn't exist
         os.makedirs(BACKUP_DIR, exist_ok=True)
@@ -27,27 +35,36 @@ def backup_database():
         # Backup filename with timestamp
         backup_filename = get_backup_filename()
 
-        # Check if the database file exists before proceeding
-        if not os.path.exists(DB_PATH):
-            return jsonify({'error': f'Database file not found: {DB_PATH}'}), 500
-
-        # Copy the database file to the backup location
-        shutil.copy(DB_PATH, backup_filename)
-
-        # Send the backup file to the client
-        return send_file(
-            backup_filename,
-            mimetype='application/octet-stream',
-            as_attachment=True,
-            download_name=f'backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.db'
-        )
+        # Consistent copy through the SQLite backup API; writers keep going
+        fd, snapshot_path = tempfile.mkstemp(prefix='.snapshot_', suffix='.tmp', dir=BACKUP_DIR)
+        os.close(fd)
+        backups.snapshot(snapshot_path)
 
     except Exception as e:
+        if snapshot_path and os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
         return jsonify({'error': f'Error during backup: {str(e)}'}), 500
 
-# Route to restore the database from a backup (overwrite .db file)
+    def generate():
+        try:
+            # Compressed chunks go to the client and into BACKUP_DIR as they are produced
+            yield from backups.iter_compressed(snapshot_path, backup_filename)
+        finally:
+            os.remove(snapshot_path)
+
+    return Response(
+        generate(),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename={os.path.basename(backup_filename)}'}
+    )
+
+# Route to restore the database from an uploaded .db or .db.gz backup
 @backup_restore_bp.route('/restore', methods=['POST'])
+@login_required
 def restore_database():
+    if current_user.role != 1:
+        return jsonify({'error': 'Unauthorized'}), 403
+    staged_path = None
     try:
         # Check if the request contains a file
         if 'backup_file' not in request.files:
@@ -57,30 +74,140 @@ def restore_database():
         if backup_file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
 
-        # Ensure the uploaded file is a .db file
-        if not backup_file.filename.endswith('.db'):
-            return jsonify({'error': 'Invalid backup file format. Only .db files are allowed.'}), 400
+        # Ensure the uploaded file is a backup produced by /backup
+        if not backup_file.filename.endswith(BACKUP_EXTENSIONS):
+            return jsonify({'error': 'Invalid backup file format. Only .db and .db.gz files are allowed.'}), 400
 
-        # Directly replace the database file with the uploaded file
-        with open(DB_PATH, 'wb') as db_file:
-            db_file.write(backup_file.read())
+        # Stream to a staging file next to the database, then validate and swap
+        staged_path = backups.staging_path()
+        backups.receive_upload(backup_file.stream, staged_path)
+        install_database(staged_path)
 
         return jsonify({'message': 'Database restored successfully'}), 200
 
+    except backups.InvalidBackup as e:
+        return jsonify({'error': f'Invalid backup: {str(e)}'}), 400
     except Exception as e:
         return jsonify({'error': f'Error during restore: {str(e)}'}), 500
+    finally:
+        if staged_path and os.path.exists(staged_path):
+            os.remove(staged_path)
+
+
+# Validate a staged database, swap it in, and reload everything cached from the old one
+def install_database(staged_path):
+    backups.validate_database(staged_path, db.metadata)
+
+    # Buffered sensor writes belong to the old database; write them out
+    # before its connections go away
+    writebehind.flush()
+    timeseries.flush()
+
+    backups.swap_database(staged_path)
+    run_migrations(db.engine, db.metadata)
+
+    ruleindex.invalidate()
+    zoneindex.invalidate()
+    deviceregistry.invalidate()
+    sensortypes.invalidate()
+    sensordatatypes.invalidate()
+    usercache.invalidate()
+    timerservice.reload_timers()
+
+
+# List the points of the backup chain (newest first)
+@backup_restore_bp.route('/backups/chain', methods=['GET'])
+@login_required
+def list_chain():
+    if current_user.role != 1:
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        entries = backupchain.load_manifest(CHAIN_DIR) if os.path.exists(CHAIN_DIR) else []
+        return jsonify({'backups': sorted(entries, key=lambda x: x['created_at'], reverse=True)})
+    except Exception as e:
+        return jsonify({'error': f'Error listing backup chain: {str(e)}'}), 500
+
+
+# Add a point to the chain now (?full=1 forces a full snapshot)
+@backup_restore_bp.route('/backups/chain', methods=['POST'])
+@login_required
+def create_chain_backup():
+    if current_user.role != 1:
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        full = request.args.get('full', '').lower() in ('1', 'true', 'yes')
+        entry = backupchain.create_backup(CHAIN_DIR, full=full)
+        return jsonify(entry), 201
+    except Exception as e:
+        return jsonify({'error': f'Error during backup: {str(e)}'}), 500
+
+
+# Download any point of the chain, rebuilt as a standalone gzip database
+@backup_restore_bp.route('/backups/chain/<name>', methods=['GET'])
+@login_required
+def download_chain_backup(name):
+    if current_user.role != 1:
+        return jsonify({'error': 'Unauthorized'}), 403
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    fd, rebuilt_path = tempfile.mkstemp(prefix='.rebuild_', suffix='.tmp', dir=BACKUP_DIR)
+    os.close(fd)
+    try:
+        backupchain.materialize(CHAIN_DIR, name, rebuilt_path)
+    except KeyError:
+        os.remove(rebuilt_path)
+        return jsonify({'error': 'Backup not found in chain'}), 404
+    except Exception as e:
+        os.remove(rebuilt_path)
+        return jsonify({'error': f'Error rebuilding backup: {str(e)}'}), 500
+
+    def generate():
+        try:
+            yield from backups.iter_compressed(rebuilt_path)
+        finally:
+            os.remove(rebuilt_path)
+
+    return Response(
+        generate(),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename=backup_{name}.db.gz'}
+    )
+
+
+# Restore the database as of any point of the chain
+@backup_restore_bp.route('/backups/chain/<name>/restore', methods=['POST'])
+@login_required
+def restore_chain_backup(name):
+    if current_user.role != 1:
+        return jsonify({'error': 'Unauthorized'}), 403
+    rebuilt_path = backups.staging_path()
+    try:
+        backupchain.materialize(CHAIN_DIR, name, rebuilt_path)
+        install_database(rebuilt_path)
+        return jsonify({'message': f'Database restored to backup {name}'}), 200
+    except KeyError:
+        return jsonify({'error': 'Backup not found in chain'}), 404
+    except backups.InvalidBackup as e:
+        return jsonify({'error': f'Invalid backup: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error during restore: {str(e)}'}), 500
+    finally:
+        if os.path.exists(rebuilt_path):
+            os.remove(rebuilt_path)
 
 
 # Helper route to get list of available backups
 @backup_restore_bp.route('/backups', methods=['GET'])
+@login_required
 def list_backups():
+    if current_user.role != 1:
+        return jsonify({'error': 'Unauthorized'}), 403
     try:
         if not os.path.exists(BACKUP_DIR):
             return jsonify({'backups': []})
 
         backups = []
         for filename in os.listdir(BACKUP_DIR):
-            if filename.endswith('.db'):
+            if filename.endswith(BACKUP_EXTENSIONS):
                 file_path = os.path.join(BACKUP_DIR, filename)
                 file_stat = os.stat(file_path)
                 backups.append({
@@ -98,7 +225,10 @@ def list_backups():
 
 # Route to download a specific backup file
 @backup_restore_bp.route('/backups/<filename>', methods=['GET'])
+@login_required
 def download_backup(filename):
+    if current_user.role != 1:
+        return jsonify({'error': 'Unauthorized'}), 403
     try:
         backup_path = os.path.join(BACKUP_DIR, filename)
         if not os.path.exists(backup_path):
@@ -106,7 +236,7 @@ def download_backup(filename):
 
         return send_file(
             backup_path,
-            mimetype='application/octet-stream',
+            mimetype='application/gzip' if filename.endswith('.gz') else 'application/octet-stream',
             as_attachment=True,
             download_name=filename
         )
@@ -117,7 +247,10 @@ def download_backup(filename):
 
 # Route to delete a specific backup file
 @backup_restore_bp.route('/backups/<filename>', methods=['DELETE'])
+@login_required
 def delete_backup(filename):
+    if current_user.role != 1:
+        return jsonify({'error': 'Unauthorized'}), 403
     try:
         # Full path of the backup file to delete
         backup_path = os.path.join(BACKUP_DIR, filename)
@@ -138,6 +271,7 @@ def delete_backup(filename):
 
 # Render the backup/restore UI page
 @backup_restore_bp.route('/backup_restore')
+@login_required
 def backup_restore_page():
     if current_user.role != 1:
         # Redirect to home page if user is not authorized
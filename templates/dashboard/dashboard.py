@@ -1,11 +1,12 @@
 import os
+import math
 import logging
 from flask import Blueprint, render_template, jsonify, request, current_app
 from flask_login import login_required, current_user
-import paho.mqtt.client as mqtt
-import json
 import time
-from database.database import db, User, Sensor, SensorType, DashboardSensor
+from database.database import db, User, Sensor, DashboardSensor, Zone, ZoneSensor
+from services import deviceregistry, livestate, relaycommands, sensortypes, timeseries
+from datetime import datetime, timedelta
 
 
 
@@ -18,52 +19,8 @@ logger = logging.getLogger(__name__)
 dashboardbp = Blueprint('dashboard', __name__)
 
 # MQTT Configuration
-BROKER_ADDRESS = "atechpromqtt"
-BROKER_PORT = 1883
 MAX_MESSAGE_AGE = 10  # Maximum age of messages in seconds
-MQTT_TOPIC = "home/#"
-
-# MQTT Client
-mqtt_client = mqtt.Client()
-last_known_state = {}  # Stores the latest state of each device
-
-# Initialize MQTT Client
-def init_mqtt_client():
-    try:
-        mqtt_client.on_connect = on_connect
-        mqtt_client.on_message = on_message
-        mqtt_client.connect(BROKER_ADDRESS, BROKER_PORT)
-        mqtt_client.loop_start()
-        logger.info(f"Connected to MQTT broker at {BROKER_ADDRESS}:{BROKER_PORT}")
-    except Exception as e:
-        logger.error(f"Error connecting to MQTT broker: {e}")
-
-# MQTT on_connect callback
-def on_connect(client, userdata, flags, rc):
-    if rc == 0:
-        logger.info("Successfully connected to MQTT broker")
-        client.subscribe(MQTT_TOPIC)
-    else:
-        logger.error(f"Failed to connect with return code {rc}")
-
-# MQTT on_message callback
-def on_message(_client, _userdata, msg):
-    try:
-        payload = json.loads(msg.payload.decode())
-        device_id = payload.get("deviceId", "Unknown")
-        if device_id not in last_known_state:
-            last_known_state[device_id] = {"data": {}, "timestamp": time.time()}
-        for key, value in payload.items():
-            if key != "deviceId":
-                last_known_state[device_id]["data"][key] = value
-        last_known_state[device_id]["timestamp"] = time.time()
-    except Exception as e:
-        logger.error(f"Error processing MQTT message: {e}")
-
-# Initialize MQTT client when the module is loaded
-def init_app(app):
-    init_mqtt_client()
-    app.before_first_request(init_mqtt_client)
+SCENE_MAX_WAIT = 5  # Longest a scene request may wait for relay acks, in seconds
 
 # Dashboard Route
 @dashboardbp.route('/dashboard')
@@ -73,9 +30,9 @@ def dashboard():
         current_time = time.time()
         # Filter out stale messages
         filtered_data = {
-            device_id: details["data"]
-            for device_id, details in last_known_state.items()
-            if current_time - details.get("timestamp", 0) <= MAX_MESSAGE_AGE
+            device_id: state.values
+            for device_id, state in livestate.store.snapshot().devices.items()
+            if current_time - state.last_seen <= MAX_MESSAGE_AGE
         }
         messages = filtered_data
     except Exception as e:
@@ -223,13 +180,13 @@ def dashboardsensor():
         current_time = time.time()
         categorized_data = {}
 
-        for device_id, details in last_known_state.items():
+        for device_id, state in livestate.store.snapshot().devices.items():
             # Only process if this device has sensors on the dashboard
-            for sensor_key, value in details["data"].items():
+            for sensor_key, value in state.values.items():
                 # Check if this (device_id, sensor_key) pair is on the dashboard
                 dashboard_sensor = dashboard_sensors.get((device_id, sensor_key))
                 if dashboard_sensor:
-                    if current_time - details.get("timestamp", 0) <= MAX_MESSAGE_AGE:
+                    if current_time - state.last_seen <= MAX_MESSAGE_AGE:
                         if sensor_key not in categorized_data:
                             categorized_data[sensor_key] = []
                         categorized_data[sensor_key].append({
@@ -238,7 +195,7 @@ def dashboardsensor():
                             "device_id": device_id,
                             "sensor_key": sensor_key,
                             "value": value,
-                            "last_seen": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(details["timestamp"]))
+                            "last_seen": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(state.last_seen))
                         })
 
         if not categorized_data:
@@ -258,6 +215,45 @@ def dashboardsensor():
 
 
 
+@dashboardbp.route('/dashboard/history/<device_id>/<sensor_key>', methods=['GET'])
+@login_required
+def sensor_history(device_id, sensor_key):
+    """Sensor history for charts, served from rollups for anything longer than an hour."""
+    resolutions = {"raw": None, "minute": 60, "hour": 3600}
+    try:
+        hours = float(request.args.get('hours', 24))
+        if not math.isfinite(hours) or hours <= 0:
+            return jsonify({"error": "'hours' must be a positive number"}), 400
+        hours = min(hours, timeseries.MAX_HISTORY.total_seconds() / 3600)
+
+        end = datetime.now()
+        start = end - timedelta(hours=hours)
+
+        requested = request.args.get('resolution', 'auto')
+        if requested == 'auto':
+            resolution = timeseries.pick_resolution(end - start)
+        elif requested in resolutions:
+            resolution = resolutions[requested]
+        else:
+            return jsonify({"error": "Invalid resolution. Use 'auto', 'raw', 'minute' or 'hour'."}), 400
+
+        return jsonify({
+            "device_id": device_id,
+            "sensor_key": sensor_key,
+            "resolution": resolution,
+            "points": timeseries.history(device_id, sensor_key, start, end, resolution)
+        })
+
+    except ValueError:
+        return jsonify({"error": "'hours' must be a number"}), 400
+    except Exception as e:
+        logger.error(f"Error fetching history for {device_id}/{sensor_key}: {str(e)}")
+        return jsonify({
+            "error": "Failed to fetch sensor history",
+            "message": str(e)
+        }), 500
+
+
 @dashboardbp.route('/dashboard/<device_id>/relay/command', methods=['GET', 'POST'])
 @login_required
 def control_relay(device_id):
@@ -275,16 +271,16 @@ def control_relay(device_id):
         if command not in ['ON', 'OFF']:
             return jsonify({"error": "Invalid command. Use 'ON' or 'OFF'."}), 400
 
-        # Publish command to MQTT topic
-        mqtt_topic = f"home/{device_id}/relay/command"
-        result = mqtt_client.publish(mqtt_topic, command)
+        # Publish through the dispatcher, which tracks the ack
+        relay_command = relaycommands.send(device_id, command, source="dashboard")
         
         # Log action
         logger.info(f"Relay {device_id} set to {command}")
 
         return jsonify({
             "message": f"Relay {device_id} set to {command}",
-            "command": command
+            "command": command,
+            "command_id": relay_command.command_id
         }), 200
 
     except Exception as e:
@@ -295,26 +291,109 @@ def control_relay(device_id):
         }), 500
     
 
+@dashboardbp.route('/dashboard/relay/commands/<int:command_id>', methods=['GET'])
+@login_required
+def get_relay_command(command_id):
+    """Delivery status of a relay command: pending, acked, timeout or superseded."""
+    relay_command = relaycommands.get_command(command_id)
+    if relay_command is None:
+        return jsonify({"error": f"Unknown command {command_id}"}), 404
+    return jsonify(relay_command.to_dict()), 200
+
+
+@dashboardbp.route('/dashboard/scene', methods=['POST'])
+@login_required
+def run_scene():
+    """Switch many relays in one request.
+
+    Body: {"commands": [{"device_id": ..., "state": "ON"|"OFF"}, ...]}
+    or {"zone_id": ..., "state": ...} for every relay in one of the user's
+    zones. Optional "wait" (seconds, max SCENE_MAX_WAIT) holds the response
+    until the relays confirm, so the summary includes the acks.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+
+        # Parse the wait before anything is published; NaN would slip through the clamp
+        try:
+            wait = float(data.get('wait') or 0)
+        except (TypeError, ValueError):
+            return jsonify({"error": "'wait' must be a number"}), 400
+        if not math.isfinite(wait):
+            return jsonify({"error": "'wait' must be a finite number"}), 400
+        wait = min(max(wait, 0), SCENE_MAX_WAIT)
+
+        if 'zone_id' in data:
+            zone = Zone.query.filter_by(id=data['zone_id'], user_id=current_user.userid).first()
+            if not zone:
+                return jsonify({"error": "Zone not found"}), 404
+            relay_devices = (
+                db.session.query(Sensor.device_id)
+                .join(ZoneSensor, ZoneSensor.sensor_id == Sensor.id)
+                .filter(ZoneSensor.zone_id == zone.id, Sensor.sensor_key == 'relay')
+                .distinct()
+            )
+            requested = [(device_id, data.get('state')) for device_id, in relay_devices]
+        elif isinstance(data.get('commands'), list):
+            requested = [
+                (item.get('device_id'), item.get('state')) if isinstance(item, dict) else (None, None)
+                for item in data['commands']
+            ]
+        else:
+            return jsonify({"error": "Invalid request. 'commands' or 'zone_id' is required."}), 400
+
+        # Validate the whole batch against the cached device set; the last
+        # entry for a device wins
+        registered = deviceregistry.registered_devices()
+        accepted = {}
+        rejected = []
+        for device_id, state in requested:
+            state = str(state or '').upper()
+            if state not in relaycommands.VALID_STATES:
+                rejected.append({"device_id": device_id, "error": "Invalid command. Use 'ON' or 'OFF'."})
+            elif device_id not in registered:
+                rejected.append({"device_id": device_id, "error": f"Device {device_id} is not registered"})
+            else:
+                accepted[device_id] = state
+
+        commands = relaycommands.send_many(accepted.items(), source="scene")
+        logger.info(f"Scene sent {len(commands)} relay commands ({len(rejected)} rejected)")
+
+        if wait and commands:
+            relaycommands.wait_for(commands, wait)
+
+        statuses = [command.status for command in commands]
+        return jsonify({
+            "sent": len(commands),
+            "acked": statuses.count('acked'),
+            "pending": statuses.count('pending'),
+            "failed": len(commands) - statuses.count('acked') - statuses.count('pending'),
+            "rejected": rejected,
+            "commands": [command.to_dict() for command in commands]
+        }), 200
+
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
+    except Exception as e:
+        logger.error(f"Error running scene: {str(e)}")
+        return jsonify({
+            "error": "Failed to run scene",
+            "message": str(e)
+        }), 500
+
+
 @dashboardbp.route('/dashboard/sensor_types', methods=['GET'])
 @login_required
 def get_sensor_types():
     try:
-        # Fetch all sensor types from the database
-        sensor_types = SensorType.query.all()
-        
-        # Format the response
-        sensor_types_data = [
-            {
-                "id": sensor.id,  # Include sensor ID
-                "type_key": sensor.type_key,
-                "display_name": sensor.display_name,  # Use display_name instead of type_key
-                "unit": sensor.unit,
-                "states": sensor.states
-            }
-            for sensor in sensor_types
-        ]
-        
-        return jsonify(sensor_types_data)
+        registry = sensortypes.registry()
+        if registry.etag in request.if_none_match:
+            response = current_app.response_class(status=304)
+        else:
+            response = jsonify([sensortypes.as_dict(sensor_type) for sensor_type in registry.types])
+        response.set_etag(registry.etag)
+        response.headers['Cache-Control'] = 'private, no-cache'  # Revalidate, the registry can grow
+        return response
     except Exception as e:
         logger.error(f"Error fetching sensor types: {str(e)}")
         return jsonify({"error": "Failed to fetch sensor types"}), 500
@@ -1,138 +1,132 @@
 from flask import Blueprint, render_template, jsonify, request
 from flask_login import login_required, current_user
-from datetime import datetime, timedelta
-import paho.mqtt.client as mqtt
-import json
-from threading import Thread
+from datetime import datetime
 import time
 from database.database import db, Device, Sensor, SensorType
+from services import deviceregistry, livestate, mqttbus, ruleindex, sensordatatypes, sensortypes, zoneindex
+from services.liveness import LivenessTracker
 
 devicemanage_bp = Blueprint('devicemanage', __name__)
 
-# MQTT Configuration
-BROKER_ADDRESS = "atechpromqtt"
-BROKER_PORT = 1883
-MQTT_TOPIC = "home/#"
+# Device liveness configuration
 DEVICE_TIMEOUT = 3  # seconds
-CHECK_INTERVAL = 3  # seconds
 
-# In-memory device store
-devices = {}
-
-mqtt_client = mqtt.Client()
-
-def on_connect(client, userdata, flags, rc):
-    """Callback for when the client connects to the MQTT broker."""
-    if rc == 0:
-        print("Connected to MQTT broker.")
-        client.subscribe(MQTT_TOPIC)
-    else:
-        print(f"Failed to connect to MQTT broker with return code {rc}")
-
-def on_message(client, userdata, msg):
-    """Callback for when a message is received from MQTT."""
-    try:
-        payload = json.loads(msg.payload.decode())
-        device_id = payload.get("deviceId")
-        ip_address = payload.get("ip")
-
-        if not device_id or not ip_address:
-            print("Invalid MQTT message: missing deviceId or IP address.")
-            return
-
-        # Update or create device in memory
-        if device_id not in devices:
-            devices[device_id] = {
-                "ip_address": ip_address,
-                "status": "online",
-                "last_seen": datetime.now().isoformat(),
-                "sensors": {}
-            }
-        else:
-            devices[device_id]["last_seen"] = datetime.now().isoformat()
-            devices[device_id]["status"] = "online"
-
-        # Update or add sensors from the MQTT payload
-        for key, value in payload.items():
-            if key not in ["deviceId", "ip"]:
-                devices[device_id]["sensors"][key] = {
-                    "value": value,
-                    "status": "online",
-                    "last_seen": datetime.now().isoformat()
-                }
-    except Exception as e:
-        print(f"Error processing MQTT message: {e}")
-
-def monitor_device_status():
-    """Background task to monitor device status based on last seen time."""
-    while True:
-        now = datetime.now()
-        for device_id, device_info in devices.items():
-            last_seen = datetime.fromisoformat(device_info["last_seen"])
-
-            # Check if the device has been offline for too long
-            if (now - last_seen) > timedelta(seconds=DEVICE_TIMEOUT):
-                if device_info["status"] != "offline":
-                    device_info["status"] = "offline"
-                    print(f"Device {device_id} marked as offline.")
-            else:
-                if device_info["status"] != "online":
-                    device_info["status"] = "online"
-                    print(f"Device {device_id} marked as online.")
-        time.sleep(CHECK_INTERVAL)
-
-# Start monitoring device status in the background
-status_monitor_thread = Thread(target=monitor_device_status, daemon=True)
-status_monitor_thread.start()
-
-def init_mqtt_client():
-    """Initialize and start the MQTT client."""
-    try:
-        mqtt_client.on_connect = on_connect
-        mqtt_client.on_message = on_message
-        mqtt_client.connect(BROKER_ADDRESS, BROKER_PORT)
-        mqtt_client.loop_start()
-    except Exception as e:
-        print(f"Error connecting to MQTT broker: {e}")
+# /device paging
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Device values live in livestate.store; this blueprint only tracks liveness
+def on_message(topic, payload, received_at):
+    """MQTT consumer, fed by the shared ingest bus."""
+    device_id = payload.get("deviceId")
+    if not device_id or not payload.get("ip"):
+        print("Invalid MQTT message: missing deviceId or IP address.")
+        return
+    liveness.seen(device_id)
+
+mqttbus.register_consumer(on_message)
+
+def on_liveness_change(device_id, online):
+    """Liveness transition listener; only called when a device changes state."""
+    livestate.store.set_online(device_id, online)
+    print(f"Device {device_id} marked as {'online' if online else 'offline'}.")
+
+def iso_time(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+def device_entry(state):
+    """The in-memory view of one device as the device pages expect it."""
+    last_seen = iso_time(state.last_seen)
+    return {
+        "ip_address": state.values["ip"],
+        "status": "online" if state.online else "offline",
+        "last_seen": last_seen,
+        "sensors": {
+            key: {"value": value, "status": "online", "last_seen": iso_time(state.stamps[key])}
+            for key, value in state.values.items() if key != "ip"
+        },
+    }
+
+def known_devices(snapshot):
+    """Devices that have announced an IP address, as (device_id, DeviceState)."""
+    return [(device_id, state) for device_id, state in snapshot.devices.items() if "ip" in state.values]
+
+# Deadline-driven status tracking, woken only when a device's timeout expires
+liveness = LivenessTracker(DEVICE_TIMEOUT)
+liveness.add_listener(on_liveness_change)
+liveness.start()
 
 @devicemanage_bp.route('/device')
 @login_required
 def get_devices():
-    """API to fetch device list."""
+    """API to fetch device list.
+
+    Without parameters returns every device as a plain list. With ``since``
+    (a previous ``server_time``), ``page`` or ``per_page`` it returns a page
+    of the devices that changed, wrapped with paging info.
+    """
     user_id = current_user.get_id()
+    since = request.args.get('since', type=float)
+    paginated = since is not None or 'page' in request.args or 'per_page' in request.args
+    server_time = time.time()
+
+    entries = known_devices(livestate.store.snapshot())
+    if since is not None:
+        entries = [(device_id, state) for device_id, state in entries if state.changed_at >= since]
+    total = len(entries)
+    if paginated:
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        entries = entries[(page - 1) * per_page:page * per_page]
+
+    # One query for all of the user's paired devices instead of one per device
+    paired_devices = {
+        device_id: (title, description)
+        for device_id, title, description in db.session.query(
+            Device.device_id, Device.title, Device.description
+        ).filter(Device.userid == user_id)
+    }
+
     device_list = []
-    for device_id, device_info in devices.items():
-        paired_device = Device.query.filter_by(device_id=device_id, userid=user_id).first()
+    for device_id, state in entries:
+        paired_device = paired_devices.get(device_id)
+        device_info = device_entry(state)
 
         # Create device info dictionary
         device_data = {
             "device_id": device_id,
-            "ip_address": device_info.get("ip_address", "N/A"),
-            "status": device_info.get("status", "offline"),
-            "last_seen": device_info.get("last_seen"),
+            "ip_address": device_info["ip_address"],
+            "status": device_info["status"],
+            "last_seen": device_info["last_seen"],
             "paired": paired_device is not None,
-            "sensors": device_info.get("sensors", []),
+            "sensors": device_info["sensors"],
             # Add title and description from the paired device if it exists
-            "title": paired_device.title if paired_device else None,
-            "description": paired_device.description if paired_device else None
+            "title": paired_device[0] if paired_device else None,
+            "description": paired_device[1] if paired_device else None
         }
         device_list.append(device_data)
 
-    return jsonify(device_list)
+    if not paginated:
+        return jsonify(device_list)
+    return jsonify({
+        "devices": device_list,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "server_time": server_time
+    })
+
+def mark_changed(device_id):
+    """Make a device show up in the next ``since`` poll, e.g. after (un)pairing."""
+    livestate.store.touch(device_id)
 
 @devicemanage_bp.route('/devicemanage')
 @login_required
 def devicemanage():
     """Render the device management page."""
     device_list = [
-        {
-            "device_id": device_id,
-            "ip_address": device_info["ip_address"],
-            "status": device_info["status"],
-            "last_seen": device_info["last_seen"],
-            "sensors": device_info["sensors"]
-        }
-        for device_id, device_info in devices.items()
+        {"device_id": device_id, **device_entry(state)}
+        for device_id, state in known_devices(livestate.store.snapshot())
     ]
     return render_template('devicemanage/devicemanage.html', user=current_user, devices=device_list)
 
@@ -155,7 +149,8 @@ def add_device():
         return jsonify({"error": "Device already exists"}), 400
 
     # Check if device exists in MQTT memory
-    mqtt_device_data = devices.get(device_id)
+    state = livestate.store.snapshot().device(device_id)
+    mqtt_device_data = device_entry(state) if state is not None and "ip" in state.values else None
     if not mqtt_device_data:
         print(f"Warning: Device {device_id} not found in MQTT data")
         
@@ -171,11 +166,11 @@ def add_device():
     print(f"Added new device: {device_id}")
 
     # Fetch all sensor types from the database
-    sensor_types = SensorType.query.all()
-    sensor_type_mapping = {st.type_key: st.id for st in sensor_types}
+    sensor_type_mapping = {key: st.id for key, st in sensortypes.registry().by_key.items()}
     print("Available sensor types:", sensor_type_mapping)
 
     # Add a default 'unknown' sensor type if it doesn't exist
+    added_unknown_type = False
     if 'unknown' not in sensor_type_mapping:
         try:
             unknown_sensor_type = SensorType(
@@ -187,6 +182,7 @@ def add_device():
             db.session.add(unknown_sensor_type)
             db.session.flush()
             sensor_type_mapping['unknown'] = unknown_sensor_type.id
+            added_unknown_type = True
             print("Added unknown sensor type")
         except Exception as e:
             print(f"Error adding unknown sensor type: {e}")
@@ -224,6 +220,11 @@ def add_device():
                 print(f"Added sensor: {sensor_key} to device: {device_id}")
 
         db.session.commit()
+        deviceregistry.invalidate()
+        sensordatatypes.invalidate()
+        if added_unknown_type:
+            sensortypes.invalidate()
+        mark_changed(device_id)
         print("Successfully committed all changes to database")
         
         sensor_count = len(mqtt_device_data.get('sensors', {})) if mqtt_device_data else 0
@@ -257,6 +258,11 @@ def delete_device(device_id):
         # Delete the device itself
         db.session.delete(device)
         db.session.commit()
+        ruleindex.invalidate()  # Rules on the deleted sensors went with them
+        zoneindex.invalidate()  # So did their zone entries
+        deviceregistry.invalidate()
+        sensordatatypes.invalidate()
+        mark_changed(device_id)
 
         return jsonify({"message": "Device and sensors deleted successfully"}), 200
     except Exception as e:
@@ -283,6 +289,7 @@ def edit_device():
 
     # Commit the changes
     db.session.commit()
+    mark_changed(device_id)
 
     return jsonify({
         "message": "Device updated successfully",
@@ -293,7 +300,4 @@ def edit_device():
             "status": device.status,
             "last_seen": device.last_seen
         }
-    }), 200
-
-# Initialize MQTT client
-init_mqtt_client()
\ No newline at end of file
+    }), 200
\ No newline at end of file
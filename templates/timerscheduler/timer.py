@@ -1,42 +1,10 @@
 import logging
-import json
 import time
 from flask import Blueprint, jsonify, request, current_app, render_template
 from flask_login import login_required, current_user
 from datetime import datetime
-import paho.mqtt.client as mqtt
-from database.database import db, User, Sensor, SensorType, TimerScheduler
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-
-scheduler = BackgroundScheduler()
-
-def schedule_timers():
-    # Fetch timers for the current user
-    timers = TimerScheduler.query.filter_by(user_id=current_user.userid).all()
-    
-    if timers:
-        for timer in timers:
-            # Construct the cron trigger based on the timer data
-            days_map = {"Mon": 0, "Tue": 1, "Wed": 2, "Thu": 3, "Fri": 4, "Sat": 5, "Sun": 6}
-            days = [days_map[day] for day in timer.days.split(",")]  # support multiple days
-
-            trigger = CronTrigger(
-                day_of_week=",".join(str(day) for day in days),
-                hour=int(timer.trigger_time.split(":")[0]),
-                minute=int(timer.trigger_time.split(":")[1]),
-                second=0
-            )
-            
-            # Add job to scheduler with the relay control
-            scheduler.add_job(
-                control_relay, 
-                trigger,
-                args=[timer.relay_device_id], 
-                kwargs={'state': timer.action}
-            )
-
-scheduler.start()
+from database.database import db, User, Sensor, TimerScheduler
+from services import livestate, relaycommands, sensordatatypes, timerengine, timerservice
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -45,92 +13,19 @@ logger = logging.getLogger(__name__)
 # Create a Blueprint for automation
 timerbp = Blueprint('timerbp', __name__)
 
-# MQTT Configuration
-BROKER_ADDRESS = "atechpromqtt"  # Replace with your MQTT broker address
-BROKER_PORT = 1883               # Default MQTT port
-MQTT_TOPIC = "home/#"            # Topic to subscribe to
-
-# MQTT Client 
-mqtt_client = mqtt.Client()
-
-# Store the latest sensor data
-last_known_state = {}
-
-# Initialize MQTT Client
-def init_mqtt_client():
-    """Initialize and connect the MQTT client to the broker."""
-    try:
-        mqtt_client.on_connect = on_connect
-        mqtt_client.on_message = on_message
-        mqtt_client.connect(BROKER_ADDRESS, BROKER_PORT)
-        mqtt_client.loop_start()
-        logger.info(f"Connected to MQTT broker at {BROKER_ADDRESS}:{BROKER_PORT}")
-    except Exception as e:
-        logger.error(f"Error connecting to MQTT broker: {e}")
-
-# MQTT on_connect callback
-def on_connect(client, userdata, flags, rc):
-    """Callback when the MQTT client connects to the broker."""
-    if rc == 0:
-        logger.info("Successfully connected to MQTT broker")
-        client.subscribe(MQTT_TOPIC)  # Subscribe to the topic
-    else:
-        logger.error(f"Failed to connect with return code {rc}")
-
-# MQTT on_message callback
-def on_message(_client, _userdata, msg):
-    """Callback when an MQTT message is received."""
-    try:
-        payload = json.loads(msg.payload.decode())  # Decode the JSON payload
-        device_id = payload.get("deviceId", "Unknown")  # Extract device ID
-
-        # Log the received message
-        logger.debug(f"Received message from {device_id}: {payload}")
-
-        # Update the last known state of the device
-        if device_id not in last_known_state:
-            last_known_state[device_id] = {"data": {}, "timestamp": time.time()}
-
-        # Update the data and timestamp of the device
-        for key, value in payload.items():
-            if key != "deviceId":
-                last_known_state[device_id]["data"][key] = value
-        last_known_state[device_id]["timestamp"] = time.time()
-
-    except Exception as e:
-        logger.error(f"Error processing MQTT message: {e}")
-
-# Initialize MQTT client when the module is loaded
-init_mqtt_client()
 
 def fetch_sensor_datatype(sensor_key): # later will need to show as the sensor type invovled on the reactor (relay)
     """
     Fetch the data type (unit or states) of a sensor based on its sensor_key.
     """
     try:
-        # Query the Sensor table to find the sensor by its sensor_key
-        sensor = Sensor.query.filter_by(sensor_key=sensor_key).first()
+        # Served from the shared datatype cache
+        response_data = sensordatatypes.describe(sensor_key)
 
         # Check if the sensor exists
-        if not sensor:
+        if response_data is None:
             return jsonify({"error": f"Sensor with key '{sensor_key}' not found"}), 404
 
-        # Get the associated SensorType
-        sensor_type = sensor.sensor_type
-
-        # Prepare the response data
-        response_data = {
-            "sensor_key": sensor_key,
-            "sensor_type": sensor_type.type_key,
-            "display_name": sensor_type.display_name,
-        }
-
-        # Add unit or states based on the sensor type
-        if sensor_type.unit:
-            response_data["unit"] = sensor_type.unit
-        elif sensor_type.states:
-            response_data["states"] = sensor_type.states
-
         return jsonify(response_data), 200
 
     except Exception as e:
@@ -142,16 +37,17 @@ def fetch_sensor_datatype(sensor_key): # later will need to show as the sensor t
 def fetch_relay_state():
     try:
         # Check if any data is available
-        if not last_known_state:
+        snapshot = livestate.store.snapshot()
+        if not snapshot:
             return jsonify({"message": "No relay data available"}), 200
 
         # Extract relay state for each device
         relay_states = {
             device_id: {
-                "relay_state": details["data"].get("relay", "UNKNOWN"),  # Default to UNKNOWN if no relay state found
-                "timestamp": details.get("timestamp")
+                "relay_state": state.values.get("relay", "UNKNOWN"),  # Default to UNKNOWN if no relay state found
+                "timestamp": state.last_seen
             }
-            for device_id, details in last_known_state.items()
+            for device_id, state in snapshot.devices.items()
         }
 
         # If no relays are present in the data
@@ -182,6 +78,12 @@ def create_timer():
     # Convert days list to a comma-separated string
     days_string = ",".join(data['days'])
 
+    # Reject schedules the scheduler could never fire
+    try:
+        timerengine.parse_schedule(data['trigger_time'], days_string)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     # Create and save the timer
     new_timer = TimerScheduler(
         user_id=current_user.userid,
@@ -197,6 +99,7 @@ def create_timer():
     # Commit to the database
     db.session.add(new_timer)
     db.session.commit()
+    timerservice.sync_timer(new_timer)
 
     # Return success
     return jsonify({"message": "Timer created successfully", "timer": new_timer.to_dict()}), 201
@@ -229,8 +132,16 @@ def edit_timer(timer_id):
     if "title" in data:
         timer.title = data['title']
 
+    # Reject schedules the scheduler could never fire
+    try:
+        timerengine.parse_schedule(timer.trigger_time, timer.days)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+
     # Commit changes to the database
     db.session.commit()
+    timerservice.sync_timer(timer)
 
     # Return success with the updated timer as JSON
     return jsonify({"message": "Timer updated successfully", "timer": timer.to_dict()}), 200
@@ -252,8 +163,10 @@ def delete_timer():
         return jsonify({"error": "Timer not found"}), 404
 
     # Delete the timer
+    deleted_id = timer.id
     db.session.delete(timer)
     db.session.commit()
+    timerservice.remove_timer(deleted_id)
 
     # Return success message
     return jsonify({"message": "Timer deleted successfully"}), 200
@@ -284,8 +197,9 @@ def get_current_time():
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
     
     
-@timerbp.route('/timer/trigger_relay', methods=['GET']) # can't impeliment on the background
+@timerbp.route('/timer/trigger_relay', methods=['GET'])
 def trigger_relay():
+    """Report each timer's state. Firing happens in services.timerservice."""
     try:
         # Fetch all timers for the current user
         timers = TimerScheduler.query.filter_by(user_id=current_user.userid).all()
@@ -293,59 +207,31 @@ def trigger_relay():
         if not timers:
             return jsonify({"message": "No timers found for the current user."}), 404
         
-        # Get the current time and day
-        current_time = datetime.now().strftime("%H:%M")
-        current_day = datetime.now().strftime("%a") 
+        # Get the current minute
+        current_minute = datetime.now().strftime("%Y-%m-%d %H:%M")
         
         triggered_timers = []
 
         for timer in timers:
-            # Initialize a default message and status
             status = {"timer": timer.to_dict(), "reacted": False}
 
-            # Check if the current day matches the timer days
-            days_map = timer.days.split(",")  # Multiple days support
-            if current_day not in days_map:
-                status["message"] = f"Timer not scheduled for today ({current_day})."
-                triggered_timers.append(status)
-                continue  # Skip to the next timer
-            
-            # Check if the current time matches the trigger time
-            if current_time == timer.trigger_time:
-                # Trigger the relay action (ON or OFF)
-                device = Sensor.query.filter_by(device_id=timer.relay_device_id).first()
-                if not device:
-                    status["message"] = f"Device {timer.relay_device_id} is not registered."
-                    triggered_timers.append(status)
-                    continue  # Skip if device is not found
-
-                # Validate the action (ON/OFF)
-                command = timer.action.upper()
-                if command not in ['ON', 'OFF']:
-                    status["message"] = "Invalid command. Use 'ON' or 'OFF'."
-                    triggered_timers.append(status)
-                    continue  # Skip if the command is invalid
-
-                # Publish command to MQTT topic
-                mqtt_topic = f"home/{timer.relay_device_id}/relay/command"
-                mqtt_client.publish(mqtt_topic, command)
-                
-                # Log the action
-                logger.info(f"Relay {timer.relay_device_id} set to {command}")
-
-                # Update the status for successful execution
+            fired_at = timerservice.last_fired.get(timer.id)
+            next_run = timerservice.next_run_time(timer.id)
+            if fired_at and fired_at.strftime("%Y-%m-%d %H:%M") == current_minute:
                 status.update({
-                    "message": f"Relay {timer.relay_device_id} set to {command}",
+                    "message": f"Relay {timer.relay_device_id} set to {timer.action.upper()}",
                     "reacted": True
                 })
+            elif not timer.enabled:
+                status["message"] = "Timer disabled."
+            elif next_run:
+                status["message"] = f"Next run {next_run.strftime('%a %H:%M')}."
             else:
-                # Timer not triggered due to time mismatch
-                status["message"] = f"Timer not triggered; current time ({current_time}) does not match {timer.trigger_time}."
+                status["message"] = f"Timer not scheduled; check trigger time ({timer.trigger_time}) and days ({timer.days})."
             
-            # Add status to the response
             triggered_timers.append(status)
         
-        # Return all timer reactions and statuses
+        # Return all timer statuses
         return jsonify({
             "triggered_timers": triggered_timers
         }), 200
@@ -382,9 +268,8 @@ def control_relay(device_id):
         if command not in ['ON', 'OFF']:
             return jsonify({"error": "Invalid command. Use 'ON' or 'OFF'."}), 400
 
-        # Publish command to MQTT topic
-        mqtt_topic = f"home/{device_id}/relay/command"
-        result = mqtt_client.publish(mqtt_topic, command)
+        # Publish through the dispatcher, which tracks the ack
+        relay_command = relaycommands.send(device_id, command, source="timer")
         
         # Log the action
         logger.info(f"Relay {device_id} set to {command}")
@@ -392,7 +277,8 @@ def control_relay(device_id):
         # Return success response
         return jsonify({
             "message": f"Relay {device_id} set to {command}",
-            "command": command
+            "command": command,
+            "command_id": relay_command.command_id
         }), 200 
 
     except Exception as e:
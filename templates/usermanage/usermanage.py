@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request, render_template, url_for, redirect
 from flask_login import login_required, current_user
 from database.database import db, User
+from services import ruleindex, usercache, zoneindex
 
 usermanage = Blueprint('usermanage', __name__, template_folder='templates')
 
@@ -82,6 +83,7 @@ def edit_user(userid):
         user.password = data['password']
 
     db.session.commit()
+    usercache.invalidate(userid)
     return jsonify({'status': 'success', 'message': 'User updated successfully'})
 
 
@@ -99,6 +101,9 @@ def delete_user(userid):
     try:
         db.session.delete(user)
         db.session.commit()
+        ruleindex.invalidate()
+        zoneindex.invalidate(userid)
+        usercache.invalidate(userid)
         return jsonify({'status': 'success', 'message': 'User deleted successfully'})
     except Exception as e:
         db.session.rollback()
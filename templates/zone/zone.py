@@ -1,62 +1,37 @@
 from flask import Blueprint, request, jsonify, render_template
 from flask_login import login_required, current_user
 from database.database import db, User, Zone, ZoneSensor, Sensor, SensorType
+from services import zoneindex
 
 zone_bp = Blueprint('zone', __name__)
 
 # Utility Functions
 def get_user_zones(user_id):
     """Get all zones for a specific user with their sensors."""
-    zones = Zone.query.filter_by(user_id=user_id).all()
-    zones_data = []
-    
-    for zone in zones:
-        sensors = []
-        for zs in zone.sensors:
-            sensor = Sensor.query.get(zs.sensor_id)
-            if sensor:
-                sensor_type = SensorType.query.get(sensor.sensor_type_id)
-                sensors.append({
-                    "sensor_id": sensor.id,
-                    "name": sensor.sensor_key,
-                    "type": sensor_type.type_key if sensor_type else "Unknown",
-                    "display_name": sensor_type.display_name if sensor_type else "Unknown",
-                    "unit": sensor_type.unit if sensor_type else None
-                })
-        
-        zones_data.append({
-            "zone_id": zone.id,
-            "name": zone.name,
-            "description": zone.description,
-            "sensors": sensors
-        })
-    
-    return zones_data
+    return zoneindex.zones_for_user(user_id)
 
 def get_unassigned_sensors(user_id):
     """Get all sensors not assigned to any zone."""
-    # Get all assigned sensor IDs
-    assigned_sensors = db.session.query(ZoneSensor.sensor_id).all()
-    assigned_sensor_ids = [s[0] for s in assigned_sensors]
-    
-    # Query for unassigned sensors
-    unassigned = Sensor.query.filter(
-        ~Sensor.id.in_(assigned_sensor_ids),
-        Sensor.userid == user_id
-    ).all()
-    
-    sensors_data = []
-    for sensor in unassigned:
-        sensor_type = SensorType.query.get(sensor.sensor_type_id)
-        sensors_data.append({
-            "sensor_id": sensor.id,
-            "name": sensor.sensor_key,
-            "type": sensor_type.type_key if sensor_type else "Unknown",
-            "display_name": sensor_type.display_name if sensor_type else "Unknown",
-            "unit": sensor_type.unit if sensor_type else None
-        })
-    
-    return sensors_data
+    return zoneindex.unassigned_sensors(user_id)
+
+def owned_sensor_ids(user_id, sensor_ids):
+    """The requested sensors that exist and belong to the user, in request order.
+
+    One query for the whole list; ids may arrive as strings from the form.
+    """
+    requested = []
+    for sensor_id in sensor_ids:
+        try:
+            sensor_id = int(sensor_id)
+        except (TypeError, ValueError):
+            continue
+        if sensor_id not in requested:
+            requested.append(sensor_id)
+    if not requested:
+        return []
+    rows = db.session.query(Sensor.id).filter(Sensor.id.in_(requested), Sensor.userid == user_id)
+    owned = {sensor_id for sensor_id, in rows}
+    return [sensor_id for sensor_id in requested if sensor_id in owned]
 
 def create_new_zone(user_id, name, description, sensor_ids):
     """Create a new zone with the given sensors."""
@@ -75,22 +50,21 @@ def create_new_zone(user_id, name, description, sensor_ids):
         db.session.add(zone)
         db.session.flush()  # Get the zone ID
         
-        # Add sensors to zone
-        for sensor_id in sensor_ids:
-            # Check if sensor exists and belongs to the user
-            sensor = Sensor.query.filter_by(id=sensor_id, userid=user_id).first()
-            if not sensor:
+        # Add sensors to zone: only the user's own sensors that are not assigned yet
+        owned = owned_sensor_ids(user_id, sensor_ids)
+        assigned = {
+            sensor_id for sensor_id, in
+            db.session.query(ZoneSensor.sensor_id).filter(ZoneSensor.sensor_id.in_(owned))
+        } if owned else set()
+        for sensor_id in owned:
+            if sensor_id in assigned:
                 continue
-                
-            # Check if sensor already assigned
-            existing_assignment = ZoneSensor.query.filter_by(sensor_id=sensor_id).first()
-            if existing_assignment:
-                continue
-                
+
             zone_sensor = ZoneSensor(zone_id=zone.id, sensor_id=sensor_id)
             db.session.add(zone_sensor)
         
         db.session.commit()
+        zoneindex.invalidate(user_id)
         return True, "Zone created successfully"
         
     except Exception as e:
@@ -106,6 +80,7 @@ def delete_zone(user_id, zone_id):
             
         db.session.delete(zone)
         db.session.commit()
+        zoneindex.invalidate(user_id)
         return True, "Zone deleted successfully"
         
     except Exception as e:
@@ -134,16 +109,12 @@ def update_zone(user_id, zone_id, name, description, sensor_ids):
         ZoneSensor.query.filter_by(zone_id=zone_id).delete()
         
         # Add new sensor associations
-        for sensor_id in sensor_ids:
-            # Check if sensor exists and belongs to the user
-            sensor = Sensor.query.filter_by(id=sensor_id, userid=user_id).first()
-            if not sensor:
-                continue
-                
+        for sensor_id in owned_sensor_ids(user_id, sensor_ids):
             zone_sensor = ZoneSensor(zone_id=zone_id, sensor_id=sensor_id)
             db.session.add(zone_sensor)
         
         db.session.commit()
+        zoneindex.invalidate(user_id)
         return True, "Zone updated successfully"
         
     except Exception as e:
@@ -226,32 +197,7 @@ def zone_management():
 @zone_bp.route('/debug/zones', methods=['GET'])
 def debug_get_zones():
     """Debug route to retrieve all zones and their sensors."""
-    zones = Zone.query.all()
-    response = []
-
-    for zone in zones:
-        sensors = []
-        for zs in zone.sensors:
-            sensor = Sensor.query.get(zs.sensor_id)
-            if sensor:
-                sensor_type = SensorType.query.get(sensor.sensor_type_id)
-                sensors.append({
-                    "sensor_id": sensor.id,
-                    "name": sensor.sensor_key,
-                    "type": sensor_type.type_key if sensor_type else "Unknown",
-                    "display_name": sensor_type.display_name if sensor_type else "Unknown",
-                    "unit": sensor_type.unit if sensor_type else None
-                })
-        
-        response.append({
-            "zone_id": zone.id,
-            "name": zone.name,
-            "description": zone.description,
-            "user_id": zone.user_id,
-            "sensors": sensors
-        })
-
-    return jsonify(response), 200
+    return jsonify(zoneindex.load_zones()), 200
 
 # Add this utility function
 def update_zone_details(user_id, zone_id, name, description):
@@ -273,6 +219,7 @@ def update_zone_details(user_id, zone_id, name, description):
         zone.description = description
         
         db.session.commit()
+        zoneindex.invalidate(user_id)
         return True, "Zone details updated successfully"
         
     except Exception as e:
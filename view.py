@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_login import login_user, login_required, logout_user, current_user
 from database.database import db, User  # Import User and db
+from services import usercache
 import uuid
 
 
@@ -27,6 +28,7 @@ def login():
             new_session_id = str(uuid.uuid4())
             user.session_id = new_session_id
             db.session.commit()
+            usercache.invalidate(user.userid)  # Other devices' sessions must see the new id
             
             # Store the session ID in the session
             session['session_id'] = new_session_id
@@ -43,6 +45,7 @@ def logout():
     if current_user.is_authenticated:
         current_user.session_id = None
         db.session.commit()
+        usercache.invalidate(current_user.userid)
         logout_user()
     return redirect(url_for('views.login'))
 